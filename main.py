@@ -56,11 +56,11 @@ class KahunaBot(Star):
         asyncio.create_task(run_func_delay_min(0, CharacterManager.refresh_all_characters_at_init))
 
         # 定时刷新任务
-        asyncio.create_task(refresh_per_min(0, 360, MarketManager.refresh_market))
-        asyncio.create_task(refresh_per_min(0, 10, AssetManager.refresh_all_asset))
-        asyncio.create_task(refresh_per_min(0, 10, IndustryManager.refresh_running_status))
-        asyncio.create_task(refresh_per_min(0, 60, IndustryManager.refresh_system_cost))
-        asyncio.create_task(refresh_per_min(0, 60, IndustryManager.refresh_market_price))
+        asyncio.create_task(refresh_per_min(0, 360, MarketManager.refresh_market_async))
+        asyncio.create_task(refresh_per_min(0, 10, AssetManager.refresh_all_asset_async))
+        asyncio.create_task(refresh_per_min(0, 10, IndustryManager.refresh_running_status_async))
+        asyncio.create_task(refresh_per_min(0, 60, IndustryManager.refresh_system_cost_async))
+        asyncio.create_task(refresh_per_min(0, 60, IndustryManager.refresh_market_price_async))
 
     # 注册指令的装饰器。指令名为 helloworld。注册成功后，发送 `/helloworld` 就会触发这个指令，并回复 `你好, {user_name}!`
     # @filter.custom_filter(SelfFilter1)
@@ -309,9 +309,14 @@ class KahunaBot(Star):
         pass
 
     @Inds_rp.command('计划报表', alias={'workrp'})
-    async def Inds_rp_workrp(self, event: AstrMessageEvent, plan_name: str):
-        """ 计划材料清单 """
-        yield await IndsEvent.rp_all(event, plan_name)
+    async def Inds_rp_workrp(self, event: AstrMessageEvent, plan_name: str, sections: str = ""):
+        """ 计划材料清单，sections为逗号分隔的work,material,work_flow,logistic，默认全部 """
+        yield await IndsEvent.rp_all(event, plan_name, sections.split(',') if sections else None)
+
+    @Inds_rp.command('全部计划报表', alias={'batchrp'})
+    async def Inds_rp_batchrp(self, event: AstrMessageEvent):
+        """ 使用同一份库存和蓝图数据生成全部计划的材料清单 """
+        yield await IndsEvent.rp_batch(event)
 
     @Inds_rp.command('t2市场', alias={'t2mk'})
     async def Inds_rp_t2cost(self, event: AstrMessageEvent, plan_name: str):
@@ -325,6 +330,12 @@ class KahunaBot(Star):
     async def Inds_rp_costdetail(self, event: AstrMessageEvent, plan_name: str, product_name: str):
         yield await IndsEvent.rp_costdetail(event, plan_name, product_name)
 
+    @filter.custom_filter(AdminFilter)
+    @Inds_rp.command('性能分析', alias={'profile'})
+    async def Inds_rp_profile(self, event: AstrMessageEvent, plan_name: str, output: str = ""):
+        """ 计划报表分阶段耗时、sql数量和内存峰值，output为json时同时写入文件 """
+        yield await IndsEvent.rp_profile(event, plan_name, output)
+
     @Inds.command("refjobs")
     async def Inds_refjobs(self, event: AstrMessageEvent):
         """ 刷新进行中的工作 """
@@ -373,7 +384,8 @@ class KahunaBot(Star):
         Args:
             plan_name(string): 计划名称
         '''
-        tool_result = await IndsEvent.rp_all(event, plan_name)
+        # 只生成材料单和工作流，跳过蓝图分解和物流
+        tool_result = await IndsEvent.rp_all(event, plan_name, ['material', 'work_flow'])
         yield await kahuna_llmt.return_tool_result_with_llm(self, event, tool_result)
 
     @llm_tool(name="get_eve_capital_cost_with_plan_data")  # 如果 name 不填，将使用函数名
@@ -19,6 +19,8 @@ from ..service.industry_server.industry_config import IndustryConfigManager, BPM
 from ..service.industry_server.structure import StructureManager
 from ..service.industry_server.industry_manager import IndustryManager
 from ..service.industry_server.industry_advice import IndustryAdvice
+from ..service.industry_server.industry_profiler import IndustryProfiler
+from ..service.industry_server.industry_batch import IndustryBatchAnalyser
 from ..service.sde_service.utils import SdeUtils
 from ..service.feishu_server.feishu_kahuna import FeiShuKahuna
 from ..service.log_server import logger
@@ -26,6 +28,9 @@ from ..service.log_server import logger
 # import Exception
 from ..utils import KahunaException
 
+# 计划报表各部分的名称
+REPORT_SECTION_NAME = {'work': '蓝图分解', 'material': '材料单', 'work_flow': '工作流', 'logistic': '物流清单'}
+
 def print_name_fuzz_list(event: AstrMessageEvent, type_name: str):
     fuzz_list = SdeUtils.fuzz_type(type_name, list_len=10)
     if fuzz_list:
@@ -433,31 +438,54 @@ class IndsEvent:
         return event.plain_result("执行完成")
 
     @staticmethod
-    async def rp_all(event: AstrMessageEvent, plan_name: str):
+    async def rp_all(event: AstrMessageEvent, plan_name: str, section_list: list = None):
         user_qq = int(event.get_sender_id())
         user = UserManager.get_user(user_qq)
         if plan_name not in user.user_data.plan:
             raise KahunaException(f"plan {plan_name} not exist")
+        section_list = IndustryAnalyser.check_section_list(section_list)
 
+        # 报表各部分生成完成后立即写入对应sheet
         with ThreadPoolExecutor(max_workers=1) as executor:
             analyser = IndustryAnalyser.get_analyser_by_plan(user, plan_name)
-            future = executor.submit(analyser.get_work_tree_data)
+            future = executor.submit(IndsEvent.output_work_report, user_qq, plan_name,
+                                     analyser.iter_work_tree_data(section_list), section_list)
+            while not future.done():
+                await asyncio.sleep(1)
+            sheet = future.result()
+
+        return event.plain_result(f"执行完成, 当前计划{REPORT_SECTION_NAME[section_list[0]]}:{sheet.url}")
+
+    @staticmethod
+    async def rp_batch(event: AstrMessageEvent):
+        user_qq = int(event.get_sender_id())
+        user = UserManager.get_user(user_qq)
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(IndustryBatchAnalyser.get_work_tree_data, user)
             while not future.done():
                 await asyncio.sleep(1)
-            report = future.result()
+            report_dict = future.result()
+
+        res_str = "执行完成, 计划蓝图分解:\n"
+        for plan_name, report in report_dict.items():
+            work_tree_sheet = IndsEvent.output_work_report(user_qq, plan_name, report.items(), list(report))
+            res_str += f"{plan_name}: {work_tree_sheet.url}\n"
+
+        return event.plain_result(res_str)
 
+    @staticmethod
+    def output_work_report(user_qq: int, plan_name: str, section_iter, section_list: list):
+        """
+        把计划报表写入飞书表格，section_iter按完成顺序返回(section, data)。
+        sheet按固定顺序预先创建，返回section_list第一部分的sheet。
+        """
         spreadsheet = FeiShuKahuna.create_user_plan_spreadsheet(user_qq, plan_name)
         FeiShuKahuna.create_default_spreadsheet(spreadsheet)
-        work_tree_sheet = FeiShuKahuna.get_worktree_sheet(spreadsheet)
-        FeiShuKahuna.output_work_tree(work_tree_sheet, report['work'])
-        material_sheet = FeiShuKahuna.get_material_sheet(spreadsheet)
-        FeiShuKahuna.output_material_tree(material_sheet, report['material'])
-        work_flow_sheet = FeiShuKahuna.get_workflow_sheet(spreadsheet)
-        FeiShuKahuna.output_work_flow(work_flow_sheet, report['work_flow'])
-        logistic_sheet = FeiShuKahuna.get_logistic_sheet(spreadsheet)
-        FeiShuKahuna.output_logistic_plan(logistic_sheet, report['logistic'])
-
-        return event.plain_result(f"执行完成, 当前计划蓝图分解:{work_tree_sheet.url}")
+        sheet_dict = {section: FeiShuKahuna.get_plan_report_sheet(spreadsheet, section) for section in section_list}
+        for section, data in section_iter:
+            FeiShuKahuna.output_plan_report_section(sheet_dict[section], section, data)
+        return sheet_dict[section_list[0]]
 
     @staticmethod
     async def rp_t2mk(event: AstrMessageEvent, plan_name: str):
@@ -504,7 +532,7 @@ class IndsEvent:
         with ThreadPoolExecutor(max_workers=1) as executor:
             ship_list = SdeUtils.get_capital_ship()
             plan = [[ship, 1] for ship in ship_list]
-            future = executor.submit(IndustryAnalyser.get_cost_data, user, plan_name, plan)
+            future = executor.submit(IndustryAnalyser.get_cost_data, user, plan_name, plan, "cost")
             while not future.done():
                 await asyncio.sleep(1)
             cost_data = future.result()
@@ -524,7 +552,8 @@ class IndsEvent:
         if (type_id := SdeUtils.get_id_by_name(product)) is None:
             return print_name_fuzz_list(event, product)
 
-        detail_dict = IndustryAnalyser.get_cost_detail(user, plan_name, product)
+        # 与rp_capcost等成本表使用同一种成本模型，明细才能和成本表对上
+        detail_dict = IndustryAnalyser.get_cost_detail(user, plan_name, product, "cost")
 
         spreadsheet = FeiShuKahuna.create_user_plan_spreadsheet(user_qq, plan_name)
         cost_sheet = FeiShuKahuna.get_detail_cost_sheet(spreadsheet)
@@ -532,6 +561,24 @@ class IndsEvent:
 
         return event.plain_result(f"执行完成, {product}成本解析:{cost_sheet.url}")
 
+    @staticmethod
+    async def rp_profile(event: AstrMessageEvent, plan_name: str, output: str):
+        user_qq = int(event.get_sender_id())
+        user = UserManager.get_user(user_qq)
+        if plan_name not in user.user_data.plan:
+            raise KahunaException(f"plan {plan_name} not exist")
+
+        with ThreadPoolExecutor(max_workers=1) as executor:
+            future = executor.submit(IndustryProfiler.profile_plan, user, plan_name)
+            while not future.done():
+                await asyncio.sleep(1)
+            profile_data = future.result()
+
+        res_str = IndustryProfiler.format_profile(profile_data)
+        if output == "json":
+            res_str += f"\n结果文件: {IndustryProfiler.dump_json(profile_data)}"
+        return event.plain_result(res_str)
+
     @staticmethod
     def refjobs(event: AstrMessageEvent):
         IndustryManager.refresh_running_status()
@@ -541,14 +588,8 @@ class IndsEvent:
 class MarketEvent:
     @staticmethod
     async def market_reforder(event: AstrMessageEvent):
-        with ThreadPoolExecutor(max_workers=1) as executor:
-            future = executor.submit(MarketManager.refresh_market)
-
-            while not future.done():
-                await asyncio.sleep(1)
-
-            res_log = future.result()
-            return event.plain_result(res_log)
+        res_log = await MarketManager.refresh_market_async()
+        return event.plain_result(res_log)
 
 class SdeEvent():
     @staticmethod
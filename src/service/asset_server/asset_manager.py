@@ -5,10 +5,12 @@ from .asset_container import AssetContainer, ContainerTag
 from ..database_server.model import (AssetCache as M_AssetCache, Asset as M_Asset,
                                      BlueprintAsset as M_BlueprintAsset, BlueprintAssetCache as M_BlueprintAssetCache)
 from ..database_server.connect import db
+from ..database_server.snapshot_version import SnapshotVersion, ASSET_SNAPSHOT, BP_ASSET_SNAPSHOT
 from .asset_owner import AssetOwner
 from ..character_server.character_manager import CharacterManager
 from ..sde_service.utils import SdeUtils
 from ..evesso_server.eveesi import universe_structures_structure
+from ..evesso_server.esi_etag import EsiEtagBatch
 
 # kahuna KahunaException
 from ...utils import KahunaException, PluginMeta
@@ -85,6 +87,7 @@ class AssetManager(metaclass=PluginMeta):
             M_BlueprintAssetCache.delete().execute()
             db.execute_sql(f"INSERT INTO {M_BlueprintAssetCache._meta.table_name} SELECT * FROM {M_BlueprintAsset._meta.table_name}")
             logger.info("copy data to cache complete")
+        SnapshotVersion.bump(ASSET_SNAPSHOT, BP_ASSET_SNAPSHOT)
 
     @classmethod
     def refresh_asset(cls, type, owner_id):
@@ -92,15 +95,39 @@ class AssetManager(metaclass=PluginMeta):
         if asset is None:
             raise KahunaException("没有找到对应的库存。")
         asset.delete_asset()
+        # 已经删除了旧数据，必须完整请求
         asset.get_asset()
         cls.copy_to_cache()
         return asset
 
     @classmethod
     def refresh_all_asset(cls):
+        # 新ETag在copy_to_cache完成后才保存，复制失败时下次刷新重新请求并复制
+        etag_batch = EsiEtagBatch()
+        changed = False
         for asset in cls.asset_dict.values():
-            asset.get_asset()
-        cls.copy_to_cache()
+            changed = asset.get_asset(etag_batch) or changed
+        # 所有库存都没有变化时，asset_cache和blueprint_asset_cache不需要重建
+        if changed:
+            cls.copy_to_cache()
+        etag_batch.commit()
+
+    @classmethod
+    async def refresh_all_asset_async(cls):
+        """
+        refresh_all_asset的异步版本，各库存在事件循环上并发请求。
+        一个库存出错(token失效、ESI错误)时只记录日志，其他库存已经写入的数据照常复制到cache。
+        """
+        etag_batch = EsiEtagBatch()
+        asset_list = list(cls.asset_dict.values())
+        changed_list = await asyncio.gather(*[asset.get_asset_async(etag_batch) for asset in asset_list],
+                                            return_exceptions=True)
+        for asset, changed in zip(asset_list, changed_list):
+            if isinstance(changed, BaseException):
+                logger.error(f"refresh asset error: {asset.owner_type} {asset.owner_id} {changed!r}")
+        if any(changed is True for changed in changed_list):
+            await asyncio.to_thread(cls.copy_to_cache)
+        await asyncio.to_thread(etag_batch.commit)
 
     @classmethod
     def get_asset_in_container_list(cls, container_list: list):
@@ -136,6 +163,7 @@ class AssetManager(metaclass=PluginMeta):
 
         asset_container.insert_to_db()
         cls.container_dict[(owner_qq, location_id)] = asset_container
+        AssetContainer.get_location_id_by_qq_tag_cache.clear()
 
         return asset_container
 
@@ -152,6 +180,8 @@ class AssetManager(metaclass=PluginMeta):
             container.tag = tag
             container.insert_to_db()
             success_list.append(container)
+        # 按标签查询的仓库列表立即生效，工业分析的指纹也随容器标签变化
+        AssetContainer.get_location_id_by_qq_tag_cache.clear()
         return success_list
 
     @classmethod
@@ -163,4 +193,4 @@ class AssetManager(metaclass=PluginMeta):
         await asyncio.sleep(start_delay * 60)
         while True:
             await asyncio.sleep(interval * 60)
-            cls.refresh_all_asset()
\ No newline at end of file
+            await cls.refresh_all_asset_async()
\ No newline at end of file
@@ -1,17 +1,18 @@
-from tqdm import tqdm
+import asyncio
 
 # kahuna model
 from ..database_server.model import (Asset as M_Asset,
                                      AssetCache as M_AssetCache,
+                                     AssetStaging as M_AssetStaging,
                                      AssetOwner as M_AssetOwner,
                                      BlueprintAsset as M_BlueprintAsset,
-                                     BlueprintAssetCache as M_BlueprintAssetCache)
-from ..database_server.connect import db
-from ..evesso_server.eveesi import (characters_character_assets,
-                                    corporations_corporation_assets,
-                                    characters_character_id_blueprints,
-                                    corporations_corporation_id_blueprints)
-from ..evesso_server.eveutils import find_max_page, get_multipages_result
+                                     BlueprintAssetCache as M_BlueprintAssetCache,
+                                     BlueprintAssetStaging as M_BlueprintAssetStaging)
+from ..database_server.page_writer import PageWriter
+from ..evesso_server.eveesi import characters_character_assets, corporations_corporation_assets
+from ..evesso_server import eveesi, eveesi_async
+from ..evesso_server.eveutils import stream_all_pages, stream_all_pages_async
+from ..evesso_server.esi_etag import EsiEtagBatch
 from ..character_server.character import Character
 
 # kahuna logger
@@ -75,61 +76,109 @@ class AssetOwner():
         M_Asset.delete().where(M_Asset.owner_id == self.owner_id &
                                M_Asset.asset_type == self.owner_type).execute()
 
-    def get_asset(self):
-        logger.info(f"开始刷新 {self.owner_type} {self.access_character.character_name} 资产")
+    def get_esi_func_pair(self, esi_module) -> tuple:
+        """ (资产接口, 蓝图接口)，esi_module为eveesi或eveesi_async """
         if self.owner_type == "character":
-            self.get_owner_asset(characters_character_assets, self.owner_id)
-            self.get_owner_bp_asset(characters_character_id_blueprints, self.owner_id)
-        elif self.owner_type == "corp":
-            self.get_owner_asset(corporations_corporation_assets, self.owner_id)
-            self.get_owner_bp_asset(corporations_corporation_id_blueprints, self.owner_id)
-
-    def get_owner_asset(self, asset_esi, owner_id):
+            return esi_module.characters_character_assets, esi_module.characters_character_id_blueprints
+        return esi_module.corporations_corporation_assets, esi_module.corporations_corporation_id_blueprints
+
+    def get_asset(self, etag_batch: EsiEtagBatch = None) -> bool:
+        """
+        返回资产或蓝图是否有变化。
+        etag_batch不为None时发送条件请求，ESI数据未变化时不重写数据库。
+        资产和蓝图都写入成功后才把新ETag merge到etag_batch，其中一个出错时本库存的新ETag都丢弃，
+        否则调用方不知道另一个已经变化，跳过copy_to_cache后cache表会一直停留在旧数据。
+        """
+        logger.info(f"开始刷新 {self.owner_type} {self.access_character.character_name} 资产")
+        owner_batch = EsiEtagBatch() if etag_batch is not None else None
+        asset_esi, bp_esi = self.get_esi_func_pair(eveesi)
+        asset_changed = self.get_owner_asset(asset_esi, self.owner_id, owner_batch)
+        bp_changed = self.get_owner_bp_asset(bp_esi, self.owner_id, owner_batch)
+        if etag_batch is not None:
+            etag_batch.merge(owner_batch)
+        return asset_changed or bp_changed
+
+    async def get_asset_async(self, etag_batch: EsiEtagBatch = None) -> bool:
+        """ get_asset的异步版本，在事件循环上请求，写入数据库在线程中执行 """
+        logger.info(f"开始刷新 {self.owner_type} {self.access_character.character_name} 资产")
+        owner_batch = EsiEtagBatch() if etag_batch is not None else None
+        asset_esi, bp_esi = self.get_esi_func_pair(eveesi_async)
+        asset_changed, bp_changed = await asyncio.gather(
+            self.get_owner_asset_async(asset_esi, self.owner_id, owner_batch),
+            self.get_owner_bp_asset_async(bp_esi, self.owner_id, owner_batch))
+        if etag_batch is not None:
+            etag_batch.merge(owner_batch)
+        return asset_changed or bp_changed
+
+    async def get_ac_token_async(self) -> str:
+        # token过期时ac_token会同步请求刷新token并写入数据库
+        return await asyncio.to_thread(lambda: self.access_character.ac_token)
+
+    def get_owner_asset(self, asset_esi, owner_id, conditional: EsiEtagBatch = None) -> bool:
         if not self.access_character:
-            return
+            return False
         ac_token = self.access_character.ac_token
-        if self.owner_type == "character":
-            begin_page = 10
-            interval = 20
-        else:
-            begin_page = 20
-            interval = 40
-        max_page = find_max_page(asset_esi, ac_token, owner_id, begin_page=begin_page, interval=interval)
 
         logger.info("请求资产。")
-        results = get_multipages_result(asset_esi, max_page, ac_token, owner_id)
-
-        with db.atomic():
-            M_Asset.delete().where((M_Asset.asset_type == self.owner_type) & (M_Asset.owner_id == self.owner_id)).execute()
-            with tqdm(total=len(results), desc="写入数据库", unit="page") as pbar:
-                for result in results:
-                    # result = [order for order in result if order["location_id"] == JITA_TRADE_HUB_STRUCTURE_ID]
-                    for asset in result:
-                        asset.update({"asset_type": self.owner_type, "owner_id": self.owner_id})
-                        if "is_blueprint_copy" not in asset:
-                            asset["is_blueprint_copy"] = False
-                    M_Asset.insert_many(result).execute()
-                    pbar.update()
-
-    def get_owner_bp_asset(self, asset_esi, owner_id):
+        changed = stream_all_pages(asset_esi, self.get_asset_writer(), ac_token, owner_id, conditional=conditional)
+        if not changed:
+            logger.info("资产未变化。")
+        return changed
+
+    async def get_owner_asset_async(self, asset_esi, owner_id, conditional: EsiEtagBatch = None) -> bool:
+        if not self.access_character:
+            return False
+        ac_token = await self.get_ac_token_async()
+
+        logger.info("请求资产。")
+        changed = await stream_all_pages_async(asset_esi, self.get_asset_writer(), ac_token, owner_id,
+                                               conditional=conditional)
+        if not changed:
+            logger.info("资产未变化。")
+        return changed
+
+    def get_asset_writer(self) -> PageWriter:
+        def row_func(result):
+            for asset in result:
+                asset.update({"asset_type": self.owner_type, "owner_id": self.owner_id})
+                if "is_blueprint_copy" not in asset:
+                    asset["is_blueprint_copy"] = False
+            return result
+        return PageWriter(M_Asset, M_AssetStaging,
+                          (M_Asset.asset_type == self.owner_type) & (M_Asset.owner_id == self.owner_id),
+                          row_func=row_func, name=f"asset {self.owner_type} {self.owner_id}")
+
+    def get_owner_bp_asset(self, asset_esi, owner_id, conditional: EsiEtagBatch = None) -> bool:
         if not self.access_character:
-            return
+            return False
         ac_token = self.access_character.ac_token
-        max_page = find_max_page(asset_esi, ac_token, owner_id, begin_page=0, interval=5)
 
         logger.info("请求bp资产。")
-        results = get_multipages_result(asset_esi, max_page, ac_token, owner_id)
-
-        with db.atomic():
-            M_BlueprintAsset.delete().where((M_BlueprintAsset.owner_type == self.owner_type) &
-                                            (M_BlueprintAsset.owner_id == self.owner_id)).execute()
-            with tqdm(total=len(results), desc="写入数据库", unit="page") as pbar:
-                for result in results:
-                    # result = [order for order in result if order["location_id"] == JITA_TRADE_HUB_STRUCTURE_ID]
-                    for asset in result:
-                        asset.update({"owner_type": self.owner_type, "owner_id": self.owner_id})
-                    M_BlueprintAsset.insert_many(result).execute()
-                    pbar.update()
+        changed = stream_all_pages(asset_esi, self.get_bp_asset_writer(), ac_token, owner_id, conditional=conditional)
+        if not changed:
+            logger.info("bp资产未变化。")
+        return changed
+
+    async def get_owner_bp_asset_async(self, asset_esi, owner_id, conditional: EsiEtagBatch = None) -> bool:
+        if not self.access_character:
+            return False
+        ac_token = await self.get_ac_token_async()
+
+        logger.info("请求bp资产。")
+        changed = await stream_all_pages_async(asset_esi, self.get_bp_asset_writer(), ac_token, owner_id,
+                                               conditional=conditional)
+        if not changed:
+            logger.info("bp资产未变化。")
+        return changed
+
+    def get_bp_asset_writer(self) -> PageWriter:
+        def row_func(result):
+            for asset in result:
+                asset.update({"owner_type": self.owner_type, "owner_id": self.owner_id})
+            return result
+        return PageWriter(M_BlueprintAsset, M_BlueprintAssetStaging,
+                          (M_BlueprintAsset.owner_type == self.owner_type) & (M_BlueprintAsset.owner_id == self.owner_id),
+                          row_func=row_func, name=f"blueprint_asset {self.owner_type} {self.owner_id}")
 
     @property
     def asset_item_count(self):
@@ -22,4 +22,4 @@ config.read(os.path.join(script_dir, '../../../config.ini'))
 # print(db_config)  # 输出：{'host': 'localhost', 'port': '5432', 'user': 'admin', 'password': 'secret'}
 
 logger.info("Config server loaded.")
-logger.info(f"database type: {config['APP']['DBTYPE']}")
\ No newline at end of file
+logger.info(f"database type: {config.get('APP', 'DBTYPE', fallback=None)}")
\ No newline at end of file
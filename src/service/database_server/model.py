@@ -109,6 +109,13 @@ class AssetCache(BaseModel):
 __all__.append(AssetCache.__name__)
 MODEL_LIST.append(AssetCache)
 
+# 流式写入的临时表，只存在于写入线程的连接中，不加入MODEL_LIST
+class AssetStaging(Asset):
+    class Meta:
+        table_name = 'asset_staging'
+        temporary = True
+__all__.append(AssetStaging.__name__)
+
 class AssetOwner(BaseModel):
     asset_owner_qq = IntegerField()
     asset_owner_id = IntegerField()
@@ -138,6 +145,12 @@ class MarketOrder(BaseModel):
 __all__.append(MarketOrder.__name__)
 MODEL_LIST.append(MarketOrder)
 
+class MarketOrderStaging(MarketOrder):
+    class Meta:
+        table_name = 'market_order_staging'
+        temporary = True
+__all__.append(MarketOrderStaging.__name__)
+
 class MarketOrderCache(BaseModel):
     duration = IntegerField()
     is_buy_order = BooleanField()
@@ -264,6 +277,12 @@ class BlueprintAsset(BaseModel):
 __all__.append(BlueprintAsset.__name__)
 MODEL_LIST.append(BlueprintAsset)
 
+class BlueprintAssetStaging(BlueprintAsset):
+    class Meta:
+        table_name = "blueprint_asset_staging"
+        temporary = True
+__all__.append(BlueprintAssetStaging.__name__)
+
 
 class BlueprintAssetCache(BaseModel):
     item_id = BigIntegerField(primary_key=True)
@@ -333,4 +352,15 @@ class MarketHistory(BaseModel):
             (('region_id', 'type_id', 'date'), True),
         )
 __all__.append(MarketHistory.__name__)
-MODEL_LIST.append(MarketHistory)
\ No newline at end of file
+MODEL_LIST.append(MarketHistory)
+
+class EsiEtag(BaseModel):
+    cache_key = CharField(primary_key=True)  # url + params + 角色的sha1
+    etag = CharField()
+    content_length = IntegerField()
+    pages = IntegerField(null=True)
+    update_date = DateTimeField()
+    class Meta:
+        table_name = "esi_etag"
+__all__.append(EsiEtag.__name__)
+MODEL_LIST.append(EsiEtag)
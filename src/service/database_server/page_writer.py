@@ -0,0 +1,116 @@
+import queue
+import threading
+
+from peewee import AutoField
+
+from .connect import db
+from ..config_server.config import config
+
+# kahuna logger
+from ..log_server import logger
+
+# 等待写入的页数上限，队列满时请求方阻塞，内存中最多保留这么多页
+ESI_STREAM_QUEUE_SIZE = config.getint('EVE', 'ESI_STREAM_QUEUE_SIZE', fallback=20)
+# 写入临时表时每个事务的行数
+ESI_STREAM_BATCH_SIZE = config.getint('EVE', 'ESI_STREAM_BATCH_SIZE', fallback=5000)
+
+
+class PageWriter:
+    """
+    分页数据的流式写入。
+    请求方每得到一页就put，写入线程从有界队列中取出，按批insert_many到临时表staging_model。
+    请求结束后finish(commit=True)在一个短事务中删除目标表中where选中的旧数据，再从临时表复制新数据；
+    abort()放弃本次写入，目标表不变。
+    临时表只存在于写入线程的连接中，写临时表不占用主库的写锁，读者在替换前一直看到完整的旧数据。
+    """
+    def __init__(self, model, staging_model, where, row_func=None, name: str = ""):
+        self.model = model
+        self.staging_model = staging_model
+        self.where = where
+        # 在请求方执行，放入队列前过滤或补充字段
+        self.row_func = row_func
+        self.name = name or model._meta.table_name
+        self.queue = queue.Queue(maxsize=ESI_STREAM_QUEUE_SIZE)
+        self.thread = None
+        self.commit = False
+        self.error = None
+        self.page_count = 0
+        self.row_count = 0
+
+    def start(self):
+        self.thread = threading.Thread(target=self.run, name=f"page_writer_{self.name}", daemon=True)
+        self.thread.start()
+        return self
+
+    def put(self, page: list):
+        if self.row_func:
+            page = self.row_func(page)
+        if page:
+            self.queue.put(page)
+
+    def finish(self, commit: bool = True) -> int:
+        """ 等待写入线程结束，返回写入的行数，写入失败时抛出写入线程的异常 """
+        self.commit = commit
+        self.queue.put(None)
+        self.thread.join()
+        if self.error is not None:
+            raise self.error
+        return self.row_count
+
+    def abort(self):
+        """ 请求方出错时放弃写入，不抛出写入线程的异常 """
+        self.commit = False
+        self.queue.put(None)
+        self.thread.join()
+
+    def run(self):
+        page_end = False
+        try:
+            self.staging_model.create_table(safe=True)
+            self.staging_model.delete().execute()
+            batch = []
+            while (page := self.queue.get()) is not None:
+                batch.append(page)
+                self.page_count += 1
+                if sum(len(rows) for rows in batch) >= ESI_STREAM_BATCH_SIZE:
+                    self.write_batch(batch)
+                    batch = []
+            page_end = True
+            self.write_batch(batch)
+            if self.commit:
+                self.swap()
+                logger.info(f"{self.name}: 流式写入 {self.page_count} 页，{self.row_count} 行。")
+        except Exception as e:
+            self.error = e
+            logger.error(f"{self.name} 写入失败: {e!r}")
+            # 继续取空队列，避免请求方阻塞在put
+            while not page_end and self.queue.get() is not None:
+                pass
+        finally:
+            self.close()
+
+    def write_batch(self, batch: list):
+        if not batch:
+            return
+        with db.atomic():
+            for rows in batch:
+                self.staging_model.insert_many(rows).execute()
+                self.row_count += len(rows)
+
+    def swap(self):
+        # 自增主键由目标表重新生成，避免与目标表中其他数据冲突
+        column_list = [f'"{field.column_name}"' for field in self.model._meta.sorted_fields
+                       if not isinstance(field, AutoField)]
+        columns = ", ".join(column_list)
+        with db.atomic():
+            self.model.delete().where(self.where).execute()
+            db.execute_sql(f'INSERT INTO "{self.model._meta.table_name}" ({columns}) '
+                           f'SELECT {columns} FROM "{self.staging_model._meta.table_name}"')
+
+    def close(self):
+        try:
+            self.staging_model.drop_table(safe=True)
+        finally:
+            # 写入线程的连接只用这一次，关闭后临时表也随之释放
+            if not db.is_closed():
+                db.close()
@@ -0,0 +1,47 @@
+import threading
+
+# kahuna logger
+from ..log_server import logger
+
+# 各个*_cache快照表，每次copy_to_cache完成后版本号加1
+ASSET_SNAPSHOT = 'asset'
+JOB_SNAPSHOT = 'job'
+BP_ASSET_SNAPSHOT = 'bp_asset'
+MARKET_PRICE_SNAPSHOT = 'market_price'
+ORDER_SNAPSHOT = 'order'
+SYSTEM_COST_SNAPSHOT = 'system_cost'
+SNAPSHOT_LIST = [ASSET_SNAPSHOT, JOB_SNAPSHOT, BP_ASSET_SNAPSHOT,
+                 MARKET_PRICE_SNAPSHOT, ORDER_SNAPSHOT, SYSTEM_COST_SNAPSHOT]
+
+
+class SnapshotVersion:
+    """
+    快照版本计数器。
+    依赖快照数据的结果缓存把版本号算进key，并通过add_listener在快照刷新时清理受影响的结果。
+    """
+    version_dict = {snapshot: 0 for snapshot in SNAPSHOT_LIST}
+    listener_list = []
+    lock = threading.Lock()
+
+    @classmethod
+    def bump(cls, *snapshot_list: str):
+        with cls.lock:
+            for snapshot in snapshot_list:
+                cls.version_dict[snapshot] += 1
+            listener_list = list(cls.listener_list)
+        for listener in listener_list:
+            try:
+                listener(snapshot_list)
+            except Exception as e:
+                logger.error(f"snapshot listener failed. {e}")
+
+    @classmethod
+    def get_version(cls, snapshot_list: list = None) -> tuple:
+        with cls.lock:
+            return tuple(cls.version_dict[snapshot] for snapshot in (snapshot_list or SNAPSHOT_LIST))
+
+    @classmethod
+    def add_listener(cls, listener):
+        """ listener(snapshot_list)，在版本号更新后调用 """
+        with cls.lock:
+            cls.listener_list.append(listener)
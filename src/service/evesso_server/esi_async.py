@@ -0,0 +1,101 @@
+import asyncio
+import importlib.util
+import time
+
+from .esi_session import (EsiSession, RETRY_STATUS_SET, ESI_POOL_SIZE, ESI_MAX_RETRY, ESI_TIMEOUT)
+from ..config_server.config import config
+
+# kahuna logger
+from ..log_server import logger
+
+# 所有刷新任务共用的ESI并发请求数
+ESI_ASYNC_CONCURRENCY = config.getint('EVE', 'ESI_ASYNC_CONCURRENCY', fallback=50)
+# 错误限流剩余次数不高于该值时，暂停请求直到限流窗口重置
+ESI_ERROR_LIMIT_THRESHOLD = config.getint('EVE', 'ESI_ERROR_LIMIT_THRESHOLD', fallback=20)
+# 安装了h2时使用HTTP/2，多个请求复用同一个连接
+HTTP2_AVAILABLE = importlib.util.find_spec('h2') is not None
+
+
+class AsyncEsiClient:
+    """
+    运行在bot事件循环上的ESI客户端，所有刷新任务共用连接和并发限制。
+    按响应头X-ESI-Error-Limit-Remain/-Reset记录错误限流的状态，剩余次数过低时在发送请求前等待窗口重置。
+    客户端和信号量绑定事件循环，在其他事件循环中使用时重新创建。
+    """
+    client = None
+    semaphore = None
+    loop = None
+    error_limit_remain = None
+    error_limit_reset_time = 0
+    request_count = 0
+
+    @classmethod
+    def get_client(cls) -> 'httpx.AsyncClient':
+        # 只有定时刷新使用，在第一次请求时导入，离线工具导入ESI模块时不需要httpx
+        import httpx
+
+        loop = asyncio.get_running_loop()
+        if cls.loop is not loop:
+            cls.client = httpx.AsyncClient(
+                http2=HTTP2_AVAILABLE,
+                timeout=ESI_TIMEOUT,
+                limits=httpx.Limits(max_connections=ESI_POOL_SIZE, max_keepalive_connections=ESI_POOL_SIZE),
+                headers={'Accept-Encoding': 'gzip'})
+            cls.semaphore = asyncio.Semaphore(ESI_ASYNC_CONCURRENCY)
+            cls.loop = loop
+            logger.info(f"async esi client created. http2: {HTTP2_AVAILABLE}")
+        return cls.client
+
+    @classmethod
+    async def close(cls):
+        if cls.client is not None and cls.loop is asyncio.get_running_loop():
+            await cls.client.aclose()
+        cls.client, cls.semaphore, cls.loop = None, None, None
+
+    @classmethod
+    def update_error_limit(cls, response: 'httpx.Response'):
+        try:
+            remain = int(response.headers['X-ESI-Error-Limit-Remain'])
+            reset = int(response.headers['X-ESI-Error-Limit-Reset'])
+        except (KeyError, ValueError):
+            return
+        cls.error_limit_remain = remain
+        cls.error_limit_reset_time = time.monotonic() + reset
+
+    @classmethod
+    async def wait_error_limit(cls):
+        if cls.error_limit_remain is None or cls.error_limit_remain > ESI_ERROR_LIMIT_THRESHOLD:
+            return
+        wait = cls.error_limit_reset_time - time.monotonic()
+        if wait > 0:
+            logger.warning(f"esi error limit remain {cls.error_limit_remain}, wait {wait:.0f}s for reset.")
+            await asyncio.sleep(wait)
+
+    @classmethod
+    async def get(cls, url, params=None, headers=None) -> 'httpx.Response':
+        """ 与EsiSession.get相同的重试规则，返回最后一次的响应 """
+        import httpx
+
+        client = cls.get_client()
+        # 与requests一致，不发送值为None的参数
+        params = {k: v for k, v in (params or {}).items() if v is not None}
+        for attempt in range(ESI_MAX_RETRY + 1):
+            response = None
+            async with cls.semaphore:
+                await cls.wait_error_limit()
+                cls.request_count += 1
+                try:
+                    response = await client.get(url, params=params, headers=headers)
+                    cls.update_error_limit(response)
+                    if response.status_code not in RETRY_STATUS_SET:
+                        return response
+                except httpx.TransportError as e:
+                    if attempt == ESI_MAX_RETRY:
+                        raise
+                    logger.warning(f"esi request failed: {url} {params}. {e!r}")
+            if attempt == ESI_MAX_RETRY:
+                return response
+            wait = EsiSession.get_retry_wait(response, attempt)
+            logger.warning(f"esi retry {attempt + 1}/{ESI_MAX_RETRY} after {wait:.1f}s: "
+                           f"{url} {params} {response.status_code if response is not None else ''}")
+            await asyncio.sleep(wait)
@@ -0,0 +1,143 @@
+import base64
+import hashlib
+import json
+import threading
+from datetime import datetime
+
+from ..database_server.model import EsiEtag as M_EsiEtag
+from ..database_server.connect import db
+
+# kahuna logger
+from ..log_server import logger
+
+
+class NotModified:
+    """
+    条件请求返回304时get_request的返回值，数据与上次请求相同。
+    content_length为上次响应的大小，用于统计节省的流量。
+    """
+    __slots__ = ('content_length',)
+
+    def __init__(self, content_length: int = 0):
+        self.content_length = content_length
+
+    def __repr__(self):
+        return f"NotModified({self.content_length})"
+
+
+class EsiEtagCache:
+    """
+    ESI GET请求的ETag缓存，key为url + params + 角色。
+    读取时在内存中查找，启动后第一次使用时从esi_etag表读入，更新先记录在内存中，由save统一写入数据库。
+    """
+    etag_dict = None  # {cache_key: [etag, content_length, pages]}
+    pending_dict = dict()
+    stats_dict = dict()  # {resource: [pages, skipped_pages, bytes_saved]}
+    lock = threading.Lock()
+
+    @classmethod
+    def load(cls):
+        if cls.etag_dict is None:
+            with cls.lock:
+                if cls.etag_dict is None:
+                    cls.etag_dict = {row.cache_key: [row.etag, row.content_length, row.pages]
+                                     for row in M_EsiEtag.select()}
+        return cls.etag_dict
+
+    @staticmethod
+    def get_token_character(headers: dict) -> str:
+        """ ESI的access token是JWT，sub为"CHARACTER:EVE:<character_id>"，token刷新后角色不变 """
+        authorization = headers.get("Authorization", "")
+        if not authorization:
+            return ""
+        try:
+            payload = authorization.split(" ")[-1].split(".")[1]
+            payload += "=" * (-len(payload) % 4)
+            return json.loads(base64.urlsafe_b64decode(payload))["sub"].split(":")[-1]
+        except (IndexError, KeyError, ValueError, AttributeError):
+            return ""
+
+    @classmethod
+    def get_cache_key(cls, url: str, params: dict, headers: dict) -> str:
+        param_list = sorted((k, v) for k, v in params.items() if v is not None)
+        raw = json.dumps([url, param_list, cls.get_token_character(headers)], default=str)
+        return hashlib.sha1(raw.encode()).hexdigest()
+
+    @classmethod
+    def get(cls, cache_key: str):
+        """ 返回[etag, content_length, pages]或None """
+        return cls.load().get(cache_key)
+
+    @classmethod
+    def set(cls, cache_key: str, etag: str, content_length: int, pages: int = None):
+        cls.update({cache_key: [etag, content_length, pages]})
+
+    @classmethod
+    def update(cls, etag_dict: dict):
+        """ etag_dict: {cache_key: [etag, content_length, pages]} """
+        cls.load()
+        with cls.lock:
+            cls.etag_dict.update(etag_dict)
+            cls.pending_dict.update(etag_dict)
+
+    @classmethod
+    def save(cls):
+        with cls.lock:
+            pending_dict, cls.pending_dict = cls.pending_dict, dict()
+        if not pending_dict:
+            return
+        now = datetime.now()
+        with db.atomic():
+            M_EsiEtag.insert_many([
+                {'cache_key': key, 'etag': etag, 'content_length': content_length, 'pages': pages, 'update_date': now}
+                for key, (etag, content_length, pages) in pending_dict.items()
+            ]).on_conflict_replace().execute()
+
+    @classmethod
+    def record(cls, resource: str, result_list: list):
+        """ 记录一次请求的页数、未变化的页数和节省的字节数 """
+        skipped_list = [result for result in result_list if isinstance(result, NotModified)]
+        bytes_saved = sum(result.content_length for result in skipped_list)
+        with cls.lock:
+            stats = cls.stats_dict.setdefault(resource, [0, 0, 0])
+            stats[0] += len(result_list)
+            stats[1] += len(skipped_list)
+            stats[2] += bytes_saved
+        logger.info(f"{resource}: {len(skipped_list)}/{len(result_list)} 页未变化，节省 {bytes_saved} 字节。")
+
+    @classmethod
+    def get_stats_log(cls) -> str:
+        with cls.lock:
+            stats_list = [(resource, list(stats)) for resource, stats in cls.stats_dict.items()]
+        return "\n".join(f"{resource}: 请求 {pages} 页，未变化 {skipped} 页，节省 {bytes_saved} 字节"
+                         for resource, (pages, skipped, bytes_saved) in stats_list)
+
+
+class EsiEtagBatch:
+    """
+    一次请求(可能有多页)得到的新ETag，作为conditional参数传给ESI接口时先暂存在这里。
+    调用方把数据写入数据库后commit，写入失败或放弃写入时不commit，本批ETag随之丢弃。
+    否则ETag已经更新而数据没有写入，之后的请求每页都返回304，数据库一直停留在旧数据。
+    数据之后还要复制到cache表时，每个库存写入成功后merge到管理类的批次，管理类在copy_to_cache完成后commit。
+    """
+    def __init__(self):
+        self.etag_dict = dict()  # {cache_key: [etag, content_length, pages]}
+        self.lock = threading.Lock()
+
+    def set(self, cache_key: str, etag: str, content_length: int, pages: int = None):
+        with self.lock:
+            self.etag_dict[cache_key] = [etag, content_length, pages]
+
+    def merge(self, etag_batch):
+        """ 把etag_batch中的ETag移入本批次 """
+        with etag_batch.lock:
+            etag_dict, etag_batch.etag_dict = etag_batch.etag_dict, dict()
+        with self.lock:
+            self.etag_dict.update(etag_dict)
+
+    def commit(self):
+        with self.lock:
+            etag_dict, self.etag_dict = self.etag_dict, dict()
+        if etag_dict:
+            EsiEtagCache.update(etag_dict)
+            EsiEtagCache.save()
@@ -0,0 +1,116 @@
+import random
+import threading
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from ..config_server.config import config
+
+# kahuna logger
+from ..log_server import logger
+
+# 连接池大小，不小于分页请求的并发线程数，否则多出的连接用完即丢弃
+ESI_POOL_SIZE = config.getint('EVE', 'ESI_POOL_SIZE', fallback=100)
+# 失败后的最大重试次数
+ESI_MAX_RETRY = config.getint('EVE', 'ESI_MAX_RETRY', fallback=3)
+# 指数退避的初始等待和最大等待(秒)
+ESI_BACKOFF_BASE = config.getfloat('EVE', 'ESI_BACKOFF_BASE', fallback=1)
+ESI_BACKOFF_MAX = config.getfloat('EVE', 'ESI_BACKOFF_MAX', fallback=60)
+ESI_TIMEOUT = config.getfloat('EVE', 'ESI_TIMEOUT', fallback=30)
+
+# 420为ESI错误限流，其余为网关和服务端的临时错误
+RETRY_STATUS_SET = {420, 429, 500, 502, 503, 504}
+
+
+class EsiSession:
+    """
+    ESI请求共用的连接池。
+    所有线程共用一个HTTPAdapter，即同一组keep-alive连接，Session按线程创建，不在线程间共享Session的状态。
+    """
+    adapter = None
+    local = threading.local()
+    lock = threading.Lock()
+    request_count = 0
+
+    @classmethod
+    def get_adapter(cls) -> HTTPAdapter:
+        if cls.adapter is None:
+            with cls.lock:
+                if cls.adapter is None:
+                    cls.adapter = HTTPAdapter(pool_connections=4, pool_maxsize=ESI_POOL_SIZE)
+        return cls.adapter
+
+    @classmethod
+    def get_session(cls) -> requests.Session:
+        session = getattr(cls.local, 'session', None)
+        if session is None:
+            session = requests.Session()
+            session.mount('https://', cls.get_adapter())
+            session.mount('http://', cls.get_adapter())
+            session.headers.update({'Accept-Encoding': 'gzip', 'Connection': 'keep-alive'})
+            cls.local.session = session
+        return session
+
+    @staticmethod
+    def get_retry_wait(response, attempt: int) -> float:
+        """ 优先使用服务端给出的等待时间，否则指数退避并加入抖动 """
+        if response is not None:
+            # ESI每个响应都带错误限流的重置时间，只在被限流(420)时使用
+            header_list = ['Retry-After', 'X-ESI-Error-Limit-Reset'] if response.status_code == 420 else ['Retry-After']
+            for header in header_list:
+                if header in response.headers:
+                    try:
+                        return min(float(response.headers[header]), ESI_BACKOFF_MAX)
+                    except ValueError:
+                        pass
+        return min(ESI_BACKOFF_BASE * 2 ** attempt, ESI_BACKOFF_MAX) * random.uniform(0.5, 1)
+
+    @classmethod
+    def get(cls, url, params=None, headers=None) -> requests.Response:
+        """
+        与requests.get相同，返回最后一次的响应。
+        连接错误和RETRY_STATUS_SET中的状态码最多重试ESI_MAX_RETRY次，仍然连接失败时抛出异常。
+        """
+        session = cls.get_session()
+        for attempt in range(ESI_MAX_RETRY + 1):
+            with cls.lock:
+                cls.request_count += 1
+            response = None
+            try:
+                response = session.get(url, params=params, headers=headers, timeout=ESI_TIMEOUT)
+                if response.status_code not in RETRY_STATUS_SET:
+                    return response
+            except (requests.ConnectionError, requests.Timeout) as e:
+                if attempt == ESI_MAX_RETRY:
+                    raise
+                logger.warning(f"esi request failed: {url} {params}. {e}")
+            if attempt == ESI_MAX_RETRY:
+                return response
+            wait = cls.get_retry_wait(response, attempt)
+            logger.warning(f"esi retry {attempt + 1}/{ESI_MAX_RETRY} after {wait:.1f}s: "
+                           f"{url} {params} {response.status_code if response is not None else ''}")
+            time.sleep(wait)
+
+    @classmethod
+    def get_connection_count(cls) -> int:
+        """ 连接池建立过的连接数，即TLS握手次数 """
+        if cls.adapter is None:
+            return 0
+        pools = cls.adapter.poolmanager.pools
+        return sum(pool.num_connections for pool in (pools.get(key) for key in pools.keys()) if pool is not None)
+
+    @classmethod
+    def get_stats(cls) -> tuple[int, int]:
+        """ (请求数, 新建连接数) """
+        with cls.lock:
+            request_count = cls.request_count
+        return request_count, cls.get_connection_count()
+
+    @classmethod
+    def get_stats_log(cls, begin_stats: tuple = (0, 0)) -> str:
+        request_count, connection_count = cls.get_stats()
+        request_count -= begin_stats[0]
+        connection_count -= begin_stats[1]
+        return (f"请求 {request_count} 次，新建连接 {connection_count} 次，"
+                f"节省握手 {max(request_count - connection_count, 0)} 次")
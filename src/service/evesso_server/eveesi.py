@@ -1,19 +1,54 @@
-import requests
 from cachetools import TTLCache, cached
 
+from .esi_etag import EsiEtagCache, EsiEtagBatch, NotModified
+from .esi_session import EsiSession
+
 # kahuna logger
 from ..log_server import logger
 
 permission_set = set()
 
-def get_request(url, headers=dict(), params=dict()):
-    response = requests.get(url, params=params, headers=headers)
+def get_request(url, headers=dict(), params=dict(), with_headers: bool = False, conditional: bool = False):
+    """
+    with_headers为True时返回(data, 响应头)，用于读取X-Pages等分页信息。
+    conditional为True时带上次的ETag发送If-None-Match，数据未变化时返回NotModified。
+    conditional为EsiEtagBatch时新ETag暂存在其中，由调用方在数据写入后commit。
+    """
+    cache_key, etag_data, headers = get_conditional_headers(url, headers, params, conditional)
+    response = EsiSession.get(url, params=params, headers=headers)
+    return get_response_data(response, cache_key, etag_data, with_headers, conditional)
+
+def get_conditional_headers(url, headers: dict, params: dict, conditional: bool) -> tuple:
+    """ 返回(cache_key, etag_data, headers)，同步和异步请求共用 """
+    cache_key, etag_data = None, None
+    if conditional:
+        cache_key = EsiEtagCache.get_cache_key(url, params, headers)
+        etag_data = EsiEtagCache.get(cache_key)
+        if etag_data:
+            headers = dict(headers, **{"If-None-Match": etag_data[0]})
+    return cache_key, etag_data, headers
+
+def get_response_data(response, cache_key, etag_data, with_headers: bool, conditional=False):
+    """ 解析requests或httpx的响应，同步和异步请求共用 """
     if response.status_code == 200:
         data = response.json()
-        return data  # 注意：实际的键可能不同，请参考 ESI 文档
+        if cache_key and response.headers.get("ETag"):
+            etag_cache = conditional if isinstance(conditional, EsiEtagBatch) else EsiEtagCache
+            etag_cache.set(cache_key, response.headers["ETag"],
+                           int(response.headers.get("Content-Length", len(response.content))),
+                           int(response.headers["X-Pages"]) if "X-Pages" in response.headers else None)
+        # 注意：实际的键可能不同，请参考 ESI 文档
+        return (data, response.headers) if with_headers else data
+    elif response.status_code == 304 and cache_key and etag_data:
+        # 304响应可能不带X-Pages，使用上次记录的页数
+        response_headers = response.headers.copy()
+        if etag_data[2] and "X-Pages" not in response_headers:
+            response_headers["X-Pages"] = str(etag_data[2])
+        data = NotModified(etag_data[1])
+        return (data, response_headers) if with_headers else data
     else:
         logger.warning(response.text)
-        return None
+        return (None, response.headers) if with_headers else None
 
 def verify_token(access_token):
     return get_request(
@@ -40,40 +75,53 @@ def character_character_id_portrait(access_token, character_id):
         headers={"Authorization": f"Bearer {access_token}"}
     )
 
-def characters_character_id_blueprints(page:int, access_token: str, character_id: int):
+def characters_character_id_blueprints(page:int, access_token: str, character_id: int, with_headers: bool = False,
+                                       conditional: bool = False):
     return get_request(
         f"https://esi.evetech.net/latest/characters/{character_id}/blueprints/",
         headers={"Authorization": f"Bearer {access_token}"},
-        params={"page": page}
+        params={"page": page},
+        with_headers=with_headers,
+        conditional=conditional
     )
 
-def industry_systems():
+def industry_systems(conditional: bool = False):
     return get_request(
-        f"https://esi.evetech.net/latest/industry/systems/"
+        f"https://esi.evetech.net/latest/industry/systems/",
+        conditional=conditional
     )
 
-def markets_structures(page: int, access_token: str, structure_id: int) -> dict:
+def markets_structures(page: int, access_token: str, structure_id: int, with_headers: bool = False,
+                       conditional: bool = False) -> dict:
     return get_request(
         f"https://esi.evetech.net/latest/markets/structures/{structure_id}/",
         headers={"Authorization": f"Bearer {access_token}"},
-        params={"page": page}
+        params={"page": page},
+        with_headers=with_headers,
+        conditional=conditional
     )
 
-def markets_region_orders(page: int, region_id: int, type_id: int =None):
+def markets_region_orders(page: int, region_id: int, type_id: int =None, with_headers: bool = False,
+                          conditional: bool = False):
     return get_request(
         f"https://esi.evetech.net/latest/markets/{region_id}/orders/",
         headers={},
-        params={"page": page, "type_id": type_id}
+        params={"page": page, "type_id": type_id},
+        with_headers=with_headers,
+        conditional=conditional
     )
 
-def characters_character_assets(page: int, access_token: str, character_id: int):
+def characters_character_assets(page: int, access_token: str, character_id: int, with_headers: bool = False,
+                                conditional: bool = False):
     """
 
     """
     return get_request(
         f"https://esi.evetech.net/latest/characters/{character_id}/assets/",
         headers={"Authorization": f"Bearer {access_token}"},
-        params={"page": page}
+        params={"page": page},
+        with_headers=with_headers,
+        conditional=conditional
     )
 
 CHARACRER_INFO_CACHE = TTLCache(maxsize=10, ttl=1200)
@@ -96,7 +144,8 @@ def characters_character(character_id):
         f"https://esi.evetech.net/latest/characters/{character_id}/"
     )
 
-def corporations_corporation_assets(page: int, access_token: str, corporation_id: int):
+def corporations_corporation_assets(page: int, access_token: str, corporation_id: int, with_headers: bool = False,
+                                    conditional: bool = False):
     """
     # is_blueprint_copy - Boolean
     # is_singleton - Boolean
@@ -110,7 +159,9 @@ def corporations_corporation_assets(page: int, access_token: str, corporation_id
     return get_request(
         f"https://esi.evetech.net/latest/corporations/{corporation_id}/assets/",
         headers={"Authorization": f"Bearer {access_token}"},
-        params={"page": page}
+        params={"page": page},
+        with_headers=with_headers,
+        conditional=conditional
     )
 
 def corporations_corporation_id_roles(access_token: str, corporation_id: int):
@@ -119,21 +170,27 @@ def corporations_corporation_id_roles(access_token: str, corporation_id: int):
         headers={"Authorization": f"Bearer {access_token}"}
     )
 
-def corporations_corporation_id_industry_jobs(page: int, access_token: str, corporation_id: int, include_completed: bool = False):
+def corporations_corporation_id_industry_jobs(page: int, access_token: str, corporation_id: int, include_completed: bool = False,
+                                              with_headers: bool = False, conditional: bool = False):
     return get_request(
         f"https://esi.evetech.net/latest/corporations/{corporation_id}/industry/jobs/",
         headers={"Authorization": f"Bearer {access_token}"},
         params={
             "page": page,
             "include_completed": include_completed
-        }
+        },
+        with_headers=with_headers,
+        conditional=conditional
     )
 
-def corporations_corporation_id_blueprints(page: int, access_token: str, corporation_id: int):
+def corporations_corporation_id_blueprints(page: int, access_token: str, corporation_id: int, with_headers: bool = False,
+                                           conditional: bool = False):
     return get_request(
         f"https://esi.evetech.net/latest/corporations/{corporation_id}/blueprints/",
         headers={"Authorization": f"Bearer {access_token}"},
-        params={"page": page}
+        params={"page": page},
+        with_headers=with_headers,
+        conditional=conditional
     )
 
 def universe_structures_structure(access_token: str, structure_id: int):
@@ -157,7 +214,8 @@ def universe_stations_station(station_id):
         f"https://esi.evetech.net/latest/universe/stations/{station_id}/"
     )
 
-def characters_character_id_industry_jobs(access_token: str, character_id: int, include_completed: bool = False):
+def characters_character_id_industry_jobs(access_token: str, character_id: int, include_completed: bool = False,
+                                          conditional: bool = False):
     """
     List character industry jobs
     Args:
@@ -175,13 +233,15 @@ def characters_character_id_industry_jobs(access_token: str, character_id: int,
         },
         params={
             "include_completed": include_completed
-        }
+        },
+        conditional=conditional
     )
 
 
-def markets_prices():
+def markets_prices(conditional: bool = False):
     return get_request(
-        f'https://esi.evetech.net/latest/markets/prices/'
+        f'https://esi.evetech.net/latest/markets/prices/',
+        conditional=conditional
     )
 
 # /markets/{region_id}/history/
@@ -0,0 +1,107 @@
+from .eveesi import get_conditional_headers, get_response_data
+from .esi_async import AsyncEsiClient
+
+# 定时刷新使用的ESI接口的异步版本，参数和返回值与eveesi中的同名函数相同
+
+async def get_request(url, headers=dict(), params=dict(), with_headers: bool = False, conditional: bool = False):
+    cache_key, etag_data, headers = get_conditional_headers(url, headers, params, conditional)
+    response = await AsyncEsiClient.get(url, params=params, headers=headers)
+    return get_response_data(response, cache_key, etag_data, with_headers, conditional)
+
+async def characters_character_id_blueprints(page:int, access_token: str, character_id: int, with_headers: bool = False,
+                                             conditional: bool = False):
+    return await get_request(
+        f"https://esi.evetech.net/latest/characters/{character_id}/blueprints/",
+        headers={"Authorization": f"Bearer {access_token}"},
+        params={"page": page},
+        with_headers=with_headers,
+        conditional=conditional
+    )
+
+async def industry_systems(conditional: bool = False):
+    return await get_request(
+        f"https://esi.evetech.net/latest/industry/systems/",
+        conditional=conditional
+    )
+
+async def markets_structures(page: int, access_token: str, structure_id: int, with_headers: bool = False,
+                             conditional: bool = False) -> dict:
+    return await get_request(
+        f"https://esi.evetech.net/latest/markets/structures/{structure_id}/",
+        headers={"Authorization": f"Bearer {access_token}"},
+        params={"page": page},
+        with_headers=with_headers,
+        conditional=conditional
+    )
+
+async def markets_region_orders(page: int, region_id: int, type_id: int =None, with_headers: bool = False,
+                                conditional: bool = False):
+    return await get_request(
+        f"https://esi.evetech.net/latest/markets/{region_id}/orders/",
+        headers={},
+        params={"page": page, "type_id": type_id},
+        with_headers=with_headers,
+        conditional=conditional
+    )
+
+async def characters_character_assets(page: int, access_token: str, character_id: int, with_headers: bool = False,
+                                      conditional: bool = False):
+    return await get_request(
+        f"https://esi.evetech.net/latest/characters/{character_id}/assets/",
+        headers={"Authorization": f"Bearer {access_token}"},
+        params={"page": page},
+        with_headers=with_headers,
+        conditional=conditional
+    )
+
+async def corporations_corporation_assets(page: int, access_token: str, corporation_id: int, with_headers: bool = False,
+                                          conditional: bool = False):
+    return await get_request(
+        f"https://esi.evetech.net/latest/corporations/{corporation_id}/assets/",
+        headers={"Authorization": f"Bearer {access_token}"},
+        params={"page": page},
+        with_headers=with_headers,
+        conditional=conditional
+    )
+
+async def corporations_corporation_id_industry_jobs(page: int, access_token: str, corporation_id: int, include_completed: bool = False,
+                                                    with_headers: bool = False, conditional: bool = False):
+    return await get_request(
+        f"https://esi.evetech.net/latest/corporations/{corporation_id}/industry/jobs/",
+        headers={"Authorization": f"Bearer {access_token}"},
+        params={
+            "page": page,
+            "include_completed": include_completed
+        },
+        with_headers=with_headers,
+        conditional=conditional
+    )
+
+async def corporations_corporation_id_blueprints(page: int, access_token: str, corporation_id: int, with_headers: bool = False,
+                                                 conditional: bool = False):
+    return await get_request(
+        f"https://esi.evetech.net/latest/corporations/{corporation_id}/blueprints/",
+        headers={"Authorization": f"Bearer {access_token}"},
+        params={"page": page},
+        with_headers=with_headers,
+        conditional=conditional
+    )
+
+async def characters_character_id_industry_jobs(access_token: str, character_id: int, include_completed: bool = False,
+                                                conditional: bool = False):
+    return await get_request(
+        f"https://esi.evetech.net/latest/characters/{character_id}/industry/jobs/",
+        headers={
+            "Authorization": f"Bearer {access_token}"
+        },
+        params={
+            "include_completed": include_completed
+        },
+        conditional=conditional
+    )
+
+async def markets_prices(conditional: bool = False):
+    return await get_request(
+        f'https://esi.evetech.net/latest/markets/prices/',
+        conditional=conditional
+    )
@@ -2,9 +2,39 @@ import functools
 import json
 from datetime import datetime
 import asyncio
-from concurrent.futures import ThreadPoolExecutor
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from itertools import islice
 from tqdm import tqdm
 
+from .esi_etag import EsiEtagCache, EsiEtagBatch, NotModified
+from .esi_session import EsiSession, ESI_POOL_SIZE
+from .esi_async import AsyncEsiClient
+from ..config_server.config import config
+
+# kahuna logger
+from ..log_server import logger
+
+# 流式请求时同时请求和等待写入的页数上限
+ESI_STREAM_WINDOW = config.getint('EVE', 'ESI_STREAM_WINDOW', fallback=50)
+
+class EsiRequestPool:
+    """
+    同步分页请求共用的线程池，线程数与连接池大小ESI_POOL_SIZE相同。
+    不再每次请求新建线程池，多个请求同时进行时总并发也不超过连接数。
+    """
+    executor = None
+    lock = threading.Lock()
+
+    @classmethod
+    def get_executor(cls) -> ThreadPoolExecutor:
+        if cls.executor is None:
+            with cls.lock:
+                if cls.executor is None:
+                    cls.executor = ThreadPoolExecutor(max_workers=ESI_POOL_SIZE, thread_name_prefix="esi_request")
+        return cls.executor
+
+
 class DateTimeEncoder(json.JSONEncoder):
     """Custom JSONEncoder subclass to handle datetime objects."""
 
@@ -14,42 +44,263 @@ class DateTimeEncoder(json.JSONEncoder):
 
         return super().default(o)  # Default serialization for other types
 
-# Find the max page using binary search
-def find_max_page_binary_search(esi_func, start, end, *args, **kwargs):
-    if end - start <= 1:
-        return start
-
-    mid = (start + end) // 2
-    if esi_func(mid, *args, **kwargs):
-        # If the mid page exists, search the upper half
-        return find_max_page_binary_search(esi_func, mid, end, *args, **kwargs)
-    else:
-        # Otherwise, search the lower half
-        return find_max_page_binary_search(esi_func, start, mid, *args, **kwargs)
-
-
-def find_max_page(esi_func, *args, begin_page: int = 500, interval: int = 500, **kwargs):
-    initial_page = 1
-    page = initial_page
-
-    # Check pages in the specified interval
-    page += begin_page
-    while esi_func(page, *args, **kwargs):
-        page += interval
-
-    # Once we find a page that doesn't exist, we know that the max page must be between `page - interval` and `page`.
-    # So we use binary search within this range to find the exact max page.
-    return find_max_page_binary_search(esi_func, page - interval, page, *args, **kwargs)
-
-def get_multipages_result(esi_func, max_page, *args, **kwargs):
-    with ThreadPoolExecutor(max_workers=100) as executor:
-        futures = [executor.submit(esi_func, page, *args, **kwargs) for
-                   page in range(1, max_page + 1)]
-        results = []
-        count = 1
-        for future in tqdm(futures, desc="请求数据", unit="page"):
-            result = future.result()
-            if result:
-                results.append(result)
-            count += 1
-    return results
\ No newline at end of file
+def get_page_count(headers) -> int:
+    """ ESI在每页的X-Pages响应头中返回总页数，没有该响应头的接口只有一页 """
+    try:
+        return max(int(headers.get('X-Pages', 1)), 1)
+    except (TypeError, ValueError):
+        return 1
+
+
+def get_all_pages_result(esi_func, *args, conditional: bool = False, **kwargs):
+    """
+    先请求第一页，从X-Pages得到总页数后并发请求其余页，不再逐页探测最大页数。
+    返回非空页的结果列表。任一页(包括第一页)重试后仍然失败时返回None，调用方不写入只有部分页的数据。
+    conditional为EsiEtagBatch时发送条件请求，所有页都未变化时返回NotModified，调用方可以跳过写入；
+    新ETag暂存在conditional中，调用方写入数据后commit。
+    """
+    begin_stats = EsiSession.get_stats()
+    first_page, headers = esi_func(1, *args, with_headers=True, conditional=conditional, **kwargs)
+    if first_page is None:
+        logger.warning(f"{esi_func.__name__} 重试后第 1 页仍然请求失败。")
+        return None
+    max_page = get_page_count(headers)
+    logger.info(f"{esi_func.__name__} 共 {max_page} 页。")
+    page_dict = {1: first_page}
+    if max_page > 1:
+        page_dict.update(get_page_dict(esi_func, range(2, max_page + 1), *args, conditional=conditional, **kwargs))
+
+    not_modified_list = get_not_modified_list(page_dict) if conditional else []
+    if 0 < len(not_modified_list) < len(page_dict):
+        # 部分页变化时调用方需要重新写入全部数据，未变化的页没有内容，重新请求
+        page_dict.update(get_page_dict(esi_func, not_modified_list, *args, **kwargs))
+    logger.info(f"{esi_func.__name__}: {EsiSession.get_stats_log(begin_stats)}。")
+    if has_failed_page(page_dict):
+        return None
+    if conditional:
+        EsiEtagCache.record(esi_func.__name__, list(page_dict.values()))
+    return get_page_result(page_dict, not_modified_list)
+
+
+async def get_all_pages_result_async(esi_func, *args, conditional: bool = False, **kwargs):
+    """ get_all_pages_result的异步版本，esi_func为eveesi_async中的接口，并发数由AsyncEsiClient统一限制 """
+    begin_count = AsyncEsiClient.request_count
+    first_page, headers = await esi_func(1, *args, with_headers=True, conditional=conditional, **kwargs)
+    if first_page is None:
+        logger.warning(f"{esi_func.__name__} 重试后第 1 页仍然请求失败。")
+        return None
+    max_page = get_page_count(headers)
+    logger.info(f"{esi_func.__name__} 共 {max_page} 页。")
+    page_dict = {1: first_page}
+    if max_page > 1:
+        page_dict.update(await get_page_dict_async(esi_func, range(2, max_page + 1), *args,
+                                                   conditional=conditional, **kwargs))
+
+    not_modified_list = get_not_modified_list(page_dict) if conditional else []
+    if 0 < len(not_modified_list) < len(page_dict):
+        page_dict.update(await get_page_dict_async(esi_func, not_modified_list, *args, **kwargs))
+    logger.info(f"{esi_func.__name__}: 请求 {AsyncEsiClient.request_count - begin_count} 次。")
+    if has_failed_page(page_dict):
+        return None
+    if conditional:
+        EsiEtagCache.record(esi_func.__name__, list(page_dict.values()))
+    return get_page_result(page_dict, not_modified_list)
+
+
+def stream_all_pages(esi_func, writer, *args, conditional: EsiEtagBatch = None, **kwargs) -> bool:
+    """
+    get_all_pages_result的流式版本，每页请求完成后立即交给writer(PageWriter)写入，不在内存中保留全部页。
+    返回是否写入了新数据，conditional为EsiEtagBatch且所有页都未变化时放弃写入并返回False。
+    任一页(包括第一页)重试后仍然失败时放弃写入并返回False，保留现有数据。
+    本次得到的ETag在writer写入成功后才merge到conditional，放弃写入或出错时丢弃；
+    writer写入的是源表，调用方在copy_to_cache完成后再commit conditional。
+    """
+    begin_stats = EsiSession.get_stats()
+    # 本次请求的ETag先暂存在单独的批次中，写入失败时不会混入调用方的批次
+    etag_batch, conditional = conditional, EsiEtagBatch() if conditional else False
+    writer.start()
+    try:
+        first_page, headers = esi_func(1, *args, with_headers=True, conditional=conditional, **kwargs)
+        if first_page is None:
+            # 没有第一页就不知道总页数，不再请求其余页
+            logger.warning(f"{esi_func.__name__} 重试后第 1 页仍然请求失败。")
+        max_page = get_page_count(headers) if first_page is not None else 1
+        logger.info(f"{esi_func.__name__} 共 {max_page} 页。")
+        not_modified_dict, failed_list = dict(), []
+        put_page(writer, not_modified_dict, failed_list, 1, first_page)
+        for page, result in tqdm(iter_page_result(esi_func, range(2, max_page + 1), *args,
+                                                  conditional=conditional, **kwargs),
+                                 total=max_page - 1, desc="请求数据", unit="page"):
+            put_page(writer, not_modified_dict, failed_list, page, result)
+
+        changed = len(not_modified_dict) < max_page
+        if changed and not_modified_dict and not failed_list:
+            # 部分页变化时需要重新写入全部数据，未变化的页没有内容，重新请求
+            for page, result in iter_page_result(esi_func, list(not_modified_dict), *args, **kwargs):
+                put_page(writer, None, failed_list, page, result)
+            not_modified_dict.clear()
+    except BaseException:
+        writer.abort()
+        raise
+    if failed_list:
+        writer.abort()
+        logger.warning(f"{esi_func.__name__} {len(failed_list)} 页请求失败，放弃写入，保留现有数据。")
+        return False
+    writer.finish(commit=changed)
+    if conditional:
+        etag_batch.merge(conditional)
+        EsiEtagCache.record(esi_func.__name__, get_record_list(max_page, not_modified_dict))
+    logger.info(f"{esi_func.__name__}: {EsiSession.get_stats_log(begin_stats)}。")
+    return changed
+
+
+async def stream_all_pages_async(esi_func, writer, *args, conditional: EsiEtagBatch = None, **kwargs) -> bool:
+    """ stream_all_pages的异步版本，esi_func为eveesi_async中的接口，put和finish在线程中执行，不阻塞事件循环 """
+    begin_count = AsyncEsiClient.request_count
+    etag_batch, conditional = conditional, EsiEtagBatch() if conditional else False
+    writer.start()
+    try:
+        first_page, headers = await esi_func(1, *args, with_headers=True, conditional=conditional, **kwargs)
+        if first_page is None:
+            logger.warning(f"{esi_func.__name__} 重试后第 1 页仍然请求失败。")
+        max_page = get_page_count(headers) if first_page is not None else 1
+        logger.info(f"{esi_func.__name__} 共 {max_page} 页。")
+        not_modified_dict, failed_list = dict(), []
+        await asyncio.to_thread(put_page, writer, not_modified_dict, failed_list, 1, first_page)
+        async for page, result in iter_page_result_async(esi_func, range(2, max_page + 1), *args,
+                                                         conditional=conditional, **kwargs):
+            await asyncio.to_thread(put_page, writer, not_modified_dict, failed_list, page, result)
+
+        changed = len(not_modified_dict) < max_page
+        if changed and not_modified_dict and not failed_list:
+            async for page, result in iter_page_result_async(esi_func, list(not_modified_dict), *args, **kwargs):
+                await asyncio.to_thread(put_page, writer, None, failed_list, page, result)
+            not_modified_dict.clear()
+    except BaseException:
+        await asyncio.to_thread(writer.abort)
+        raise
+    if failed_list:
+        await asyncio.to_thread(writer.abort)
+        logger.warning(f"{esi_func.__name__} {len(failed_list)} 页请求失败，放弃写入，保留现有数据。")
+        return False
+    await asyncio.to_thread(writer.finish, changed)
+    if conditional:
+        etag_batch.merge(conditional)
+        EsiEtagCache.record(esi_func.__name__, get_record_list(max_page, not_modified_dict))
+    logger.info(f"{esi_func.__name__}: 请求 {AsyncEsiClient.request_count - begin_count} 次。")
+    return changed
+
+
+def put_page(writer, not_modified_dict, failed_list: list, page: int, result):
+    """ 未变化的页记入not_modified_dict，请求失败的页记入failed_list，其余非空页交给writer """
+    if result is None:
+        failed_list.append(page)
+    elif isinstance(result, NotModified):
+        not_modified_dict[page] = result
+    elif result:
+        writer.put(result)
+
+
+def get_record_list(max_page: int, not_modified_dict: dict) -> list:
+    """ EsiEtagCache.record只统计NotModified，写入过的页已经释放，用None占位 """
+    return list(not_modified_dict.values()) + [None] * (max_page - len(not_modified_dict))
+
+
+def iter_page_result(esi_func, page_list, *args, **kwargs):
+    """ 并发请求page_list中的页，按完成顺序返回(page, result)，已请求但还没有取走的页不超过ESI_STREAM_WINDOW """
+    page_iter = iter(page_list)
+    executor = EsiRequestPool.get_executor()
+    futures = dict()
+    try:
+        while True:
+            for page in islice(page_iter, ESI_STREAM_WINDOW - len(futures)):
+                futures[executor.submit(esi_func, page, *args, **kwargs)] = page
+            if not futures:
+                return
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                page = futures.pop(future)
+                result = future.result()
+                if result is None:
+                    logger.warning(f"{esi_func.__name__} 重试后第 {page} 页仍然请求失败。")
+                yield page, result
+    finally:
+        for future in futures:
+            future.cancel()
+
+
+async def iter_page_result_async(esi_func, page_list, *args, **kwargs):
+    page_iter = iter(page_list)
+    tasks = dict()
+    try:
+        while True:
+            for page in islice(page_iter, ESI_STREAM_WINDOW - len(tasks)):
+                tasks[asyncio.ensure_future(esi_func(page, *args, **kwargs))] = page
+            if not tasks:
+                return
+            done, _ = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                page = tasks.pop(task)
+                result = task.result()
+                if result is None:
+                    logger.warning(f"{esi_func.__name__} 重试后第 {page} 页仍然请求失败。")
+                yield page, result
+    finally:
+        for task in tasks:
+            task.cancel()
+
+
+def has_failed_page(page_dict: dict) -> bool:
+    """ 失败的页已由get_page_dict记录日志 """
+    return any(result is None for result in page_dict.values())
+
+
+def get_not_modified_list(page_dict: dict) -> list:
+    return [page for page, result in page_dict.items() if isinstance(result, NotModified)]
+
+
+def get_page_result(page_dict: dict, not_modified_list: list):
+    """ 所有页都未变化时返回NotModified，否则按页码返回非空页 """
+    if not_modified_list and len(not_modified_list) == len(page_dict):
+        return NotModified(sum(page_dict[page].content_length for page in not_modified_list))
+    return [page_dict[page] for page in sorted(page_dict) if page_dict[page]]
+
+
+def get_conditional_result(esi_func, etag_batch: EsiEtagBatch, *args, **kwargs):
+    """ 不分页接口的条件请求，数据未变化时返回NotModified，新ETag暂存在etag_batch中，调用方写入数据后commit """
+    result = esi_func(*args, conditional=etag_batch, **kwargs)
+    if result is not None:
+        EsiEtagCache.record(esi_func.__name__, [result])
+    return result
+
+
+async def get_conditional_result_async(esi_func, etag_batch: EsiEtagBatch, *args, **kwargs):
+    result = await esi_func(*args, conditional=etag_batch, **kwargs)
+    if result is not None:
+        EsiEtagCache.record(esi_func.__name__, [result])
+    return result
+
+
+def get_page_dict(esi_func, page_list, *args, **kwargs) -> dict:
+    executor = EsiRequestPool.get_executor()
+    futures = {page: executor.submit(esi_func, page, *args, **kwargs) for page in page_list}
+    try:
+        page_dict = {page: future.result() for page, future in tqdm(futures.items(), desc="请求数据", unit="page")}
+    finally:
+        for future in futures.values():
+            future.cancel()
+    failed_list = [page for page, result in page_dict.items() if result is None]
+    if failed_list:
+        logger.warning(f"{esi_func.__name__} 重试后仍有 {len(failed_list)} 页请求失败: {failed_list}")
+    return page_dict
+
+
+async def get_page_dict_async(esi_func, page_list, *args, **kwargs) -> dict:
+    page_list = list(page_list)
+    result_list = await asyncio.gather(*[esi_func(page, *args, **kwargs) for page in page_list])
+    page_dict = dict(zip(page_list, result_list))
+    failed_list = [page for page, result in page_dict.items() if result is None]
+    if failed_list:
+        logger.warning(f"{esi_func.__name__} 重试后仍有 {len(failed_list)} 页请求失败: {failed_list}")
+    return page_dict
+
@@ -1,3 +1,4 @@
+import threading
 from functools import lru_cache
 from .client import FeiShuClient
 from ..config_server.config import config
@@ -6,11 +7,12 @@ from .common.spreadsheets import Spreadsheets, Sheet
 from .common.spreadsheets import ANYONE_READABLE
 from .common.client_utils import format_work_tree, format_material_tree, format_work_flow
 from ..sde_service import SdeUtils
-
-fs_client = FeiShuClient(config['FEISHU']['APP_ID'], config['FEISHU']['SECRET_ID'])
+from ...utils import KahunaException
 
 class FeiShuKahuna:
     client: FeiShuClient = None
+    folder_token: str = None
+    client_lock = threading.Lock()
 
     @classmethod
     def set_client(cls, client: FeiShuClient):
@@ -18,7 +20,20 @@ class FeiShuKahuna:
 
     @classmethod
     def set_folder_token(cls, folder_token: str):
-        cls.client.set_folder_token(folder_token)
+        cls.folder_token = folder_token
+        if cls.client:
+            cls.client.set_folder_token(folder_token)
+
+    @classmethod
+    def get_client(cls) -> FeiShuClient:
+        """ 第一次导出时才创建客户端并请求tenant_access_token，导入模块时不访问飞书 """
+        if cls.client is None:
+            with cls.client_lock:
+                if cls.client is None:
+                    client = FeiShuClient(config['FEISHU']['APP_ID'], config['FEISHU']['SECRET_ID'])
+                    client.set_folder_token(cls.folder_token)
+                    cls.client = client
+        return cls.client
 
     @classmethod
     def get_user_plan_sheet_name(self, user_qq: int, plan_name):
@@ -27,12 +42,12 @@ class FeiShuKahuna:
     @classmethod
     def create_user_plan_spreadsheet(cls, user_qq: int, plan_name: str) -> Spreadsheets:
         sheet_name = cls.get_user_plan_sheet_name(user_qq, plan_name)
-        return cls.client.create_spreadsheets(sheet_name)
+        return cls.get_client().create_spreadsheets(sheet_name)
 
     @classmethod
     def get_user_plan_spreadsheet(cls, user_qq: int, plan_name) -> Spreadsheets:
         user_sheet_name = cls.get_user_plan_sheet_name(user_qq, plan_name)
-        return cls.client.get_spreadsheets(user_sheet_name)
+        return cls.get_client().get_spreadsheets(user_sheet_name)
 
     """ == 默认表配置 == """
     @classmethod
@@ -76,6 +91,30 @@ class FeiShuKahuna:
 
         spreadsheet.permission.link_share_entity = ANYONE_READABLE
 
+    @classmethod
+    def get_plan_report_sheet(cls, spreadsheet: Spreadsheets, section: str) -> Sheet:
+        """ 计划报表各部分对应的sheet """
+        if section == 'work':
+            return cls.get_worktree_sheet(spreadsheet)
+        if section == 'material':
+            return cls.get_material_sheet(spreadsheet)
+        if section == 'work_flow':
+            return cls.get_workflow_sheet(spreadsheet)
+        if section == 'logistic':
+            return cls.get_logistic_sheet(spreadsheet)
+        raise KahunaException(f"报表部分 {section} 没有对应的sheet")
+
+    @classmethod
+    def output_plan_report_section(cls, sheet: Sheet, section: str, data: dict):
+        if section == 'work':
+            cls.output_work_tree(sheet, data)
+        elif section == 'material':
+            cls.output_material_tree(sheet, data)
+        elif section == 'work_flow':
+            cls.output_work_flow(sheet, data)
+        elif section == 'logistic':
+            cls.output_logistic_plan(sheet, data)
+
     """== 写入数据方法 =="""
     @classmethod
     def output_work_tree(cls, sheet: Sheet, data: dict):
@@ -142,6 +181,13 @@ class FeiShuKahuna:
         transport_list = [transport_list_head] + transport_list
         sheet.set_value([1, 1], transport_list)
 
+        # 按货柜船容量分趟
+        if 'haul' in logistic_dict:
+            haul_list_head = ['趟次', '提供', '需求', '物品', '数量', '体积']
+            haul_list = [[haul_index, prov_name, need_name, SdeUtils.get_name_by_id(type_id), quantity, volume]
+                         for haul_index, prov_name, need_name, type_id, quantity, volume in logistic_dict['haul']]
+            sheet.set_value([7, 1], [haul_list_head] + haul_list)
+
     @classmethod
     def output_cost_sheet(cls, sheet: Sheet, data: dict):
         sheet.clear_sheet()
@@ -207,5 +253,4 @@ class FeiShuKahuna:
         sheet.set_format([9, 1], [1, len(group_cost_list)], {'formatter': '0.00%'})
 
 
-FeiShuKahuna.set_client(fs_client)
 FeiShuKahuna.set_folder_token(config['FEISHU']['FOLDER_ROOT'])
\ No newline at end of file
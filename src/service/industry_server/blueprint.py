@@ -1,11 +1,37 @@
+import threading
 from functools import lru_cache
 from tokenize import group
 from peewee import DoesNotExist
 
 from ..sde_service import SdeUtils
 from ..sde_service.database import IndustryActivityMaterials, IndustryActivityProducts, IndustryBlueprints
+from ..sde_service.database import IndustryActivities
+from ..log_server import logger
 
-class BPManager:
+# 制造与反应
+PRODUCTION_ACTIVITY = (1, 11)
+#45732是一个测试用数据，会导致误判，需要特殊处理
+TEST_BLUEPRINT_ID = 45732
+
+
+class BPRecord:
+    """ 单个产品的蓝图数据，建立索引时一次性生成 """
+    __slots__ = ('product_id', 'bp_id', 'product_quantity', 'materials', 'action_id', 'time')
+
+    def __init__(self, product_id: int, bp_id: int):
+        self.product_id = product_id
+        self.bp_id = bp_id
+        self.product_quantity = 1
+        self.materials = dict()
+        self.action_id = 0
+        self.time = 0
+
+
+class BPSdeQuery:
+    """
+    直接查询sde的旧实现。
+    BPManager改为读取内存索引后保留此路径，用于核对索引结果，见BPManager.cross_check。
+    """
     @classmethod
     @lru_cache(maxsize=1000)
     def get_bp_materials(cls, type_id: int) -> dict:
@@ -218,4 +244,195 @@ class BPManager:
         if meta == 'Faction' and cate == 'Ship':
             return 1
         return (IndustryBlueprints.select(IndustryBlueprints.maxProductionLimit)
-                                  .where(IndustryBlueprints.blueprintTypeID == blueprint_id).scalar())
\ No newline at end of file
+                                  .where(IndustryBlueprints.blueprintTypeID == blueprint_id).scalar())
+
+class BPManager:
+    """
+    蓝图数据查询入口。
+    第一次查询时从sde的industryActivityProducts/industryActivityMaterials/industryActivities/industryBlueprints
+    一次性读取制造和反应相关数据，之后的查询都是字典读取。
+    导入模块时不访问sde，只导入本模块的进程(如计算进程池的worker)不需要建立索引。
+    """
+    init_status = False
+    init_lock = threading.Lock()
+    product_dict: dict[int, BPRecord] = dict()  # {product_id: BPRecord}
+    bp_product_dict: dict[int, int] = dict()    # {blueprint_id: product_id}
+    bp_max_production_dict: dict[int, int] = dict()  # {blueprint_id: maxProductionLimit}
+
+    @classmethod
+    def init(cls):
+        cls.init_bp_index()
+
+    @classmethod
+    def init_bp_index(cls):
+        if cls.init_status:
+            return
+        with cls.init_lock:
+            if not cls.init_status:
+                cls.build_bp_index()
+
+    @classmethod
+    def build_bp_index(cls):
+        # {blueprint_id: {material_id: quantity}}
+        bp_materials = dict()
+        for bp_id, material_id, quantity in (IndustryActivityMaterials
+                .select(IndustryActivityMaterials.blueprintTypeID,
+                        IndustryActivityMaterials.materialTypeID,
+                        IndustryActivityMaterials.quantity)
+                .where(IndustryActivityMaterials.activityID.in_(PRODUCTION_ACTIVITY))
+                .tuples()):
+            bp_materials.setdefault(bp_id, dict())[material_id] = quantity
+
+        # {blueprint_id: [(activity_id, time)]}，保持sde中的顺序
+        bp_activities = dict()
+        for bp_id, activity_id, time in (IndustryActivities
+                .select(IndustryActivities.blueprintTypeID, IndustryActivities.activityID, IndustryActivities.time)
+                .tuples()):
+            bp_activities.setdefault(bp_id, []).append((activity_id, time))
+
+        # 与旧查询保持一致：同一产品取第一条记录的蓝图，材料合并所有产出该产品的蓝图
+        product_dict = dict()
+        bp_product_dict = dict()
+        quantity_found = set()
+        for bp_id, product_id, quantity in (IndustryActivityProducts
+                .select(IndustryActivityProducts.blueprintTypeID,
+                        IndustryActivityProducts.productTypeID,
+                        IndustryActivityProducts.quantity)
+                .tuples()):
+            bp_product_dict.setdefault(bp_id, product_id)
+            if (record := product_dict.get(product_id)) is None:
+                record = BPRecord(product_id, bp_id)
+                for activity_id, time in bp_activities.get(bp_id, []):
+                    if activity_id in PRODUCTION_ACTIVITY:
+                        record.action_id = activity_id
+                        record.time = time
+                        break
+                product_dict[product_id] = record
+            record.materials.update(bp_materials.get(bp_id, dict()))
+            if product_id not in quantity_found and bp_id != TEST_BLUEPRINT_ID:
+                record.product_quantity = quantity
+                quantity_found.add(product_id)
+
+        cls.product_dict = product_dict
+        cls.bp_product_dict = bp_product_dict
+        cls.bp_max_production_dict = {
+            bp_id: max_production for bp_id, max_production in
+            IndustryBlueprints.select(IndustryBlueprints.blueprintTypeID, IndustryBlueprints.maxProductionLimit).tuples()
+        }
+        cls.init_status = True
+        logger.info(f"init blueprint index complete. {len(product_dict)} products. {id(cls)}")
+
+    @classmethod
+    def get_product_record(cls, product_id: int) -> BPRecord:
+        cls.init_bp_index()
+        return cls.product_dict.get(product_id, None)
+
+    @classmethod
+    def get_bp_materials(cls, type_id: int) -> dict:
+        record = cls.get_product_record(type_id)
+        return record.materials if record else dict()
+
+    @classmethod
+    def get_bp_product_quantity_typeid(cls, type_id: int) -> int:
+        record = cls.get_product_record(type_id)
+        return record.product_quantity if record else 1
+
+    @classmethod
+    def get_bp_id_by_prod_typeid(cls, type_id: int) -> int:
+        record = cls.get_product_record(type_id)
+        return record.bp_id if record else None
+
+    @classmethod
+    @lru_cache(maxsize=100)
+    def get_bp_id_by_pbpname(cls, bp_name) -> int:
+        bp_maybe_type_id = SdeUtils.get_id_by_name(bp_name)
+        if not bp_maybe_type_id:
+            return None
+        cls.init_bp_index()
+        if bp_maybe_type_id in cls.bp_product_dict:
+            return bp_maybe_type_id
+        return None
+
+    @classmethod
+    def check_product_id_existence(cls, product_type_id: int) -> bool:
+        return cls.get_product_record(product_type_id) is not None
+
+    @classmethod
+    def get_production_time(cls, product_id: int) -> int:
+        """
+        获取指定产品的制造活动时间（秒）
+        参数：
+            product_id (int): 产品ID
+        返回：
+            int: 制造活动时间，单位秒。如果未找到返回0
+        """
+        record = cls.get_product_record(product_id)
+        return record.time if record else 0
+
+    @classmethod
+    def get_action_id(cls, product_id: int) -> int:
+        """
+        获取指定产品的活动类型
+        参数：
+            product_id (int): 产品ID
+        返回：
+            int: 1为制造，11为反应。如果未找到返回0
+        """
+        record = cls.get_product_record(product_id)
+        return record.action_id if record else 0
+
+    @classmethod
+    def get_chunk_runs(cls, product_id: int) -> int:
+        """
+        计算单个蓝图每日可完成的制造流程数
+        参数：
+            product_id (int): 产品ID
+        返回：
+            int: 每日可完成的制造流程数
+        """
+        production_time = cls.get_production_time(product_id)
+        if production_time <= 0:
+            return 0
+        return max(1, 86400 // production_time)  # 86400秒 = 1天
+
+    @classmethod
+    def get_blueprint_details(cls, product_id: int) -> dict:
+        return BPSdeQuery.get_blueprint_details(product_id)
+
+    @classmethod
+    def get_typeid_by_bpid(cls, blueprint_id: int):
+        cls.init_bp_index()
+        return cls.bp_product_dict.get(blueprint_id, None)
+
+    @classmethod
+    @lru_cache(maxsize=1000)
+    def get_productionmax_by_bpid(cls, blueprint_id: int):
+        product_id = cls.get_typeid_by_bpid(blueprint_id)
+        meta = SdeUtils.get_metaname_by_typeid(product_id)
+        cate = SdeUtils.get_category_by_id(product_id)
+        if meta == 'Faction' and cate == 'Ship':
+            return 1
+        cls.init_bp_index()
+        return cls.bp_max_production_dict.get(blueprint_id, None)
+
+    @classmethod
+    def cross_check(cls, type_id_list: list[int]) -> list[tuple]:
+        """
+        使用旧的sde查询核对索引结果。
+        返回：
+            list: [(type_id, 方法名, 索引结果, 查询结果)]，全部一致时为空
+        """
+        mismatch = []
+        for type_id in type_id_list:
+            for func_name in ['get_bp_materials', 'get_bp_product_quantity_typeid', 'get_bp_id_by_prod_typeid',
+                              'get_production_time', 'get_action_id']:
+                index_res = getattr(cls, func_name)(type_id)
+                query_res = getattr(BPSdeQuery, func_name)(type_id)
+                if index_res != query_res:
+                    mismatch.append((type_id, func_name, index_res, query_res))
+            if (bp_id := cls.get_bp_id_by_prod_typeid(type_id)) is not None:
+                index_res = cls.get_productionmax_by_bpid(bp_id)
+                query_res = BPSdeQuery.get_productionmax_by_bpid(bp_id)
+                if index_res != query_res:
+                    mismatch.append((type_id, 'get_productionmax_by_bpid', index_res, query_res))
+        return mismatch
@@ -18,7 +18,7 @@ class IndustryAdvice:
         t2_ship_id_list = [SdeUtils.get_id_by_name(name) for name in t2_ship_list]
         t2_plan = [[ship, 1] for ship in t2_ship_list]
 
-        t2_cost_data = IndustryAnalyser.get_cost_data(user, plan_name, t2_plan)
+        t2_cost_data = IndustryAnalyser.get_cost_data(user, plan_name, t2_plan, "cost")
         t2_cost_data = [[name] + value for name, value in t2_cost_data.items()]
         t2ship_data = []
         for data in t2_cost_data:
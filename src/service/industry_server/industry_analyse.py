@@ -1,20 +1,20 @@
 import queue
+import threading
 from asyncio import gather
 from errno import ECHILD
 from importlib.util import source_hash
 from datetime import timedelta
-import networkx as nx
 import math
-from cachetools import TTLCache
+from bisect import bisect_left
+from collections import deque
+from contextlib import nullcontext
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
 from tqdm import tqdm
 from queue import Queue
 
-from .running_job import RunningJobOwner
 from .structure import StructureManager
-from ..asset_server.asset_container import AssetContainer
 from ..asset_server.asset_manager import AssetManager
 from ..character_server.character_manager import CharacterManager
-from ..database_server.model import BlueprintAssetCache
 from .industry_config import IndustryConfigManager, MANU_SKILL_TIME_EFF, REAC_SKILL_TIME_EFF
 from ..user_server.user_manager import UserManager
 from ..market_server.market_manager import MarketManager
@@ -24,62 +24,121 @@ from ..log_server import logger
 from .industry_utils import IdsUtils as IdsU
 
 from .blueprint import BPManager
+from .industry_graph import IndustryGraph
+from .industry_cost import IndustryCostEngine
+from .industry_transport import IndustryTransportPlanner
+from .industry_input import IndustryInputLoader
+from .industry_analyse_cache import IndustryAnalyseCache
 from ..sde_service.utils import SdeUtils
 from ...utils import roundup, KahunaException
 
 HOUR_SECONDS = 3600
 DAY_SECONDS = 24 * HOUR_SECONDS
+# get_work_tree_data可选的报表部分
+REPORT_SECTION_LIST = ['work', 'material', 'work_flow', 'logistic']
 
-class Work():
+class WorkGroup():
     """
-    [(
-        mater_eff,
-        time_eff,
-        runs,
-        location_id,
-        structure_id
-    )]
+    count个参数完全相同的连续工作。
+    support_index为支持的计划序号位图，第i位表示序号i。
+    avaliable为False时组内所有工作都不可用，部分可用时拆分为两组。
     """
-    mater_eff: float = 1
-    time_eff: float = 1
-    runs: int = 1
-    location_id: int = 0
-    structure_id: int = 0
-    void_bp = False
-    avaliable = False
+    __slots__ = ('type_id', 'mater_eff', 'time_eff', 'runs', 'count',
+                 'location_id', 'structure_id', 'void_bp', 'avaliable', 'support_index')
 
     def __init__(self, type_id: int, mater_eff: float = 1, time_eff: float = 1, runs: int = 1,
-                 location_id: int = 0, structure_id: int = 0, void_bp: bool = False):
+                 location_id: int = 0, structure_id: int = 0, void_bp: bool = False, count: int = 1):
         self.type_id = type_id
         self.mater_eff = mater_eff
         self.time_eff = time_eff
         self.runs = runs
+        self.count = count
         self.location_id = location_id
         self.structure_id = structure_id
         self.void_bp = void_bp
         self.avaliable = True
-        self.support_index = set()
+        self.support_index = 0
+
+    def get_support_index(self) -> list:
+        return [index for index in range(self.support_index.bit_length()) if self.support_index >> index & 1]
+
+    def same_work(self, other) -> bool:
+        return (self.type_id == other.type_id and self.mater_eff == other.mater_eff and
+                self.time_eff == other.time_eff and self.runs == other.runs and
+                self.location_id == other.location_id and self.structure_id == other.structure_id and
+                self.void_bp == other.void_bp and self.avaliable == other.avaliable and
+                self.support_index == other.support_index)
+
+    def split(self, count: int):
+        """ 保留前count个工作，返回剩余工作组成的新组 """
+        tail = WorkGroup(self.type_id, self.mater_eff, self.time_eff, self.runs,
+                         self.location_id, self.structure_id, self.void_bp, self.count - count)
+        tail.avaliable = self.avaliable
+        tail.support_index = self.support_index
+        self.count = count
+        return tail
 
     def get_material_need(self):
         mater_dict = BPManager.get_bp_materials(self.type_id)
         res_dict = dict()
         for key in mater_dict.keys():
             mater_eff = 1 if mater_dict[key] == 1 else self.mater_eff
-            res_dict[key] = math.ceil(mater_dict[key] * mater_eff * self.runs)
+            res_dict[key] = math.ceil(mater_dict[key] * mater_eff * self.runs) * self.count
 
         return res_dict
 
+    @classmethod
+    def merge_list(cls, work_list: list) -> list:
+        """ 合并相邻的相同工作组 """
+        res = []
+        for work in work_list:
+            if res and res[-1].same_work(work):
+                res[-1].count += work.count
+            else:
+                res.append(work)
+        return res
 
-class IndustryAnalyser():
-    analyser_cache = TTLCache(maxsize=10, ttl=60 * 60) # {plan_name: analyser}
+    @classmethod
+    def mark_support(cls, work_list: list, mark_list: list):
+        """
+        mark_list: [(start, end, index)]，按展开后的工作序号区间[start, end)标记支持的计划序号。
+        先在所有区间边界处拆分工作组，再按组的起始序号二分查找区间内的组，原地修改work_list。
+        """
+        if not mark_list:
+            return
+        boundary_list = sorted({position for start, end, _ in mark_list for position in (start, end)})
+        res = []
+        start_list = []
+        position = 0
+        boundary_i = 0
+        for work in work_list:
+            work_end = position + work.count
+            while boundary_i < len(boundary_list) and boundary_list[boundary_i] <= position:
+                boundary_i += 1
+            while boundary_i < len(boundary_list) and boundary_list[boundary_i] < work_end:
+                tail = work.split(boundary_list[boundary_i] - position)
+                res.append(work)
+                start_list.append(position)
+                work, position = tail, boundary_list[boundary_i]
+                boundary_i += 1
+            res.append(work)
+            start_list.append(position)
+            position = work_end
+        work_list[:] = res
+
+        for start, end, index in mark_list:
+            for work in res[bisect_left(start_list, start):bisect_left(start_list, end)]:
+                work.support_index |= 1 << index
 
+
+class IndustryAnalyser():
     def __init__(self, owner_qq: int = 0, cal_type="work"):
         self.cal_type = cal_type
         self.owner_qq = owner_qq
         self.market = MarketManager.get_market_by_type('jita')
 
         # 运行中使用的设置
-        self.bp_graph: nx.DiGraph = nx.MultiDiGraph()
+        self.bp_graph = IndustryGraph(edge_fields=('quantity', 'index_list'))
         self.anaed_set = set()
         self.bp_node_actually_need_quantity_dict = dict()
         self.bp_node_total_need_quantity_dict = dict()
@@ -93,13 +152,29 @@ class IndustryAnalyser():
         self.bp_runs_dict = dict()
         self.bp_quantity_dict = dict()
         self.have_bpo = dict()
+        # {(bp_type_id, structure_id): (bpc_list, bpo_count_list)}
+        self.bp_inventory = dict()
 
         self.job_asset_check_dict = dict()
+        # IndustryInput，同一命令内的分析器可以共用
+        self.analyse_input = None
+
+        # 逐节点计算结果，计算完成后统一写入work_graph/global_graph
+        self.father_edge_dict = dict()  # {child_id: [[father_id, [index], child_id, quantity]]}
+        self.work_node_dict = dict()
+        self.global_node_dict = dict()
+        self.work_edge_dict = dict()  # {child_id: {father_id: [edge_data]}}
+        self.global_edge_dict = dict()
 
-        self.global_graph = nx.MultiDiGraph()
-        self.work_graph = nx.MultiDiGraph()
+        self.global_graph = IndustryGraph(edge_fields=('index', 'quantity'))
+        self.work_graph = IndustryGraph(edge_fields=('index', 'quantity', 'status'))
 
         self.analysed_status = False
+        # 报表各部分的生成结果{section: Future}，同一个缓存分析器的并发请求复用
+        self.work_tree_data = dict()
+        self.report_lock = threading.Lock()
+        # IndustryProfiler，设置后记录各阶段和各类节点的耗时
+        self.profiler = None
 
         # 需要持久化的设置
         self.plan_name = None
@@ -116,16 +191,34 @@ class IndustryAnalyser():
         self.manu_cycle_time = 24
         self.reac_cycle_time = 24
 
+    def __getstate__(self):
+        """ 传给进程池worker时不带锁、报表结果和profiler """
+        state = self.__dict__.copy()
+        state.update(work_tree_data=dict(), report_lock=None, profiler=None)
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.report_lock = threading.Lock()
+
     def set_matchers(self, bp_matcher, st_matcher, pd_block_matcher):
         self.bp_matcher = bp_matcher
         self.st_matcher = st_matcher
         self.pd_block_matcher = pd_block_matcher
 
+    def profile_phase(self, phase: str):
+        return self.profiler.phase(phase) if self.profiler else nullcontext()
+
+    def profile_node(self, node):
+        return self.profiler.node(self.profiler.get_node_class(self, node)) if self.profiler else nullcontext()
+
     def in_pd_block(self, type_id: int) -> bool:
-        matcher = self.pd_block_matcher
-        if matcher is None:
+        if self.pd_block_matcher is None:
             raise KahunaException("pd_block matcher must be set.")
+        return self.pd_block_matcher.match(type_id, self.match_pd_block)
 
+    @staticmethod
+    def match_pd_block(type_id: int, matcher) -> bool:
         structure_id = None
         invType_data = SdeUtils.get_invtpye_node_by_id(type_id)
         if not invType_data:
@@ -162,124 +255,136 @@ class IndustryAnalyser():
         return False
         raise KahunaException(f"typeid: {type_id} 无建筑分配，请配置匹配器。")
 
-    def get_running_job(self):
-        if not self.target_container:
-            raise KahunaException("target_structure must be set.")
-
-        self.running_job = dict()
-        self.using_bp = RunningJobOwner.get_using_bp_set()
-
-        user = UserManager.get_user(self.owner_qq)
-        user_character = [c.character_id for c in CharacterManager.get_user_all_characters(user.user_qq)]
-        alias_character = [cid for cid in user.user_data.alias.keys()]
-        result = RunningJobOwner.get_job_with_starter(user_character + alias_character)
-
-        for job in result:
-            if job.output_location_id in self.target_container:
-                if not job.product_type_id in self.running_job:
-                    self.running_job[job.product_type_id] = 0
-                self.running_job[job.product_type_id] += job.runs
-
-    def get_target_container(self):
-        container_list = AssetManager.get_user_container(self.owner_qq)
-        self.target_container = set(container.asset_location_id for container in container_list
-                                    if (container.tag in {"manu", "reac"} and
-                                        container.asset_location_id not in self.hide_container))
-
-    def get_asset_in_container(self):
-        if not self.target_container:
-            raise KahunaException("target_structure must be set.")
-
-        result = AssetManager.get_asset_in_container_list(list(self.target_container))
-        for asset in result:
-            if asset.type_id not in self.asset_dict:
-                self.asset_dict[asset.type_id] = 0
-                self.job_asset_check_dict[asset.type_id] = 0
-            self.asset_dict[asset.type_id] += asset.quantity
-            self.job_asset_check_dict[asset.type_id] += asset.quantity
-
-    def get_work_tree(self, work_list: list, dg: nx.DiGraph = None):
+    def load_input(self):
+        """
+        读取目标仓库、运行中的工作和仓库资产。
+        已设置的analyse_input属于同一用户且快照未刷新时直接复用，否则重新读取。
+        """
+        if self.analyse_input is None or not self.analyse_input.match(self.owner_qq, self.hide_container):
+            # 性能分析时在当前线程读取，sql计入load_input阶段
+            self.analyse_input = IndustryInputLoader.load(self.owner_qq, self.hide_container,
+                                                          inline=self.profiler is not None)
+
+        self.target_container = set(self.analyse_input.target_container)
+        self.running_job = dict(self.analyse_input.running_job)
+        self.using_bp = self.analyse_input.using_bp
+        self.asset_dict = dict(self.analyse_input.asset_dict)
+        # update_work_avaliable会扣减，每次分析使用新的副本
+        self.job_asset_check_dict = dict(self.analyse_input.asset_dict)
+
+    def get_bp_inventory(self):
+        """
+        从输入数据中筛选bp_graph中所有蓝图在用户bp/manu仓库中的库存，按(蓝图类型, 建筑)分组并预先排序。
+        拷贝序列 [(runs, material_efficiency, time_efficiency, item_id, location_id, structure_id)]
+        原图序列 [(quantity, material_efficiency, time_efficiency, location_id, structure_id)]
+        """
+        self.bp_inventory = dict()
+        bp_id_set = set()
+        for node in self.bp_graph.nodes():
+            if node != 'root' and (bp_id := BPManager.get_bp_id_by_prod_typeid(node)):
+                bp_id_set.add(bp_id)
+
+        # 蓝图资产由load_input读取，为owner_qq的bp和manu仓库内的全部蓝图
+        container_structure = self.analyse_input.bp_container_structure
+        if not bp_id_set or not container_structure:
+            return
+
+        bpc_dict = dict()
+        bpo_count_dict = dict()
+        for bp in self.analyse_input.bp_asset_list:
+            if bp.type_id not in bp_id_set or bp.item_id in self.using_bp or bp.runs == 0:
+                continue
+            structure_id = container_structure[bp.location_id]
+            key = (bp.type_id, structure_id)
+            if bp.runs > 0:
+                bpc_dict.setdefault(key, []).append(
+                    (bp.runs, bp.material_efficiency, bp.time_efficiency, bp.item_id, bp.location_id, structure_id))
+            else:
+                bpo_count = bpo_count_dict.setdefault(key, dict())
+                bpo_key = (bp.material_efficiency, bp.time_efficiency, bp.location_id)
+                if bpo_key not in bpo_count:
+                    bpo_count[bpo_key] = 0
+                bpo_count[bpo_key] += 1 if bp.quantity < 0 else bp.quantity
+
+        for key in bpc_dict.keys() | bpo_count_dict.keys():
+            bpc_list = bpc_dict.get(key, [])
+            bpc_list.sort(key=lambda x: (x[1], x[0]), reverse=True)
+            bpo_count_list = [(v, k[0], k[1], k[2], key[1]) for k, v in bpo_count_dict.get(key, dict()).items()]
+            bpo_count_list.sort(key=lambda x: x[1], reverse=True)
+            self.bp_inventory[key] = (bpc_list, bpo_count_list)
+
+    def get_work_tree(self, work_list: list, dg: IndustryGraph = None):
         """
         :param work_list: [(target_id, quantity)]
         :return:
         """
         work_list = [(SdeUtils.get_id_by_name(target), quantity) for target, quantity in work_list]
-        # queue: [type_id, node_id, quanqity]
-        bfs_queue = [(index, data[0], 1) for index, data in enumerate(work_list)]
 
         dg.add_node("root")
         dg.add_nodes_from([type_id for type_id, _ in work_list])
         dg.add_edges_from(
-            [("root", data[0], {"index": index, "quantity": data[1]})
+            [("root", data[0], {"index_list": [index], "quantity": data[1]})
              for index, data in enumerate(work_list)])
 
-        self.bfs_bp_tree(bfs_queue, dg)
-        memo = dict()
-        root_depth = self.longest_path_dag('root', memo)
-        self.update_layer_depth('root')
+        self.bfs_bp_tree([type_id for type_id, _ in work_list], dg)
+        self.update_layer_depth(dg)
         return dg
 
-    # 递归计算最长路径，并添加备忘录优化
-    def longest_path_dag(self, node, memo):
-        if node in memo:  # 如果已经计算过，直接返回
-            return memo[node]
-
-        # 如果是叶子节点（出度为 0），深度为 0
-        if self.bp_graph.out_degree(node) == 0:
-            memo[node] = 1
-            self.bp_graph.nodes[node]['depth'] = 1
-            return 1
-
-        # 计算所有子节点中的最大路径
-        max_depth = 0
-        for succ in self.bp_graph.successors(node):
-            try:
-                max_depth = max(max_depth, self.longest_path_dag(succ, memo))
-            except RecursionError:
-                raise KahunaException(f'node: {node}')
-
-        # 加入自身节点长度，然后存入备忘录
-        memo[node] = max_depth + 1
-        self.bp_graph.nodes[node]['depth'] = memo[node]
-        return memo[node]
-
-    def update_layer_depth(self, node):
-        if node != 'root' and self.bp_graph.nodes[node]['depth'] != 1:
-            max_depth = 0
-            for pre in self.bp_graph.predecessors(node):
-                max_depth = max(max_depth, self.bp_graph.nodes[pre]['depth'])
-            self.bp_graph.nodes[node]['depth'] = max_depth - 1
-
-        for suss in self.bp_graph.successors(node):
-            self.update_layer_depth(suss)
-
-    def bfs_bp_tree(self, bfs_queue: list, dg: nx.DiGraph = None):
+    def update_layer_depth(self, dg: IndustryGraph):
+        """
+        按拓扑序计算节点层级，复杂度O(V+E)。
+        先逆拓扑序求出每个节点到叶子的最长路径，叶子节点为1；
+        再正拓扑序把非叶子节点的层级设为父节点最大层级减1，root保留最长路径。
+        """
+        topo_order = dg.topological_sort()
+
+        for node in reversed(topo_order):
+            dg.nodes[node]['depth'] = max((dg.nodes[succ]['depth'] for succ in dg.successors(node)), default=0) + 1
+
+        for node in topo_order:
+            if node == 'root' or dg.nodes[node]['depth'] == 1:
+                continue
+            dg.nodes[node]['depth'] = max(dg.nodes[pre]['depth'] for pre in dg.predecessors(node)) - 1
+
+    def bfs_bp_tree(self, target_list: list, dg: IndustryGraph = None):
         """
-        递归处理生成蓝图节点。
-        每个节点代表一种材料，每种target需要的材料存储在节点与节点之间的边关系
+        广度优先生成蓝图节点，每种类型只展开一次。
+        每个节点代表一种材料，材料关系存储在节点与节点之间的边上，
+        边属性index_list记录需要该材料关系的计划序号。
         """
+        bfs_queue = deque(target_list)
         while bfs_queue:
-            index, type_id, quantity = bfs_queue.pop(0)
+            type_id = bfs_queue.popleft()
+            if type_id in self.anaed_set:
+                continue
+            self.anaed_set.add(type_id)
             dg.add_node(type_id)
-            if (bp_materials := BPManager.get_bp_materials(type_id)) is None or self.in_pd_block(type_id):
-                self.anaed_set.add((index, type_id))
+            if not (bp_materials := BPManager.get_bp_materials(type_id)) or self.in_pd_block(type_id):
                 continue
-            dg.add_nodes_from([child_id for child_id in bp_materials.keys()])
             dg.add_edges_from(
-                [(type_id, child_id, {"index": index, "quantity": quantity})
+                [(type_id, child_id, {"quantity": quantity})
                  for child_id, quantity in bp_materials.items()]
             )
-
-            bfs_queue = bfs_queue + [(index, child_id, quantity) for child_id, quantity in bp_materials.items()
-                                     if (index, child_id) not in self.anaed_set]
-            self.anaed_set.update([(index, child) for child in bp_materials.keys()])
+            bfs_queue.extend(child_id for child_id in bp_materials.keys() if child_id not in self.anaed_set)
+
+        # 按拓扑序把计划序号从父节点传递到子节点
+        index_dict = dict()
+        for _, child_id, data in dg.out_edges("root", data=True):
+            index_dict.setdefault(child_id, set()).update(data["index_list"])
+        for node in dg.topological_sort():
+            if node == "root":
+                continue
+            index_list = sorted(index_dict.get(node, set()))
+            for _, child_id, data in dg.out_edges(node, data=True):
+                data["index_list"] = index_list
+                index_dict.setdefault(child_id, set()).update(index_list)
 
     def get_runs_list_by_bpasset(self, total_runs_needed: int, source_id: int, user_qq: int, work_cache: dict) -> list:
         # 缓存
         if source_id in work_cache:
             return work_cache[source_id]
         if source_id == "root":
-            return [Work(1, 1, total_runs_needed, 0, 0)]
+            return [WorkGroup(1, 1, total_runs_needed, 0, 0)]
         """ 根据库存蓝图生成工作序列 """
         manu_skill_time_eff = MANU_SKILL_TIME_EFF
         reac_skill_time_eff = REAC_SKILL_TIME_EFF
@@ -298,44 +403,13 @@ class IndustryAnalyser():
         st_mater_rig_eff, st_time_rig_eff = IndustryConfigManager.get_structure_rig_mater_time_eff(structure)
 
         # 2. 蓝图统计
-        # owner_qq可用的蓝图仓库，即container_tag为bp的仓库，需要存在于目标建筑
-        bp_container_list = AssetContainer.get_location_id_by_qq_tag(user_qq, "bp")
-        manu_container_list = AssetContainer.get_location_id_by_qq_tag(user_qq, "manu")
-        bp_container_list += manu_container_list
-        bp_container_list = [container for container in bp_container_list if SdeUtils.get_structure_id_from_location_id(container)[0] == structure_id]
-
-        # 根据source_id获得user_qq所属的所有蓝图
-        owner_id_set = set(character.character_id for character in CharacterManager.get_user_all_characters(user_qq))
-        for character in CharacterManager.get_user_all_characters(user_qq):
-            if character.director:
-                owner_id_set.add(character.corp_id)
+        # 蓝图库存由get_bp_inventory预先读取，这里只复制一份供分配时消耗
         bp_id = BPManager.get_bp_id_by_prod_typeid(source_id)
-        avalable_bpc_asset = BlueprintAssetCache.select().where((BlueprintAssetCache.location_id << bp_container_list) &
-                                                                (BlueprintAssetCache.type_id == bp_id) &
-                                                                (BlueprintAssetCache.runs > 0))
-        avaliable_bpo_asset = BlueprintAssetCache.select().where((BlueprintAssetCache.location_id << bp_container_list) &
-                                                                 (BlueprintAssetCache.type_id == bp_id) &
-                                                                 (BlueprintAssetCache.runs < 0))
-
-        # 可用的拷贝序列 [(runs, material_efficiency, time_efficiency, item_id, structure_id, location_id)]
-        avaliable_bpc_list = [(bp.runs, bp.material_efficiency, bp.time_efficiency, bp.item_id, bp.location_id, structure_id)\
-                              for bp in avalable_bpc_asset if bp.item_id not in self.using_bp]
-        avaliable_bpc_list.sort(key=lambda x: (x[1], x[0]), reverse=True)
-
-        # 可用的原图序列 [(quantity, material_efficiency, time_efficiency, structure_id, location_id)]
-        avaliable_bpo_count = dict()
-        for bpo in avaliable_bpo_asset:
-            if bpo.item_id in self.using_bp:
-                continue
-            if (bpo.material_efficiency, bpo.time_efficiency, bpo.location_id) not in avaliable_bpo_count:
-                avaliable_bpo_count[(bpo.material_efficiency, bpo.time_efficiency, bpo.location_id)] = 0
-            if bpo.quantity < 0:
-                avaliable_bpo_count[(bpo.material_efficiency, bpo.time_efficiency, bpo.location_id)] += 1
-            else:
-                avaliable_bpo_count[(bpo.material_efficiency, bpo.time_efficiency, bpo.location_id)] += bpo.quantity
-
-        avaliable_bpo_count_list = [[v, k[0], k[1], k[2], structure_id] for k, v in avaliable_bpo_count.items()]
-        avaliable_bpo_count_list.sort(key=lambda x: x[1], reverse=True)
+        bpc_list, bpo_count_list = self.bp_inventory.get((bp_id, structure_id), ([], []))
+        # 可用的拷贝序列 [(runs, material_efficiency, time_efficiency, item_id, location_id, structure_id)]
+        avaliable_bpc_list = list(bpc_list)
+        # 可用的原图序列 [[quantity, material_efficiency, time_efficiency, location_id, structure_id]]
+        avaliable_bpo_count_list = [list(bpo) for bpo in bpo_count_list]
 
         # 保存蓝图库存数量，只计算一次
         if source_id not in self.bp_quantity_dict:
@@ -362,23 +436,23 @@ class IndustryAnalyser():
         # 使用优先级：
         # 按照最大周期使用蓝图直到蓝图归零或流程归零
         # 流程未归零则创造虚空流程
+        # 同一组原图的满周期工作合并为一个工作组
         for bpo in avaliable_bpo_count_list:
-            while bpo[0] > 0 and total_runs_needed > 0:
-                if total_runs_needed >= max_runs:
-                    work_list.append(Work(source_id,
-                                          mater_eff * (1 - bpo[1] / 100),
-                                          time_eff * (1 - bpo[2] / 100),
-                                          max_runs, bpo[3], bpo[4]))
-                    total_runs_needed -= max_runs
-                    bpo[0] -= 1
-                    used_bp.add(bpo[3])
-                else:
-                    work_list.append(Work(source_id,
-                                          mater_eff * (1 - bpo[1] / 100),
-                                          time_eff * (1 - bpo[2] / 100),
-                                          total_runs_needed, bpo[3], bpo[4]))
-                    total_runs_needed = 0
-                    break
+            if bpo[0] > 0 and total_runs_needed >= max_runs:
+                count = min(bpo[0], total_runs_needed // max_runs)
+                work_list.append(WorkGroup(source_id,
+                                           mater_eff * (1 - bpo[1] / 100),
+                                           time_eff * (1 - bpo[2] / 100),
+                                           max_runs, bpo[3], bpo[4], count=count))
+                total_runs_needed -= max_runs * count
+                bpo[0] -= count
+                used_bp.add(bpo[3])
+            if bpo[0] > 0 and total_runs_needed > 0:
+                work_list.append(WorkGroup(source_id,
+                                           mater_eff * (1 - bpo[1] / 100),
+                                           time_eff * (1 - bpo[2] / 100),
+                                           total_runs_needed, bpo[3], bpo[4]))
+                total_runs_needed = 0
 
         # 上面步骤执行完还没归零，则从小到大使用直到归零
         # 若蓝图使用完还没归零，则创造虚空拷贝，方便计算缺失流程。
@@ -386,10 +460,10 @@ class IndustryAnalyser():
         # 剩余流程大于最大蓝图流程，找到小于剩余最大流程的从大到小匹配直到剩余流程归0
         for bpc in avaliable_bpc_list:
             if total_runs_needed > 0 and total_runs_needed >= bpc[0]:
-                work_list.append(Work(source_id,
-                                      mater_eff * (1 - bpc[1] / 100),
-                                      time_eff * (1 - bpc[2] / 100),
-                                      bpc[0], bpc[4], bpc[5]))
+                work_list.append(WorkGroup(source_id,
+                                           mater_eff * (1 - bpc[1] / 100),
+                                           time_eff * (1 - bpc[2] / 100),
+                                           bpc[0], bpc[4], bpc[5]))
                 total_runs_needed -= bpc[0]
                 used_bp.add(bpc[3])
         avaliable_bpc_list.sort(key=lambda x: x[0])
@@ -398,77 +472,172 @@ class IndustryAnalyser():
                 continue
             if total_runs_needed > 0:
                 if bpc[0] < total_runs_needed:
-                    work_list.append(Work(source_id,
-                                          mater_eff * (1 - bpc[1] / 100),
-                                          time_eff * (1 - bpc[2] / 100),
-                                          bpc[0], bpc[4], bpc[5]))
+                    work_list.append(WorkGroup(source_id,
+                                               mater_eff * (1 - bpc[1] / 100),
+                                               time_eff * (1 - bpc[2] / 100),
+                                               bpc[0], bpc[4], bpc[5]))
                     total_runs_needed -= bpc[0]
                 else:
-                    work_list.append(Work(source_id,
-                                          mater_eff * (1 - bpc[1] / 100),
-                                          time_eff * (1 - bpc[2] / 100),
-                                          total_runs_needed, bpc[4], bpc[5]))
+                    work_list.append(WorkGroup(source_id,
+                                               mater_eff * (1 - bpc[1] / 100),
+                                               time_eff * (1 - bpc[2] / 100),
+                                               total_runs_needed, bpc[4], bpc[5]))
                     total_runs_needed = 0
 
         # 按照单蓝图可生产最大流程处理
         max_production = min(BPManager.get_productionmax_by_bpid(bp_id),
                              math.ceil(30 * 24 * 60 * 60 / (time_eff * default_bp_time_eff * production_time)))
-        while total_runs_needed > 0:
-            if total_runs_needed >= max_production:
-                work_list.append(Work(source_id,
-                                      mater_eff * default_bp_meter_eff,
-                                      time_eff * default_bp_time_eff,
-                                      max_production, structure_id, structure_id, void_bp=True))
-                total_runs_needed -= max_production
-            else:
-                work_list.append(Work(source_id,
-                                      mater_eff * default_bp_meter_eff,
-                                      time_eff * default_bp_time_eff,
-                                      total_runs_needed, structure_id, structure_id, void_bp=True))
-                total_runs_needed = 0
+        if total_runs_needed >= max_production:
+            work_list.append(WorkGroup(source_id,
+                                       mater_eff * default_bp_meter_eff,
+                                       time_eff * default_bp_time_eff,
+                                       max_production, structure_id, structure_id, void_bp=True,
+                                       count=total_runs_needed // max_production))
+            total_runs_needed %= max_production
+        if total_runs_needed > 0:
+            work_list.append(WorkGroup(source_id,
+                                       mater_eff * default_bp_meter_eff,
+                                       time_eff * default_bp_time_eff,
+                                       total_runs_needed, structure_id, structure_id, void_bp=True))
+            total_runs_needed = 0
 
         work_list.sort(key=lambda x: x.runs)
+        work_list = WorkGroup.merge_list(work_list)
         work_cache[source_id] = work_list
         return work_list
 
-    def calculate_work_bpnode_quantity(self, child_id: int, cache_dict: dict):
+    def get_father_edge_list(self, child_id) -> list:
+        """
+        把节点的入边按父节点合并，按最小计划序号排序。
+        返回[[father, [index], child, quantity]]
+        """
+        tmp_dict = {}
+        for edge in self.bp_graph.in_edges(child_id, data=True):
+            if edge[0] not in tmp_dict:
+                tmp_dict[edge[0]] = [[], edge[1], edge[2]['quantity']]
+            tmp_dict[edge[0]][0] += edge[2]['index_list']
+        need_cal_edge_new = [[k]+v for k, v in tmp_dict.items()]
+        need_cal_edge_new.sort(key=lambda x: min(x[1]))
+        return need_cal_edge_new
+
+    def calculate_work_tree_quantity(self):
+        """
+        按拓扑序逐个计算蓝图节点数量，父节点总是先于子节点计算，每个节点只计算一次。
+        结果先记录在逐节点的字典中，最后统一写入work_graph和global_graph。
+        """
+        node_order = self.bp_graph.topological_sort()
+        # 叶子节点是各分量共享的材料池，只读取父节点的结果，且没有节点读取叶子节点的结果。
+        # 去掉root和叶子节点后互不连通的分量可以独立计算，叶子节点在合并分量结果后计算。
+        leaf_set = {node for node, degree in self.bp_graph.out_degree() if degree == 0}
+        component_list = self.bp_graph.weakly_connected_components({'root'} | leaf_set)
+        from .industry_component_pool import IndustryComponentPool
+        if self.profiler is None and IndustryComponentPool.can_parallel(component_list):
+            self.calculate_node_list(['root'])
+            IndustryComponentPool.calculate_component_list(
+                self, [[node for node in node_order if node in component] for component in component_list])
+            self.calculate_node_list([node for node in node_order if node in leaf_set and node != 'root'])
+        else:
+            self.calculate_node_list(node_order)
+
+        with self.profile_phase('materialize_work_graph'):
+            self.materialize_work_graph()
+
+    def calculate_node_list(self, node_list: list):
+        """ 按顺序计算节点，node_list内每个节点的父节点必须在它之前或已经计算完成 """
+        for node in node_list:
+            with self.profile_node(node):
+                self.father_edge_dict[node] = self.get_father_edge_list(node)
+                self.calculate_work_bpnode_quantity(node)
+
+    def get_node_result(self, node) -> tuple:
+        """
+        单个节点的计算结果，用于在进程间传递。
+        工作序列缓存与节点的work_list是同一个对象，一起序列化以保持引用关系。
+        """
+        return (self.father_edge_dict[node], self.work_node_dict[node], self.global_node_dict[node],
+                self.work_edge_dict.get(node), self.global_edge_dict.get(node),
+                self.actually_need_work_list_dict.get(node), self.total_need_work_list_dict.get(node),
+                self.bp_quantity_dict.get(node), self.bp_runs_dict.get(node), self.have_bpo.get(node))
+
+    def set_node_result(self, node, result: tuple):
+        (self.father_edge_dict[node], self.work_node_dict[node], self.global_node_dict[node],
+         work_edge, global_edge, actually_need_work_list, total_need_work_list,
+         bp_quantity, bp_runs, have_bpo) = result
+        for result_dict, value in [(self.work_edge_dict, work_edge), (self.global_edge_dict, global_edge),
+                                   (self.actually_need_work_list_dict, actually_need_work_list),
+                                   (self.total_need_work_list_dict, total_need_work_list),
+                                   (self.bp_quantity_dict, bp_quantity), (self.bp_runs_dict, bp_runs),
+                                   (self.have_bpo, have_bpo)]:
+            if value is not None:
+                result_dict[node] = value
+
+    def materialize_work_graph(self):
+        """
+        把逐节点计算结果写入work_graph和global_graph。
+        节点和边的写入顺序与从叶子节点向root递归计算时一致，下游表格的行顺序保持不变。
+        """
+        leaf_list = [node for node, degree in self.bp_graph.out_degree() if degree == 0]
+        visited = set()
+        for leaf in leaf_list:
+            if leaf in visited:
+                continue
+            visited.add(leaf)
+            self.add_result_node(leaf)
+            stack = [(leaf, iter(self.father_edge_dict[leaf]))]
+            while stack:
+                child_id, father_iter = stack[-1]
+                edge = next(father_iter, None)
+                if edge is None:
+                    stack.pop()
+                    if stack:
+                        self.add_result_edge(child_id, stack[-1][0])
+                    continue
+                father_id = edge[0]
+                if father_id in visited:
+                    self.add_result_edge(father_id, child_id)
+                    continue
+                visited.add(father_id)
+                self.add_result_node(father_id)
+                stack.append((father_id, iter(self.father_edge_dict[father_id])))
+
+    def add_result_node(self, type_id):
+        self.work_graph.add_node(type_id, **self.work_node_dict[type_id])
+        self.global_graph.add_node(type_id, **self.global_node_dict[type_id])
+
+    def add_result_edge(self, father_id, child_id):
+        if father_id == "root":
+            return
+        self.work_graph.add_edges_from(
+            (father_id, child_id, data) for data in self.work_edge_dict[child_id][father_id])
+        self.global_graph.add_edges_from(
+            (father_id, child_id, data) for data in self.global_edge_dict[child_id][father_id])
+
+    def calculate_work_bpnode_quantity(self, child_id):
         """
         计算工作蓝图节点数量（实际执行模式）
-        
+        调用前所有父节点必须已经计算完成。
+
         参数：
             typeid (int): 蓝图类型ID
         """
-        # 在图内则返回数据
-        if child_id in self.work_graph.nodes and child_id in self.global_graph:
-            return self.work_graph.nodes[child_id], self.global_graph.nodes[child_id]
-        self.work_graph.add_node(child_id)
-        self.global_graph.add_node(child_id)
         if child_id == "root":
-            self.work_graph.nodes[child_id].update({
+            self.work_node_dict[child_id] = {
                 'quantity': 1,
                 'index_quantity': [[index, data[1]] for index, data in enumerate(self.plan_list)],
                 'work_list': [],
                 'is_material': False
-            })
-            self.global_graph.nodes[child_id].update({
+            }
+            self.global_node_dict[child_id] = {
                 'quantity': 1,
                 'index_quantity': [[index, data[1]] for index, data in enumerate(self.plan_list)],
                 'work_list': [],
                 'is_material': False
-            })
-            return self.work_graph.nodes[child_id], self.global_graph.nodes[child_id]
+            }
+            return self.work_node_dict[child_id], self.global_node_dict[child_id]
 
-        need_cal_edge = [edge for edge in self.bp_graph.in_edges(child_id, data=True)]
-        # TODO需要改变结构
-        # 当前[fathern, child, data]
-        # 改为[father, [index], child, quantity]
-        tmp_dict = {}
-        for edge in need_cal_edge:
-            if edge[0] not in tmp_dict:
-                tmp_dict[edge[0]] = [[], edge[1], edge[2]['quantity']]
-            tmp_dict[edge[0]][0].append(edge[2]['index'])
-        need_cal_edge_new = [[k]+v for k, v in tmp_dict.items()]
-        need_cal_edge_new.sort(key=lambda x: min(x[1]))
+        need_cal_edge_new = self.father_edge_dict[child_id]
+        work_edge_dict = self.work_edge_dict.setdefault(child_id, dict())
+        global_edge_dict = self.global_edge_dict.setdefault(child_id, dict())
 
         # 制造中占位符
         running_count = self.running_job.get(child_id, 0)
@@ -488,7 +657,7 @@ class IndustryAnalyser():
             bp_need_quantity = edge[3]
             # index = edge[2]["index"]
 
-            father_work_node, father_global_node = self.calculate_work_bpnode_quantity(father_id, cache_dict)
+            father_work_node, father_global_node = self.work_node_dict[father_id], self.global_node_dict[father_id]
 
             # root节点特殊处理
             if father_id == "root":
@@ -511,94 +680,24 @@ class IndustryAnalyser():
 
             # 分index计算实际需求，可能是小数。
             # 实际部分
-            child_used_sum = 0
-            father_production_sum = 0
-            work_list_len = len(father_work_list)
-            work_i = 0
-            single_actually_index_need = {index: 0 for index, _ in father_actually_need_list}
-            for index, father_need in father_actually_need_list:
-                if index not in actually_index_need:
-                    actually_index_need[index] = 0
-                if father_need > 0:
-                    # 遍历工作直到满足index需求数量
-                    while father_production_sum < father_need and work_i < work_list_len:
-                        father_production_sum += father_work_list[work_i].runs * father_product_quantity
-                        # 如果需求为1，不吃材料加成
-                        child_used_sum += \
-                            math.ceil(father_work_list[work_i].runs * bp_need_quantity * \
-                            (1 if bp_need_quantity == 1 else father_work_list[work_i].mater_eff))
-                        father_work_list[work_i].support_index.add(index)
-                        # 设计上是刚好的，最后再加1会越界
-                        if work_i < work_list_len - 1:
-                            work_i += 1
-                    father_work_list[work_i].support_index.add(index)
-                    # 如果有超出部分，计算部分蓝图的消耗
-                    if father_production_sum > father_need:
-                        if work_i >= work_list_len:
-                            raise KahunaException(f"{father_id} work cant cover need.")
-                        father_production_sum -= father_need
-                        bp_used_ratio = father_production_sum / father_work_list[work_i].runs / father_product_quantity
-                        # 如果需求为1，不吃材料加成
-                        child_less = math.ceil(bp_used_ratio * father_work_list[work_i].runs * bp_need_quantity * \
-                                     (1 if bp_need_quantity == 1 else father_work_list[work_i].mater_eff))
-                        actually_index_need[index] += (child_used_sum - child_less)
-                        single_actually_index_need[index] = (child_used_sum - child_less)
-                        child_used_sum = child_less
-                    elif father_production_sum == father_need:
-                        actually_index_need[index] += child_used_sum
-                        single_actually_index_need[index] = child_used_sum
-                        child_used_sum = 0
-                        father_production_sum = 0
-                    else:
-                        raise KahunaException("安排的工作无法处理需求")
+            mark_list = []
+            single_actually_index_need, child_used_sum = self.walk_father_work(
+                father_work_list, father_actually_need_list, father_product_quantity, bp_need_quantity,
+                "安排的工作无法处理需求", mark_list)
+            WorkGroup.mark_support(father_work_list, mark_list)
+            for index, quantity in single_actually_index_need.items():
+                actually_index_need[index] = actually_index_need.get(index, 0) + quantity
             if child_used_sum > 0:
                 last_index = father_actually_need_list[-1][0]
                 actually_index_need[last_index] += child_used_sum
                 single_actually_index_need[last_index] += child_used_sum
 
             # 全体部分
-            child_used_sum = 0
-            father_production_sum = 0
-            work_list_len = len(father_total_work_list)
-            work_i = 0
-            single_total_index_need = {index: 0 for index, _ in father_total_need_list}
-            for index, father_need in father_total_need_list:
-                if index not in total_index_need:
-                    total_index_need[index] = 0
-                    single_total_index_need[index] = 0
-                if father_need > 0:
-                    # 遍历工作直到满足index需求数量
-                    while father_production_sum < father_need and work_i < work_list_len:
-                        father_production_sum += father_total_work_list[work_i].runs * father_product_quantity
-                        # 如果需求为1，不吃材料加成
-                        child_used_sum += math.ceil(father_total_work_list[work_i].runs * bp_need_quantity * \
-                                          (1 if bp_need_quantity == 1 else father_total_work_list[work_i].mater_eff))
-                        if work_i < work_list_len - 1:
-                            work_i += 1
-                    # 如果有超出部分，计算部分蓝图的消耗
-                    if father_production_sum > father_need:
-                        if work_i >= work_list_len:
-                            raise KahunaException(f"{father_id} work cant cover need.")
-                        father_production_sum -= father_need
-                        bp_used_ratio = father_production_sum / father_total_work_list[work_i].runs / father_product_quantity
-
-                        # 如果需求为1，不吃材料加成
-                        child_less = math.ceil(bp_used_ratio * father_total_work_list[work_i].runs * bp_need_quantity * \
-                                     (1 if bp_need_quantity == 1 else father_total_work_list[work_i].mater_eff))
-                        total_index_need[index] += (child_used_sum - child_less)
-                        single_total_index_need[index] = (child_used_sum - child_less)
-                        child_used_sum = child_less
-                    elif father_production_sum == father_need:
-                        total_index_need[index] += child_used_sum
-                        single_total_index_need[index] = child_used_sum
-                        child_used_sum = 0
-                        father_production_sum = 0
-                    else:
-                        raise KahunaException("安排的工作无法覆盖需求")
-            # if child_used_sum > 0:
-            #     last_index = father_total_need_list[-1][0]
-            #     total_index_need[last_index] += child_used_sum
-            #     single_total_index_need[last_index] += child_used_sum
+            single_total_index_need, _ = self.walk_father_work(
+                father_total_work_list, father_total_need_list, father_product_quantity, bp_need_quantity,
+                "安排的工作无法覆盖需求")
+            for index, quantity in single_total_index_need.items():
+                total_index_need[index] = total_index_need.get(index, 0) + quantity
 
             for index, quantity in single_actually_index_need.items():
                 # 计算资产是否满足父节点需求
@@ -613,9 +712,9 @@ class IndustryAnalyser():
                     # 不满足
                     avaliable_asset = 0
                     status = 3
-                self.work_graph.add_edge(father_id, child_id, index=index, quantity=quantity, status=status)
+                work_edge_dict.setdefault(father_id, []).append({'index': index, 'quantity': quantity, 'status': status})
             for index, quantity in single_total_index_need.items():
-                self.global_graph.add_edge(father_id, child_id, index=index, quantity=quantity)
+                global_edge_dict.setdefault(father_id, []).append({'index': index, 'quantity': quantity})
 
         # 备份记录一次该类型资产总数，用于父节点判断状态
 
@@ -649,27 +748,88 @@ class IndustryAnalyser():
 
         child_eiv_cost = IdsU.get_eiv_cost(child_id, child_total_quantity, self.owner_qq, self.st_matcher)
         logistic_data = IdsU.get_logistic_need_data(self.owner_qq, child_id, self.st_matcher, child_actually_total_quantity)
-        self.work_graph.nodes[child_id].update({
+        self.work_node_dict[child_id] = {
             'quantity': child_actually_total_quantity,
             'work_list': child_actually_worklist,
             'index_quantity': actually_index_quantity,
             'is_material': is_material,
             'logistic': logistic_data,
-        })
-        self.global_graph.nodes[child_id].update({
+        }
+        self.global_node_dict[child_id] = {
             'quantity': child_total_quantity,
             'work_list': child_total_worklist,
             'index_quantity': sorted(list([k, v] for k, v in total_index_need.items()), key=lambda x: x[0]),
             'is_material': is_material
-        })
-        if self.global_graph.nodes[child_id]['is_material']:
-            self.global_graph.nodes[child_id].update({'buy_cost': child_total_quantity * self.market.get_type_order_rouge(child_id)[0]})
+        }
+        if self.global_node_dict[child_id]['is_material']:
+            self.global_node_dict[child_id].update({'buy_cost': child_total_quantity * self.market.get_type_order_rouge(child_id)[0]})
         else:
-            self.global_graph.nodes[child_id].update({'eiv_cost': child_eiv_cost})
+            self.global_node_dict[child_id].update({'eiv_cost': child_eiv_cost})
 
-        return self.work_graph.nodes[child_id], self.global_graph.nodes[child_id]
+        return self.work_node_dict[child_id], self.global_node_dict[child_id]
+
+    @staticmethod
+    def walk_father_work(work_list: list, need_list: list, product_quantity: int, bp_need_quantity: int,
+                         error_msg: str, mark_list: list = None) -> tuple[dict, int]:
+        """
+        按计划序号顺序用父节点的工作满足需求，计算每个序号对子节点的消耗。
+        与逐个工作遍历的结果一致: 一次跳过组内所需数量的工作，最后一个工作不前进、重复使用。
+        mark_list不为None时记录每个序号使用的工作区间(包括遍历结束时所在的工作)。
+        返回({index: 子节点消耗}, 未计入任何序号的剩余消耗)
+        """
+        single_index_need = {index: 0 for index, _ in need_list}
+        child_used_sum = 0
+        production_sum = 0
+        # 当前工作所在组、组内序号、展开后的序号
+        group_i, offset, position = 0, 0, 0
+        last_group = len(work_list) - 1
+        for index, need in need_list:
+            if need <= 0:
+                continue
+            start = position
+            # 遍历工作直到满足index需求数量
+            while production_sum < need and group_i <= last_group:
+                work = work_list[group_i]
+                unit_production = work.runs * product_quantity
+                # 如果需求为1，不吃材料加成
+                unit_used = math.ceil(work.runs * bp_need_quantity * (1 if bp_need_quantity == 1 else work.mater_eff))
+                count = -((production_sum - need) // unit_production)
+                remain = work.count - offset - (1 if group_i == last_group else 0)
+                if remain > 0:
+                    count = min(count, remain)
+                production_sum += count * unit_production
+                child_used_sum += count * unit_used
+                if remain <= 0:
+                    break
+                offset += count
+                position += count
+                if offset == work.count:
+                    group_i, offset = group_i + 1, 0
+            if mark_list is not None:
+                mark_list.append((start, position + 1, index))
+            # 如果有超出部分，计算部分蓝图的消耗
+            if production_sum > need:
+                production_sum -= need
+                work = work_list[group_i]
+                bp_used_ratio = production_sum / work.runs / product_quantity
+                # 如果需求为1，不吃材料加成
+                child_less = math.ceil(bp_used_ratio * work.runs * bp_need_quantity * \
+                                       (1 if bp_need_quantity == 1 else work.mater_eff))
+                single_index_need[index] = child_used_sum - child_less
+                child_used_sum = child_less
+            elif production_sum == need:
+                single_index_need[index] = child_used_sum
+                child_used_sum = 0
+                production_sum = 0
+            else:
+                raise KahunaException(error_msg)
+        return single_index_need, child_used_sum
 
     def update_work_avaliable(self):
+        """
+        按最小支持序号依次用库存检查工作的材料，不满足的工作不可用。
+        组内工作相同，每种材料能满足组内前若干个工作，取各材料的最小值后把不可用的部分拆分出去。
+        """
         asset_dict = self.job_asset_check_dict
         work_check_dict = dict()
         for node in self.work_graph.nodes():
@@ -679,13 +839,33 @@ class IndustryAnalyser():
             for work in work_list:
                 IdsU.input_work_checkpoint(work_check_dict, work)
 
+        avaliable_count_dict = dict()  # {id(work): 可用数量}
         for needed_child, needed_data in work_check_dict.items():
             needed_data.sort(key=lambda x: x['min_index'])
             for needed in needed_data:
-                if needed['quantity'] > asset_dict.get(needed_child, 0):
-                    needed['work'].avaliable = False
-                else:
-                    asset_dict[needed_child] -= needed['quantity']
+                work = needed['work']
+                stock = asset_dict.get(needed_child, 0)
+                count = work.count if stock >= needed['quantity'] * work.count else max(int(stock // needed['quantity']), 0)
+                if count > 0:
+                    asset_dict[needed_child] -= needed['quantity'] * count
+                avaliable_count_dict[id(work)] = min(avaliable_count_dict.get(id(work), work.count), count)
+
+        for node in self.work_graph.nodes():
+            if 'work_list' not in self.work_graph.nodes[node]:
+                continue
+            work_list = self.work_graph.nodes[node]['work_list']
+            res = []
+            for work in work_list:
+                count = avaliable_count_dict.get(id(work), work.count)
+                if count == 0:
+                    work.avaliable = False
+                elif count < work.count:
+                    tail = work.split(count)
+                    tail.avaliable = False
+                    res.append(work)
+                    work = tail
+                res.append(work)
+            work_list[:] = res
 
 
     """ 计算核心入口函数 """
@@ -693,26 +873,29 @@ class IndustryAnalyser():
         if not self.bp_matcher or not self.st_matcher or not self.pd_block_matcher:
             raise KahunaException("matcher must be set in BpAnalyser.")
 
-        # 获取目标库存、正在运行的工作、库存内的资产
-        self.get_target_container()
-        self.get_running_job()
-        self.get_asset_in_container()
+        # 获取目标库存、正在运行的工作、库存内的资产和蓝图资产
+        with self.profile_phase('load_input'):
+            self.load_input()
 
         accept_worklist = []
         for work in work_list:
             if SdeUtils.get_id_by_name(work[0]) and BPManager.get_bp_id_by_prod_typeid(SdeUtils.get_id_by_name(work[0])):
                 accept_worklist.append(work)
 
-        self.get_work_tree(accept_worklist, self.bp_graph)
+        with self.profile_phase('get_work_tree'):
+            self.get_work_tree(accept_worklist, self.bp_graph)
+        with self.profile_phase('get_bp_inventory'):
+            self.get_bp_inventory()
 
+        with self.profile_phase('calculate_work_tree_quantity'):
+            self.calculate_work_tree_quantity()
         nodes_without_outgoing_edges = [node for node, degree in self.bp_graph.out_degree() if degree == 0]
-        res_dict = {}
-        cache_dict = dict()
-        for node in nodes_without_outgoing_edges:
-            res_dict[node] = self.calculate_work_bpnode_quantity(node, cache_dict)
+        res_dict = {node: (self.work_graph.nodes[node], self.global_graph.nodes[node])
+                    for node in nodes_without_outgoing_edges}
 
         ''' 更新工作流的材料是否满足 '''
-        self.update_work_avaliable()
+        with self.profile_phase('update_work_avaliable'):
+            self.update_work_avaliable()
 
         self.analysed_status = True
         return res_dict
@@ -728,12 +911,19 @@ class IndustryAnalyser():
         self.target_container.clear()
         self.asset_dict.clear()
 
+        self.father_edge_dict.clear()
+        self.work_node_dict.clear()
+        self.global_node_dict.clear()
+        self.work_edge_dict.clear()
+        self.global_edge_dict.clear()
         self.global_graph.clear()
         self.work_graph.clear()
 
         self.bp_runs_dict.clear()
         self.bp_quantity_dict.clear()
         self.have_bpo.clear()
+        self.bp_inventory.clear()
+        self.work_tree_data = dict()
 
         self.analysed_status = False
 
@@ -741,13 +931,13 @@ class IndustryAnalyser():
         self.plan_list = plan_list
 
     @classmethod
-    def create_analyser_by_plan(cls, user, plan_name: str):
+    def create_analyser_by_plan(cls, user, plan_name: str, cal_type: str = "work"):
         plan_dict = user.user_data.plan[plan_name]
         bp_matcher = IndustryConfigManager.get_matcher_of_user_by_name(plan_dict["bp_matcher"], user.user_qq)
         st_matcher = IndustryConfigManager.get_matcher_of_user_by_name(plan_dict["st_matcher"], user.user_qq)
         prod_block_matcher = IndustryConfigManager.get_matcher_of_user_by_name(plan_dict["prod_block_matcher"], user.user_qq)
 
-        analyser = IndustryAnalyser(user.user_qq, "work")
+        analyser = IndustryAnalyser(user.user_qq, cal_type)
         analyser.set_matchers(bp_matcher, st_matcher, prod_block_matcher)
         analyser.set_plan_list(plan_dict["plan"])
         analyser.manu_cycle_time = plan_dict['manucycletime']
@@ -760,125 +950,119 @@ class IndustryAnalyser():
 
     @classmethod
     def get_analyser_by_plan(cls, user, plan_name):
-        return cls.create_analyser_by_plan(user, plan_name)
+        """ 指纹未变化时返回缓存的分析器，其报表结果可直接复用 """
+        fingerprint = IndustryAnalyseCache.get_fingerprint(user, plan_name)
+        if analyser := IndustryAnalyseCache.get(fingerprint):
+            logger.info(f"analyse cache hit: {user.user_qq} {plan_name}.")
+            return analyser
+        analyser = cls.create_analyser_by_plan(user, plan_name)
+        IndustryAnalyseCache.set(fingerprint, analyser)
+        return analyser
 
-    def get_work_tree_data(self):
-        self.clean_analyser()
+    def get_work_tree_data(self, section_list: list = None) -> dict:
+        """ 返回指定部分的报表{section: data}，默认全部部分，顺序与section_list一致 """
+        section_list = self.check_section_list(section_list)
+        res = dict(self.iter_work_tree_data(section_list))
+        return {section: res[section] for section in section_list}
+
+    def iter_work_tree_data(self, section_list: list = None):
+        """
+        按完成顺序返回(section, data)。
+        计划只分析一次，报表各部分在第一次被请求时在线程池中并行生成，
+        生成中的Future保存在work_tree_data中，同一个缓存分析器的并发请求共用结果。
+        设置了profiler时在当前线程依次生成，profiler只跟踪当前线程的调用栈和sql。
+        """
+        section_list = self.check_section_list(section_list)
+        with self.report_lock:
+            self.analyse_plan()
+            # 未生成或生成失败的部分重新生成
+            pending_list = [section for section in section_list
+                            if section not in self.work_tree_data or
+                            (self.work_tree_data[section].done() and self.work_tree_data[section].exception())]
+            if pending_list and self.profiler is not None:
+                for section in pending_list:
+                    self.work_tree_data[section] = future = Future()
+                    try:
+                        future.set_result(self.create_report_section(section))
+                    except Exception as e:
+                        future.set_exception(e)
+            elif pending_list:
+                executor = ThreadPoolExecutor(max_workers=len(pending_list))
+                for section in pending_list:
+                    self.work_tree_data[section] = executor.submit(IndustryInputLoader.read,
+                                                                   self.create_report_section, section)
+                executor.shutdown(wait=False)
+            future_dict = {self.work_tree_data[section]: section for section in section_list}
+
+        for future in as_completed(future_dict):
+            yield future_dict[future], future.result()
+
+    def analyse_plan(self):
+        """ 计划未分析时重新分析，缓存分析器由多个请求共用，调用方需持有report_lock """
         if not self.analysed_status:
+            self.clean_analyser()
             self.analyse_progress_work_type(self.plan_list)
 
-        result_dict = {
-            'work': dict(),
-            'material': {"矿石": [],
-                        "行星工业": [],
-                        "燃料块": [],
-                        "元素": [],
-                        "气云": [],
-                        "杂货": [],
-                        "反应物": []},
-            'work_flow': dict(),
-            'logistic': dict()
-        }
-
-        res = self.get_work_node_data(result_dict)
-
-        return res
-
-    def get_work_node_data(self, result_dict):
+    def create_work_tree_data(self, section_list: list = None) -> dict:
+        """ 重新分析并在当前线程依次生成报表，不使用work_tree_data，用于性能分析 """
+        section_list = self.check_section_list(section_list)
+        self.clean_analyser()
+        self.analyse_progress_work_type(self.plan_list)
+        return {section: self.create_report_section(section) for section in section_list}
+
+    @staticmethod
+    def check_section_list(section_list: list = None) -> list:
+        if not section_list:
+            return list(REPORT_SECTION_LIST)
+        for section in section_list:
+            if section not in REPORT_SECTION_LIST:
+                raise KahunaException(f"报表部分 {section} 不存在，可选: {', '.join(REPORT_SECTION_LIST)}")
+        return list(section_list)
+
+    def create_report_section(self, section: str):
+        with self.profile_phase(f'get_{section}_data'):
+            if section == 'work':
+                return self.get_work_node_data()
+            if section == 'material':
+                return self.get_material_node_data()
+            res_dict = dict()
+            if section == 'work_flow':
+                self.get_workflow_data(res_dict)
+            elif section == 'logistic':
+                self.get_transport_data(res_dict)
+            return res_dict
+
+    def get_work_node_data(self) -> dict:
+        """ 第一层以外的节点，按层级分组，计划产品放在最上层 """
+        work_dict = dict()
         for node in self.bp_graph.nodes():
-            if node == 'root':
+            if node == 'root' or self.bp_graph.nodes[node]['depth'] == 1:
                  continue
-            layer = self.bp_graph.nodes[node]['depth']
-
-            if layer == 1:
-                self.add_material_data(node, result_dict['material'])
-            else:
-                self.add_work_data(node, result_dict['work'])
+            self.add_work_data(node, work_dict)
 
         res = {i+1:[] for i in range(self.bp_graph.nodes['root']['depth'] - 1)}
         top_layer = self.bp_graph.nodes['root']['depth'] - 1
-        for node, data in result_dict['work'].items():
+        for node, data in work_dict.items():
             layer = self.bp_graph.nodes[node]['depth']
             if self.bp_graph.has_edge('root', node):
                 res[top_layer].append(data)
                 continue
             res[layer].append(data)
-        result_dict['work'] = res
-
-        self.get_workflow_data(result_dict['work_flow'])
-        self.get_transport_data(result_dict['logistic'])
-
-        return result_dict
-
-    def get_logistic_data(self, logistic_dict):
-        asset_container_list = list(self.target_container)
+        return res
 
-        # 获取需求
-        structure_need_dict = dict()
-        for node in self.work_graph.nodes():
-            if node == 'root':
-                continue
-            # [child_id, structure, quantity]
-            logistic_data = self.work_graph.nodes[node]['logistic']
-            if logistic_data[2] <= 0:
-                continue
-            if logistic_data[1] not in structure_need_dict:
-                structure_need_dict[logistic_data[1]] = dict()
-            if logistic_data[0] not in structure_need_dict[logistic_data[1]]:
-                structure_need_dict[logistic_data[1]][logistic_data[0]] = 0
-            structure_need_dict[logistic_data[1]][logistic_data[0]] += logistic_data[2]
-        logistic_dict['need'] = structure_need_dict
-
-        structure_provide_dict = dict()
-        asset_res = AssetManager.get_asset_in_container_list(list(self.target_container))
-        for asset in asset_res:
-            if asset.type_id not in self.work_graph.nodes():
-                continue
-            if asset.location_id not in self.target_container:
-                continue
-            structure_id = SdeUtils.get_structure_id_from_location_id(asset.location_id)[0]
-            structure_name = StructureManager.get_structure(structure_id)
-            if structure_name not in structure_provide_dict:
-                structure_provide_dict[structure_name] = dict()
-            if asset.type_id not in structure_provide_dict[structure_name]:
-                structure_provide_dict[structure_name][asset.type_id] = 0
-            structure_provide_dict[structure_name][asset.type_id] += asset.quantity
-        logistic_dict['provide'] = structure_provide_dict
-
-        # 处理自供给
-        for struct, struct_need in structure_need_dict.items():
-            for type_id, quantity in struct_need.items():
-                if (struct not in structure_provide_dict or
-                    type_id not in structure_provide_dict[struct]):
-                    continue
-                if structure_provide_dict[struct][type_id] >= quantity:
-                    structure_provide_dict[struct][type_id] -= quantity
-                    struct_need[type_id] = 0
-                else:
-                    struct_need[type_id] -= structure_provide_dict[struct][type_id]
-                    structure_provide_dict[struct].pop(type_id)
-
-        transport_dict = dict()
-        # 处理异地供给
-        for need_struct, struct_need in structure_need_dict.items():
-            for type_id, quantity in struct_need.items():
-                for prov_struct, struct_provide in structure_provide_dict.items():
-                    if (type_id not in struct_provide or
-                        struct_provide[type_id] == 0 or
-                        struct_need[type_id] == 0 or
-                        need_struct == prov_struct):
-                        continue
-                    if (prov_struct.name, need_struct.name, type_id) not in transport_dict:
-                        transport_dict[(prov_struct.name, need_struct.name, type_id)] = 0
-                    if struct_provide[type_id] >= quantity:
-                        transport_dict[(prov_struct.name, need_struct.name, type_id)] += quantity
-                        struct_provide[type_id] -= quantity
-                        struct_need[type_id] = 0
-                    else:
-                        transport_dict[(prov_struct.name, need_struct.name, type_id)] += struct_provide[type_id]
-                        struct_need[type_id] -= struct_provide[type_id]
-                        struct_provide[type_id] = 0
-        logistic_dict['transport'] = transport_dict
+    def get_material_node_data(self) -> dict:
+        """ 第一层节点，即需要购买的材料 """
+        material_dict = {"矿石": [],
+                         "行星工业": [],
+                         "燃料块": [],
+                         "元素": [],
+                         "气云": [],
+                         "杂货": [],
+                         "反应物": []}
+        for node in self.bp_graph.nodes():
+            if node != 'root' and self.bp_graph.nodes[node]['depth'] == 1:
+                self.add_material_data(node, material_dict)
+        return material_dict
 
     def get_workflow_data(self, res_dict: dict):
         top_layer = self.bp_graph.nodes['root']['depth'] - 1
@@ -903,7 +1087,7 @@ class IndustryAnalyser():
                         continue
                     if work.runs not in node_work:
                         node_work[work.runs] = 0
-                    node_work[work.runs] += 1
+                    node_work[work.runs] += work.count
                 if len(node_work) > 0:
                     work_output = [['', k, v] for k, v in node_work.items()]
                     work_output.sort(key=lambda x: x[1], reverse=True)
@@ -920,79 +1104,21 @@ class IndustryAnalyser():
         res_dict['reac_flow'] = reac_list
 
     def get_transport_data(self, logistic_dict: dict):
-        node_list = [node for node in self.work_graph.nodes() if node != 'root']
         main_chara = CharacterManager.get_character_by_id(UserManager.get_main_character_id(self.owner_qq))
-        ac_token = main_chara.ac_token
+        planner = IndustryTransportPlanner(main_chara.ac_token)
+
         # 获取需求
-        structure_need_dict = dict()
-        for node in node_list:
-            node_data = self.work_graph.nodes[node]
-            work_list = node_data['work_list']
-            for work in work_list:
-                if not work.avaliable:
-                    continue
-                material_need = work.get_material_need()
-                structure = StructureManager.get_structure(work.structure_id, ac_token)
-                if structure not in structure_need_dict:
-                    structure_need_dict[structure] = dict()
-                struc_need_dict = structure_need_dict[structure]
-                for child_id, quantity in material_need.items():
-                    if child_id not in struc_need_dict:
-                        struc_need_dict[child_id] = 0
-                    struc_need_dict[child_id] += quantity
-        logistic_dict['need'] = structure_need_dict
+        planner.add_work_need([work for node in self.work_graph.nodes() if node != 'root'
+                               for work in self.work_graph.nodes[node]['work_list']])
+        logistic_dict['need'] = planner.need_dict
 
         # 获取供给
-        structure_provide_dict = dict()
-        asset_res = AssetManager.get_asset_in_container_list(list(self.target_container))
-        for asset in asset_res:
-            if asset.type_id not in self.work_graph.nodes():
-                continue
-            if asset.location_id not in self.target_container:
-                continue
-            structure_id = SdeUtils.get_structure_id_from_location_id(asset.location_id)[0]
-            structure = StructureManager.get_structure(structure_id, ac_token)
-            if structure not in structure_provide_dict:
-                structure_provide_dict[structure] = dict()
-            if asset.type_id not in structure_provide_dict[structure]:
-                structure_provide_dict[structure][asset.type_id] = 0
-            structure_provide_dict[structure][asset.type_id] += asset.quantity
-        logistic_dict['provide'] = structure_provide_dict
-
-        # 处理自供给
-        for struct, struct_need in structure_need_dict.items():
-            for type_id, quantity in struct_need.items():
-                if (struct not in structure_provide_dict or
-                        type_id not in structure_provide_dict[struct]):
-                    continue
-                if structure_provide_dict[struct][type_id] >= quantity:
-                    structure_provide_dict[struct][type_id] -= quantity
-                    struct_need[type_id] = 0
-                else:
-                    struct_need[type_id] -= structure_provide_dict[struct][type_id]
-                    structure_provide_dict[struct].pop(type_id)
-
-        transport_dict = dict()
-        # 处理异地供给
-        for need_struct, struct_need in structure_need_dict.items():
-            for type_id, quantity in struct_need.items():
-                for prov_struct, struct_provide in structure_provide_dict.items():
-                    if (type_id not in struct_provide or
-                            struct_provide[type_id] == 0 or
-                            struct_need[type_id] == 0 or
-                            need_struct == prov_struct):
-                        continue
-                    if (prov_struct.name, need_struct.name, type_id) not in transport_dict:
-                        transport_dict[(prov_struct.name, need_struct.name, type_id)] = 0
-                    if struct_provide[type_id] >= quantity:
-                        transport_dict[(prov_struct.name, need_struct.name, type_id)] += quantity
-                        struct_provide[type_id] -= quantity
-                        struct_need[type_id] = 0
-                    else:
-                        transport_dict[(prov_struct.name, need_struct.name, type_id)] += struct_provide[type_id]
-                        struct_need[type_id] -= struct_provide[type_id]
-                        struct_provide[type_id] = 0
-        logistic_dict['transport'] = transport_dict
+        planner.add_asset_provide(AssetManager.get_asset_in_container_list(list(self.target_container)),
+                                  set(self.work_graph.nodes()), self.target_container)
+        logistic_dict['provide'] = planner.provide_dict
+
+        logistic_dict['transport'] = planner.get_transport()
+        logistic_dict['haul'] = planner.get_haul_list(logistic_dict['transport'])
 
     def add_material_data(self, type_id, result_dict):
         # 获取 Group 和 Category 信息
@@ -1059,8 +1185,8 @@ class IndustryAnalyser():
             work_node['quantity'],                  # 缺失
             global_node['quantity'],                # 总需求
             self.running_job.get(type_id, 0) * production_quantity,
-            sum([job.runs for job in work_node['work_list']]),
-            sum([job.runs for job in global_node['work_list']]),
+            sum([job.runs * job.count for job in work_node['work_list']]),
+            sum([job.runs * job.count for job in global_node['work_list']]),
             self.bp_quantity_dict.get(type_id, 0),
             bp_count,                               # 蓝图数量
             self.get_status(type_id)
@@ -1096,8 +1222,11 @@ class IndustryAnalyser():
         return res
 
     @classmethod
-    def signal_async_progress_work_type(cls, user, plan_name, plan_list):
+    def signal_async_progress_work_type(cls, user, plan_name, plan_list, market=None, analyse_input=None):
         analyser = cls.create_analyser_by_plan(user, plan_name)
+        if market:
+            analyser.market = market
+        analyser.analyse_input = analyse_input
         material_dict = analyser.analyse_progress_work_type(plan_list)
         material_cost = 0
         for node in [node for node, degree in analyser.global_graph.out_degree() if degree == 0]:
@@ -1115,45 +1244,41 @@ class IndustryAnalyser():
         # return analyser, plan_list
 
     @classmethod
-    def get_cost_data(cls, user, plan_name: str, plan_list):
-        """ 计算planlist中的材料成本，用于批量计算 """
-        # analyser = cls.create_analyser_by_plan(user, plan_name)
-        from concurrent.futures import ThreadPoolExecutor
-        with ThreadPoolExecutor(max_workers=20) as executor:
-            futures = [executor.submit(cls.signal_async_progress_work_type, user, plan_name, [plan])
-                       for plan in plan_list]
-            cost_dict = dict()
-        # for plan in plan_list:
-            # analyser.analyse_progress_work_type([plan])
-            with tqdm(total=len(futures), desc="成本计算", unit="个") as pbar:
-                for future in futures:
-                    result = future.result()
-                    cost_dict[result[0]] = result[1:]
-                    pbar.update()
-
-        return cost_dict
+    def get_cost_data(cls, user, plan_name: str, plan_list, cal_type: str = "work"):
+        """
+        计算planlist中的材料成本，用于批量计算
+        cal_type为"cost"时使用IndustryCostEngine一次求解所有产品的长期最小成本，
+        为"work"时每个产品单独按实际蓝图和库存分析，由IndustryCostPool分配到进程池或线程池。
+        """
+        if cal_type == "cost":
+            analyser = cls.create_analyser_by_plan(user, plan_name, cal_type)
+            return IndustryCostEngine(analyser).get_cost_data(plan_list)
+
+        from .industry_cost_pool import IndustryCostPool
+        return IndustryCostPool.get_cost_data(user, plan_name, plan_list)
 
     @classmethod
-    def get_cost_detail(cls, user, plan_name: str, product: str):
-        analyser = cls.create_analyser_by_plan(user, plan_name)
-        analyser.analyse_progress_work_type([[product, 1]])
+    def get_cost_detail(cls, user, plan_name: str, product: str, cal_type: str = "work"):
+        analyser = cls.create_analyser_by_plan(user, plan_name, cal_type)
+        if cal_type == "cost":
+            material_cost_dict, eiv_cost = IndustryCostEngine(analyser).get_cost_detail(product)
+        else:
+            analyser.analyse_progress_work_type([[product, 1]])
+            material_cost_dict = {node: analyser.global_graph.nodes[node]['buy_cost']
+                                  for node, degree in analyser.global_graph.out_degree() if degree == 0 and node != 'root'}
+            eiv_cost = 0
+            for node in [node for node, degree in analyser.global_graph.out_degree() if degree != 0]:
+                if node == 'root':
+                    continue
+                eiv_cost += analyser.global_graph.nodes[node]['eiv_cost']
 
         res = {'material': dict(), 'group_detail': dict()}
 
         material_dict = res['material']
         total_cost = 0
-        for node in [node for node, degree in analyser.global_graph.out_degree() if degree == 0]:
-            if node == 'root':
-                continue
-            cost = analyser.global_graph.nodes[node]['buy_cost']
+        for node, cost in material_cost_dict.items():
             material_dict[node] = [cost]
             total_cost += cost
-
-        eiv_cost = 0
-        for node in [node for node, degree in analyser.global_graph.out_degree() if degree != 0]:
-            if node == 'root':
-                continue
-            eiv_cost += analyser.global_graph.nodes[node]['eiv_cost']
         total_cost += eiv_cost
         res['eiv'] = [eiv_cost, eiv_cost / total_cost]
 
@@ -0,0 +1,85 @@
+import json
+import hashlib
+import threading
+from cachetools import TTLCache
+
+from .industry_config import IndustryConfigManager
+from ..asset_server.asset_manager import AssetManager
+from ..database_server.snapshot_version import (SnapshotVersion, SNAPSHOT_LIST,
+                                                MARKET_PRICE_SNAPSHOT, ORDER_SNAPSHOT, SYSTEM_COST_SNAPSHOT)
+
+# kahuna logger
+from ..log_server import logger
+
+# 各计算模式依赖的快照，"cost"模式不读取库存、运行中的工作和蓝图资产
+CAL_TYPE_SNAPSHOT = {
+    "work": SNAPSHOT_LIST,
+    "cost": [MARKET_PRICE_SNAPSHOT, ORDER_SNAPSHOT, SYSTEM_COST_SNAPSHOT],
+}
+
+
+class IndustryAnalyseCache:
+    """
+    工业分析结果缓存。
+    key为指纹: 用户、计划内容、三个匹配器、周期时间、隐藏容器、用户容器的标签和依赖快照的版本号，
+    任一依赖快照刷新时清理受影响的条目。
+    """
+    cache = TTLCache(maxsize=10, ttl=60 * 60)  # {fingerprint: (snapshot_set, analyser)}
+    lock = threading.Lock()
+    hit = 0
+    miss = 0
+
+    @classmethod
+    def get_fingerprint(cls, user, plan_name: str, cal_type: str = "work") -> str:
+        plan_dict = user.user_data.plan[plan_name]
+        matcher_list = [IndustryConfigManager.get_matcher_of_user_by_name(plan_dict[matcher_key], user.user_qq)
+                        for matcher_key in ["bp_matcher", "st_matcher", "prod_block_matcher"]]
+        snapshot_list = CAL_TYPE_SNAPSHOT[cal_type]
+        fingerprint_data = [
+            user.user_qq,
+            plan_name,
+            cal_type,
+            plan_dict["plan"],
+            [[matcher.matcher_name, matcher.matcher_type, matcher.matcher_data] for matcher in matcher_list],
+            [plan_dict["manucycletime"], plan_dict["reaccycletime"]],
+            sorted(plan_dict["container_block"]),
+            # 容器标签决定目标仓库和蓝图仓库
+            sorted([container.asset_location_id, str(container.tag), container.structure_id]
+                   for container in AssetManager.get_user_container(user.user_qq)),
+            list(zip(snapshot_list, SnapshotVersion.get_version(snapshot_list))),
+        ]
+        return hashlib.sha1(json.dumps(fingerprint_data, sort_keys=True, ensure_ascii=False,
+                                       default=str).encode('utf-8')).hexdigest()
+
+    @classmethod
+    def get(cls, fingerprint: str):
+        with cls.lock:
+            if fingerprint in cls.cache:
+                cls.hit += 1
+                return cls.cache[fingerprint][1]
+            cls.miss += 1
+            return None
+
+    @classmethod
+    def set(cls, fingerprint: str, analyser):
+        with cls.lock:
+            cls.cache[fingerprint] = (set(CAL_TYPE_SNAPSHOT[analyser.cal_type]), analyser)
+
+    @classmethod
+    def invalidate(cls, snapshot_list):
+        """ 快照刷新后删除依赖这些快照的条目 """
+        with cls.lock:
+            expired_list = [fingerprint for fingerprint, (snapshot_set, _) in cls.cache.items()
+                            if snapshot_set.intersection(snapshot_list)]
+            for fingerprint in expired_list:
+                cls.cache.pop(fingerprint, None)
+        if expired_list:
+            logger.info(f"analyse cache invalidate {len(expired_list)} entries by {list(snapshot_list)}.")
+
+    @classmethod
+    def clear(cls):
+        with cls.lock:
+            cls.cache.clear()
+
+
+SnapshotVersion.add_listener(IndustryAnalyseCache.invalidate)
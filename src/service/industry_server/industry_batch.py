@@ -0,0 +1,59 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from .industry_analyse import IndustryAnalyser
+from .industry_input import IndustryInputLoader
+from ..config_server.config import config
+from ...utils import KahunaException
+
+# kahuna logger
+from ..log_server import logger
+
+# 批量报表中同时执行的计划组数量
+BATCH_POOL_SIZE = config.getint('INDUSTRY', 'BATCH_POOL_SIZE', fallback=4)
+
+
+class IndustryBatchAnalyser:
+    @classmethod
+    def get_work_tree_data(cls, user, plan_name_list: list = None, section_list: list = None) -> dict:
+        """
+        一次生成用户多个计划的报表，返回{plan_name: report}，顺序与plan_name_list一致，section_list同单个计划。
+        屏蔽仓库相同的计划共用一份输入数据，蓝图展开读取进程内共用的BPManager索引。
+        匹配器相同的计划在同一线程内依次执行，复用匹配器决策表和建筑分配结果。
+        匹配器不同的计划组在线程池中同时执行，只有读库和生成报表时的等待可以重叠，计算部分受GIL限制不会并行。
+        """
+        plan_name_list = plan_name_list if plan_name_list else list(user.user_data.plan.keys())
+        if not plan_name_list:
+            raise KahunaException("没有可执行的计划。")
+
+        input_dict = dict()  # {hide_container: IndustryInput}
+        group_dict = dict()  # {(bp_matcher, st_matcher, prod_block_matcher): [plan_name]}
+        for plan_name in plan_name_list:
+            if plan_name not in user.user_data.plan:
+                raise KahunaException(f"plan {plan_name} not exist")
+            plan_dict = user.user_data.plan[plan_name]
+            hide_container = frozenset(plan_dict["container_block"])
+            if hide_container not in input_dict:
+                input_dict[hide_container] = IndustryInputLoader.load(user.user_qq, hide_container)
+            matcher_key = (plan_dict["bp_matcher"], plan_dict["st_matcher"], plan_dict["prod_block_matcher"])
+            group_dict.setdefault(matcher_key, []).append(plan_name)
+
+        report_dict = dict()
+        with ThreadPoolExecutor(max_workers=min(BATCH_POOL_SIZE, len(group_dict))) as executor:
+            futures = [executor.submit(IndustryInputLoader.read, cls.run_plan_group,
+                                       user, group_plan_list, input_dict, section_list)
+                       for group_plan_list in group_dict.values()]
+            for future in futures:
+                report_dict.update(future.result())
+
+        logger.info(f"batch analyse {user.user_qq}: {len(plan_name_list)} plans, {len(group_dict)} groups, "
+                    f"{len(input_dict)} inputs.")
+        return {plan_name: report_dict[plan_name] for plan_name in plan_name_list}
+
+    @classmethod
+    def run_plan_group(cls, user, plan_name_list: list, input_dict: dict, section_list: list = None) -> dict:
+        res = dict()
+        for plan_name in plan_name_list:
+            analyser = IndustryAnalyser.get_analyser_by_plan(user, plan_name)
+            analyser.analyse_input = input_dict[frozenset(user.user_data.plan[plan_name]["container_block"])]
+            res[plan_name] = analyser.get_work_tree_data(section_list)
+        return res
@@ -0,0 +1,65 @@
+import os
+from concurrent.futures import as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+from .industry_process import IndustryProcessPool, get_process_state, run_process_task, is_worker_process
+from ..config_server.config import config
+
+# kahuna logger
+from ..log_server import logger
+
+# 分量并行计算的进程数，1为不并行
+ANALYSE_POOL_SIZE = config.getint('INDUSTRY', 'ANALYSE_POOL_SIZE', fallback=os.cpu_count() or 1)
+# 需要并行计算的节点总数下限，节点较少时向worker传输分析器的开销大于收益
+ANALYSE_PARALLEL_MIN_NODES = config.getint('INDUSTRY', 'ANALYSE_PARALLEL_MIN_NODES', fallback=200)
+
+# 进程池worker内的分析器，由init_component_worker设置
+worker_state = dict()
+
+
+def init_component_worker(analyser):
+    """
+    analyser为建立蓝图树、读取输入和计算root之后的分析器，worker收到一次计算的第一个任务时由run_process_task读取。
+    pickle时不带锁、报表结果和profiler。
+    """
+    worker_state['analyser'] = analyser
+
+
+def calculate_component(node_list: list) -> list:
+    analyser = worker_state['analyser']
+    analyser.calculate_node_list(node_list)
+    return [(node, analyser.get_node_result(node)) for node in node_list]
+
+
+class IndustryComponentPool:
+    @classmethod
+    def can_parallel(cls, component_list: list) -> bool:
+        # 成本计算的worker内不再创建进程池
+        return (ANALYSE_POOL_SIZE > 1 and len(component_list) > 1 and not is_worker_process() and
+                sum(len(component) for component in component_list) >= ANALYSE_PARALLEL_MIN_NODES)
+
+    @classmethod
+    def calculate_component_list(cls, analyser, component_list: list):
+        """
+        component_list: [[node]]，每个分量内的节点按拓扑序排列。
+        每个分量在worker内完整计算后把结果写回分析器，进程池失败时在当前进程计算剩余分量。
+        """
+        remain_dict = {index: node_list for index, node_list in enumerate(component_list)}
+        futures = dict()
+        try:
+            executor = IndustryProcessPool.get_executor('component', ANALYSE_POOL_SIZE)
+            state = get_process_state(init_component_worker, analyser)
+            # 大分量先提交
+            futures = {executor.submit(run_process_task, state, calculate_component, node_list): index
+                       for index, node_list in sorted(remain_dict.items(), key=lambda x: len(x[1]), reverse=True)}
+            for future in as_completed(futures):
+                for node, result in future.result():
+                    analyser.set_node_result(node, result)
+                remain_dict.pop(futures[future])
+        except (BrokenProcessPool, OSError) as e:
+            logger.error(f"analyse component pool failed, calculate {len(remain_dict)} components in process. {e}")
+            IndustryProcessPool.discard_executor('component')
+            for future in futures:
+                future.cancel()
+            for node_list in remain_dict.values():
+                analyser.calculate_node_list(node_list)
@@ -242,6 +242,11 @@ class IndustryConfigManager(metaclass=PluginMeta):
 
     @classmethod
     def allocate_structure(cls, source_id: int, st_matcher: Matcher) -> int | None:
+        """ 分配结果保存在匹配器的决策表中，同一匹配器对同一类型只完整匹配一次 """
+        return st_matcher.match(source_id, cls.match_structure)
+
+    @classmethod
+    def match_structure(cls, source_id: int, st_matcher: Matcher) -> int | None:
         """
         input: source_id, matcher
         根据source_id的物品属性，按照"bp", "market_group", "group", "meta", "category"的顺序从matcher_data中匹配
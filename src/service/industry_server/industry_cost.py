@@ -0,0 +1,140 @@
+from collections import deque
+import numpy as np
+from scipy import sparse
+from scipy.sparse.linalg import splu
+
+from .blueprint import BPManager
+from .structure import StructureManager
+from .industry_config import IndustryConfigManager
+from .industry_utils import IdsUtils as IdsU
+from ..market_server.market_manager import MarketManager
+from ..sde_service.utils import SdeUtils
+from ..log_server import logger
+
+
+class IndustryCostEngine:
+    """
+    "cost"计算模式，输出长期情况下的最小成本：不按蓝图流程取整，不考虑库存、运行中的工作和蓝图资产。
+
+    对产品涉及的所有类型建立稀疏物料矩阵A，A[p, m]为生产1个p需要消耗的m，
+    材料效率 = 建筑 * 建筑插件 * 默认蓝图效率，建筑由计划的建筑匹配器分配。
+    总需求X满足 X = E + A^T X，分解一次(I - A^T)即可同时解出所有产品的单位需求，
+    再分别与材料价格向量和系数成本向量点乘得到成本。
+    同一批次的产品共用一个矩阵，共享的组件子树(T2组件、高级卫星材料、燃料块)只展开和分解一次，
+    subtree_hit为再次遇到已展开组件的次数，subtree_miss为展开的可制造类型数。
+    """
+    def __init__(self, analyser):
+        self.analyser = analyser
+        self.market = MarketManager.get_market_by_type('jita')
+
+        self.type_list = []
+        self.type_index = dict()
+        self.is_material = None
+        self.lu = None
+        self.subtree_hit = 0
+        self.subtree_miss = 0
+
+    def is_manufacturable(self, type_id: int) -> bool:
+        return bool(BPManager.get_bp_materials(type_id)) and not self.analyser.in_pd_block(type_id)
+
+    def get_mater_eff(self, type_id: int) -> float:
+        structure_id = IndustryConfigManager.allocate_structure(type_id, self.analyser.st_matcher)
+        structure = StructureManager.get_structure(structure_id)
+        st_mater_eff, _ = IndustryConfigManager.get_structure_mater_time_eff(structure.type_id)
+        st_mater_rig_eff, _ = IndustryConfigManager.get_structure_rig_mater_time_eff(structure)
+        default_bp_mater_eff, _ = IndustryConfigManager.get_default_bp_mater_time_eff(type_id)
+        return st_mater_eff * st_mater_rig_eff * default_bp_mater_eff
+
+    def build_bom_matrix(self, product_id_list: list):
+        """ 广度优先收集产品涉及的所有类型，建立物料矩阵并完成LU分解 """
+        self.type_list = []
+        self.type_index = dict()
+        manu_set = set()
+        bfs_queue = deque(product_id_list)
+        while bfs_queue:
+            type_id = bfs_queue.popleft()
+            if type_id in self.type_index:
+                if type_id in manu_set:
+                    self.subtree_hit += 1
+                continue
+            self.type_index[type_id] = len(self.type_list)
+            self.type_list.append(type_id)
+            if self.is_manufacturable(type_id):
+                self.subtree_miss += 1
+                manu_set.add(type_id)
+                bfs_queue.extend(BPManager.get_bp_materials(type_id).keys())
+
+        rows, cols, values = [], [], []
+        self.is_material = np.ones(len(self.type_list), dtype=bool)
+        for type_id in self.type_list:
+            if type_id not in manu_set:
+                continue
+            father_index = self.type_index[type_id]
+            self.is_material[father_index] = False
+            mater_eff = self.get_mater_eff(type_id)
+            product_quantity = BPManager.get_bp_product_quantity_typeid(type_id)
+            for child_id, quantity in BPManager.get_bp_materials(type_id).items():
+                # 如果需求为1，不吃材料加成
+                rows.append(father_index)
+                cols.append(self.type_index[child_id])
+                values.append(quantity * (1 if quantity == 1 else mater_eff) / product_quantity)
+
+        size = len(self.type_list)
+        bom_matrix = sparse.csr_matrix((values, (rows, cols)), shape=(size, size))
+        self.lu = splu((sparse.identity(size, format='csc') - bom_matrix.T).tocsc())
+        logger.info(f"cost engine bom matrix: {size} types, {bom_matrix.nnz} entries.")
+
+    def get_price_vector(self) -> np.ndarray:
+        """ 原材料按吉他收单价计算，可制造类型为0 """
+        return np.array([self.market.get_type_order_rouge(type_id)[0] if self.is_material[index] else 0
+                         for index, type_id in enumerate(self.type_list)], dtype=float)
+
+    def get_eiv_vector(self) -> np.ndarray:
+        """ 每生产1个可制造类型需要支付的系数成本，原材料为0 """
+        return np.array([0 if self.is_material[index] else
+                         IdsU.get_eiv_cost(type_id, 1, self.analyser.owner_qq, self.analyser.st_matcher)
+                         for index, type_id in enumerate(self.type_list)], dtype=float)
+
+    def solve_unit_need(self, product_id_list: list) -> np.ndarray:
+        """
+        返回[类型数, 产品数]的矩阵，第j列为生产1个product_id_list[j]需要的所有类型数量（含中间产物）。
+        """
+        target = np.zeros((len(self.type_list), len(product_id_list)))
+        for col, type_id in enumerate(product_id_list):
+            target[self.type_index[type_id], col] = 1
+        return self.lu.solve(target)
+
+    def get_cost_data(self, plan_list: list) -> dict:
+        """ 与IndustryAnalyser.get_cost_data相同的输出: {产品名: [材料成本, 系数成本, 总成本]} """
+        plan_list = [plan for plan in plan_list
+                     if (type_id := SdeUtils.get_id_by_name(plan[0])) and BPManager.get_bp_id_by_prod_typeid(type_id)]
+        product_id_list = [SdeUtils.get_id_by_name(plan[0]) for plan in plan_list]
+        if not product_id_list:
+            return dict()
+        self.build_bom_matrix(product_id_list)
+        unit_need = self.solve_unit_need(product_id_list)
+        material_cost = self.get_price_vector() @ unit_need
+        eiv_cost = self.get_eiv_vector() @ unit_need
+
+        cost_dict = dict()
+        for col, plan in enumerate(plan_list):
+            quantity = plan[1]
+            cost_dict[plan[0]] = [float(material_cost[col]) * quantity,
+                                  float(eiv_cost[col]) * quantity,
+                                  float(material_cost[col] + eiv_cost[col]) * quantity]
+        logger.info(f"cost engine batch: {len(plan_list)} products, "
+                    f"subtree hit {self.subtree_hit}, subtree miss {self.subtree_miss}.")
+        return cost_dict
+
+    def get_cost_detail(self, product: str) -> tuple[dict, float]:
+        """ 返回({原材料type_id: 成本}, 系数成本)，数量为1个产品 """
+        product_id = SdeUtils.get_id_by_name(product)
+        self.build_bom_matrix([product_id])
+        unit_need = self.solve_unit_need([product_id])[:, 0]
+        price_vector = self.get_price_vector()
+        eiv_cost = float(self.get_eiv_vector() @ unit_need)
+
+        material_cost_dict = {type_id: float(unit_need[index] * price_vector[index])
+                              for index, type_id in enumerate(self.type_list)
+                              if self.is_material[index] and unit_need[index] > 0}
+        return material_cost_dict, eiv_cost
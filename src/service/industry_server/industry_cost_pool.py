@@ -0,0 +1,129 @@
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+from tqdm import tqdm
+
+from .blueprint import BPManager
+from .industry_analyse import IndustryAnalyser
+from .industry_config import IndustryConfigManager
+from .industry_input import IndustryInputLoader, IndustryInput
+from .industry_process import IndustryProcessPool, get_process_state, run_process_task
+from ..config_server.config import config
+from ..sde_service.utils import SdeUtils
+from ..market_server.market_manager import MarketManager
+from ...utils import chunks
+
+# kahuna logger
+from ..log_server import logger
+
+# process: 多进程计算，thread: 线程池计算
+COST_POOL_TYPE = config.get('INDUSTRY', 'COST_POOL_TYPE', fallback='process')
+COST_POOL_SIZE = config.getint('INDUSTRY', 'COST_POOL_SIZE', fallback=4)
+COST_CHUNK_SIZE = config.getint('INDUSTRY', 'COST_CHUNK_SIZE', fallback=8)
+COST_THREAD_SIZE = 20
+
+# 进程池worker内的共享数据，由init_cost_worker设置
+worker_state = dict()
+
+
+class PriceSnapshot:
+    """ 计算开始前读取的市场价格快照，worker内替代分析器的市场查询 """
+    def __init__(self, market, price_dict: dict):
+        self.market = market
+        self.price_dict = price_dict
+
+    def get_type_order_rouge(self, type_id: int):
+        if type_id not in self.price_dict:
+            self.price_dict[type_id] = self.market.get_type_order_rouge(type_id)
+        return self.price_dict[type_id]
+
+
+def init_cost_worker(user, plan_name: str, price_snapshot: PriceSnapshot, analyse_input: IndustryInput):
+    """
+    worker收到一次计算的第一个任务时由run_process_task调用，读取计划使用的匹配器。
+    蓝图索引在worker第一次查询时建立，之后的计算复用。
+    """
+    plan_dict = user.user_data.plan[plan_name]
+    for matcher_key in ["bp_matcher", "st_matcher", "prod_block_matcher"]:
+        IndustryConfigManager.get_matcher_of_user_by_name(plan_dict[matcher_key], user.user_qq)
+
+    worker_state['user'] = user
+    worker_state['plan_name'] = plan_name
+    worker_state['market'] = price_snapshot
+    worker_state['analyse_input'] = analyse_input
+
+
+def get_cost_chunk(plan_chunk: list) -> list:
+    return [IndustryAnalyser.signal_async_progress_work_type(
+                worker_state['user'], worker_state['plan_name'], [plan], worker_state['market'],
+                worker_state['analyse_input'])
+            for plan in plan_chunk]
+
+
+class IndustryCostPool:
+    @classmethod
+    def get_price_snapshot(cls, plan_list: list) -> PriceSnapshot:
+        """ 读取计划所有产品可能用到的类型价格 """
+        market = MarketManager.get_market_by_type('jita')
+        type_set = set()
+        bfs_queue = deque(SdeUtils.get_id_by_name(plan[0]) for plan in plan_list)
+        while bfs_queue:
+            type_id = bfs_queue.popleft()
+            if type_id is None or type_id in type_set:
+                continue
+            type_set.add(type_id)
+            bfs_queue.extend(BPManager.get_bp_materials(type_id).keys())
+
+        return PriceSnapshot(market, {type_id: market.get_type_order_rouge(type_id) for type_id in type_set})
+
+    @classmethod
+    def get_cost_data(cls, user, plan_name: str, plan_list: list) -> dict:
+        """
+        按配置选择进程池或线程池计算，进程池不可用时退回线程池。
+        输入数据只读取一次，所有产品的分析器共用。
+        """
+        analyse_input = IndustryInputLoader.load(user.user_qq, user.user_data.plan[plan_name]["container_block"])
+        if COST_POOL_TYPE == 'process':
+            try:
+                return cls.get_cost_data_by_process(user, plan_name, plan_list, analyse_input)
+            except (BrokenProcessPool, OSError) as e:
+                logger.error(f"cost process pool failed, fallback to thread pool. {e}")
+                IndustryProcessPool.discard_executor('cost')
+        return cls.get_cost_data_by_thread(user, plan_name, plan_list, analyse_input)
+
+    @classmethod
+    def get_cost_data_by_process(cls, user, plan_name: str, plan_list: list, analyse_input: IndustryInput) -> dict:
+        price_snapshot = cls.get_price_snapshot(plan_list)
+        plan_chunk_list = list(chunks(plan_list, COST_CHUNK_SIZE))
+        result_dict = dict()
+        executor = IndustryProcessPool.get_executor('cost', COST_POOL_SIZE)
+        state = get_process_state(init_cost_worker, user, plan_name, price_snapshot, analyse_input)
+        futures = {executor.submit(run_process_task, state, get_cost_chunk, plan_chunk): len(plan_chunk)
+                   for plan_chunk in plan_chunk_list}
+        try:
+            with tqdm(total=len(plan_list), desc="成本计算", unit="个") as pbar:
+                for future in as_completed(futures):
+                    for result in future.result():
+                        result_dict[result[0]] = result[1:]
+                    pbar.update(futures[future])
+        finally:
+            for future in futures:
+                future.cancel()
+
+        # 保持与计划顺序一致
+        return {plan[0]: result_dict[plan[0]] for plan in plan_list if plan[0] in result_dict}
+
+    @classmethod
+    def get_cost_data_by_thread(cls, user, plan_name: str, plan_list: list, analyse_input: IndustryInput) -> dict:
+        with ThreadPoolExecutor(max_workers=COST_THREAD_SIZE) as executor:
+            futures = [executor.submit(IndustryAnalyser.signal_async_progress_work_type, user, plan_name, [plan],
+                                       None, analyse_input)
+                       for plan in plan_list]
+            cost_dict = dict()
+            with tqdm(total=len(futures), desc="成本计算", unit="个") as pbar:
+                for future in futures:
+                    result = future.result()
+                    cost_dict[result[0]] = result[1:]
+                    pbar.update()
+
+        return cost_dict
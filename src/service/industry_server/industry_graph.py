@@ -0,0 +1,248 @@
+from array import array
+from collections import deque
+
+from ...utils import KahunaException
+
+
+class EdgeData:
+    """
+    单条边的属性视图，读写直接落到图的属性列上，不为每条边单独保存dict。
+    """
+    __slots__ = ('graph', 'eid')
+
+    def __init__(self, graph, eid: int):
+        self.graph = graph
+        self.eid = eid
+
+    def __getitem__(self, key):
+        value = self.graph.edge_columns[key][self.eid]
+        if value is None:
+            raise KeyError(key)
+        return value
+
+    def __setitem__(self, key, value):
+        self.graph.edge_columns[key][self.eid] = value
+
+    def __contains__(self, key):
+        return key in self.graph.edge_columns and self.graph.edge_columns[key][self.eid] is not None
+
+    def __iter__(self):
+        return (key for key in self.graph.edge_fields if key in self)
+
+    def keys(self):
+        return list(self)
+
+    def get(self, key, default=None):
+        return self[key] if key in self else default
+
+    def items(self):
+        return [(key, self[key]) for key in self]
+
+    def to_dict(self) -> dict:
+        return dict(self)
+
+    def __repr__(self):
+        return repr(self.to_dict())
+
+
+class NodeView:
+    """ 兼容networkx的graph.nodes用法: 迭代、in、graph.nodes[node]、graph.nodes(data=True) """
+    __slots__ = ('graph',)
+
+    def __init__(self, graph):
+        self.graph = graph
+
+    def __iter__(self):
+        return iter(self.graph.node_list)
+
+    def __len__(self):
+        return len(self.graph.node_list)
+
+    def __contains__(self, node):
+        return node in self.graph.node_index
+
+    def __getitem__(self, node):
+        return self.graph.node_data[self.graph.node_index[node]]
+
+    def __call__(self, data: bool = False):
+        if data:
+            return list(zip(self.graph.node_list, self.graph.node_data))
+        return list(self.graph.node_list)
+
+
+class IndustryGraph:
+    """
+    整数索引的有向多重图，替代IndustryAnalyser中的nx.MultiDiGraph。
+    节点映射为连续整数，邻接表按邻居分组只保存边序号，边的端点和属性按列存储，
+    edge_fields声明该图的边属性。
+    只实现分析器用到的networkx接口，迭代顺序与networkx一致（按插入顺序）。
+    """
+    __slots__ = ('edge_fields', 'node_list', 'node_index', 'node_data',
+                 'out_adj', 'in_adj', 'edge_src', 'edge_dst', 'edge_columns')
+
+    def __init__(self, edge_fields: tuple = ()):
+        self.edge_fields = tuple(edge_fields)
+        self.node_list = []
+        self.node_index = dict()
+        self.node_data = []
+        self.out_adj = []
+        self.in_adj = []
+        self.edge_src = array('l')
+        self.edge_dst = array('l')
+        self.edge_columns = {field: [] for field in self.edge_fields}
+
+    """ 节点 """
+    @property
+    def nodes(self):
+        return NodeView(self)
+
+    def get_node_id(self, node) -> int:
+        if node in self.node_index:
+            return self.node_index[node]
+        node_id = len(self.node_list)
+        self.node_index[node] = node_id
+        self.node_list.append(node)
+        self.node_data.append(dict())
+        self.out_adj.append(dict())
+        self.in_adj.append(dict())
+        return node_id
+
+    def add_node(self, node, **attr):
+        node_id = self.get_node_id(node)
+        if attr:
+            self.node_data[node_id].update(attr)
+
+    def add_nodes_from(self, nodes):
+        for node in nodes:
+            self.get_node_id(node)
+
+    def number_of_nodes(self) -> int:
+        return len(self.node_list)
+
+    """ 边 """
+    def add_edge(self, u, v, **attr):
+        src = self.get_node_id(u)
+        dst = self.get_node_id(v)
+        eid = len(self.edge_src)
+        self.edge_src.append(src)
+        self.edge_dst.append(dst)
+        for field, column in self.edge_columns.items():
+            column.append(attr.pop(field, None))
+        if attr:
+            raise KahunaException(f"unknown edge field: {list(attr.keys())}")
+        self.out_adj[src].setdefault(dst, []).append(eid)
+        self.in_adj[dst].setdefault(src, []).append(eid)
+
+    def add_edges_from(self, edges):
+        for edge in edges:
+            if len(edge) == 3:
+                self.add_edge(edge[0], edge[1], **edge[2])
+            else:
+                self.add_edge(edge[0], edge[1])
+
+    def number_of_edges(self) -> int:
+        return len(self.edge_src)
+
+    def edges(self, data: bool = False):
+        return [edge for node in self.node_list for edge in self.out_edges(node, data)]
+
+    def out_edges(self, node, data: bool = False):
+        # 与networkx一致，同一邻居的边排在一起，邻居按首次连接的顺序
+        node_list = self.node_list
+        adj = self.out_adj[self.node_index[node]]
+        if data:
+            return [(node, node_list[dst], EdgeData(self, eid)) for dst, eid_list in adj.items() for eid in eid_list]
+        return [(node, node_list[dst]) for dst, eid_list in adj.items() for _ in eid_list]
+
+    def in_edges(self, node, data: bool = False):
+        node_list = self.node_list
+        adj = self.in_adj[self.node_index[node]]
+        if data:
+            return [(node_list[src], node, EdgeData(self, eid)) for src, eid_list in adj.items() for eid in eid_list]
+        return [(node_list[src], node) for src, eid_list in adj.items() for _ in eid_list]
+
+    def has_edge(self, u, v) -> bool:
+        if u not in self.node_index or v not in self.node_index:
+            return False
+        return self.node_index[v] in self.out_adj[self.node_index[u]]
+
+    def successors(self, node):
+        return iter([self.node_list[dst] for dst in self.out_adj[self.node_index[node]]])
+
+    def predecessors(self, node):
+        return iter([self.node_list[src] for src in self.in_adj[self.node_index[node]]])
+
+    def out_degree(self, node=None):
+        if node is not None:
+            return sum(len(eid_list) for eid_list in self.out_adj[self.node_index[node]].values())
+        return [(self.node_list[node_id], sum(len(eid_list) for eid_list in adj.values()))
+                for node_id, adj in enumerate(self.out_adj)]
+
+    def in_degree(self, node=None):
+        if node is not None:
+            return sum(len(eid_list) for eid_list in self.in_adj[self.node_index[node]].values())
+        return [(self.node_list[node_id], sum(len(eid_list) for eid_list in adj.values()))
+                for node_id, adj in enumerate(self.in_adj)]
+
+    """ 算法 """
+    def topological_sort(self) -> list:
+        indegree = [len(adj) for adj in self.in_adj]
+        queue = deque(node_id for node_id, degree in enumerate(indegree) if degree == 0)
+        order = []
+        while queue:
+            node_id = queue.popleft()
+            order.append(node_id)
+            for dst in self.out_adj[node_id]:
+                indegree[dst] -= 1
+                if indegree[dst] == 0:
+                    queue.append(dst)
+        if len(order) != len(self.node_list):
+            raise KahunaException('蓝图树存在循环依赖。')
+        return [self.node_list[node_id] for node_id in order]
+
+    def weakly_connected_components(self, ignore: set = frozenset()) -> list:
+        """
+        忽略ignore中的节点及其所有边后的弱连通分量，返回[set]。
+        分量按其中最早插入的节点排序。
+        """
+        ignore_id = {self.node_index[node] for node in ignore if node in self.node_index}
+        visited = set(ignore_id)
+        res = []
+        for node_id in range(len(self.node_list)):
+            if node_id in visited:
+                continue
+            visited.add(node_id)
+            component = [node_id]
+            queue = deque([node_id])
+            while queue:
+                current = queue.popleft()
+                for neighbor in list(self.out_adj[current]) + list(self.in_adj[current]):
+                    if neighbor not in visited:
+                        visited.add(neighbor)
+                        component.append(neighbor)
+                        queue.append(neighbor)
+            res.append({self.node_list[member] for member in component})
+        return res
+
+    def clear(self):
+        self.node_list.clear()
+        self.node_index.clear()
+        self.node_data.clear()
+        self.out_adj.clear()
+        self.in_adj.clear()
+        self.edge_src = array('l')
+        self.edge_dst = array('l')
+        for column in self.edge_columns.values():
+            column.clear()
+
+    def copy(self):
+        res = IndustryGraph(self.edge_fields)
+        res.node_list = list(self.node_list)
+        res.node_index = dict(self.node_index)
+        res.node_data = [dict(data) for data in self.node_data]
+        res.out_adj = [{k: list(v) for k, v in adj.items()} for adj in self.out_adj]
+        res.in_adj = [{k: list(v) for k, v in adj.items()} for adj in self.in_adj]
+        res.edge_src = array('l', self.edge_src)
+        res.edge_dst = array('l', self.edge_dst)
+        res.edge_columns = {field: list(column) for field, column in self.edge_columns.items()}
+        return res
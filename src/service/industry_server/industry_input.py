@@ -0,0 +1,141 @@
+from types import MappingProxyType
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+
+from .running_job import RunningJobOwner
+from ..asset_server.asset_container import AssetContainer
+from ..asset_server.asset_manager import AssetManager
+from ..character_server.character_manager import CharacterManager
+from ..database_server.model import BlueprintAssetCache
+from ..database_server.connect import db
+from ..database_server.snapshot_version import SnapshotVersion, ASSET_SNAPSHOT, JOB_SNAPSHOT, BP_ASSET_SNAPSHOT
+from ..sde_service.database import db as sde_db
+from ..sde_service.utils import SdeUtils
+from ..user_server.user_manager import UserManager
+from ...utils import KahunaException
+
+# kahuna logger
+from ..log_server import logger
+
+# 运行中的工作、仓库资产、蓝图资产三个读取任务
+INPUT_POOL_SIZE = 3
+INPUT_SNAPSHOT_LIST = [ASSET_SNAPSHOT, JOB_SNAPSHOT, BP_ASSET_SNAPSHOT]
+# 蓝图资产行，字段与BlueprintAssetCache相同。peewee的namedtuple类型不能pickle，在模块中定义，输入可以传给进程池worker
+BpAssetRow = namedtuple('BpAssetRow', [field.name for field in BlueprintAssetCache._meta.sorted_fields])
+
+
+class IndustryInput:
+    """
+    分析器的输入数据，建立后不再修改，同一命令内的多个分析器可以共用。
+    running_job: {product_type_id: runs}，只包含产出到目标仓库的工作
+    asset_dict: {type_id: quantity}，目标仓库内的资产
+    bp_asset_list: bp/manu仓库内的蓝图，BpAssetRow
+    bp_container_structure: {bp仓库location_id: structure_id}
+    """
+    __slots__ = ('owner_qq', 'hide_container', 'version', 'target_container', 'running_job', 'using_bp',
+                 'asset_dict', 'bp_asset_list', 'bp_container_structure')
+
+    def __init__(self, owner_qq: int, hide_container: frozenset, version: tuple, target_container: frozenset,
+                 running_job: dict, using_bp: frozenset, asset_dict: dict,
+                 bp_asset_list: tuple, bp_container_structure: dict):
+        self.owner_qq = owner_qq
+        self.hide_container = hide_container
+        self.version = version
+        self.target_container = target_container
+        self.running_job = MappingProxyType(running_job)
+        self.using_bp = using_bp
+        self.asset_dict = MappingProxyType(asset_dict)
+        self.bp_asset_list = bp_asset_list
+        self.bp_container_structure = MappingProxyType(bp_container_structure)
+
+    def __reduce__(self):
+        # MappingProxyType不能pickle，传给进程池worker时按构造参数重建
+        return (IndustryInput, (self.owner_qq, self.hide_container, self.version, self.target_container,
+                                dict(self.running_job), self.using_bp, dict(self.asset_dict),
+                                self.bp_asset_list, dict(self.bp_container_structure)))
+
+    def match(self, owner_qq: int, hide_container) -> bool:
+        """ 同一用户、相同的隐藏仓库，且读取后依赖的快照没有刷新 """
+        return (self.owner_qq == owner_qq and self.hide_container == frozenset(hide_container) and
+                self.version == SnapshotVersion.get_version(INPUT_SNAPSHOT_LIST))
+
+
+class IndustryInputLoader:
+    @classmethod
+    def load(cls, owner_qq: int, hide_container, inline: bool = False) -> IndustryInput:
+        """
+        目标仓库在内存中直接计算，其余输入互不依赖，在线程池中并发读取。
+        蓝图资产不再等待蓝图树建立，读取仓库内的全部蓝图，由get_bp_inventory按类型筛选。
+        inline为True时在当前线程依次读取，用于性能分析，sql计数只统计分析所在的线程。
+        """
+        hide_container = frozenset(hide_container)
+        version = SnapshotVersion.get_version(INPUT_SNAPSHOT_LIST)
+        target_container = frozenset(container.asset_location_id for container in AssetManager.get_user_container(owner_qq)
+                                     if (container.tag in {"manu", "reac"} and
+                                         container.asset_location_id not in hide_container))
+        if not target_container:
+            raise KahunaException("target_structure must be set.")
+
+        if inline:
+            running_job, using_bp = cls.load_running_job(owner_qq, target_container)
+            asset_dict = cls.load_asset(target_container)
+            bp_asset_list, bp_container_structure = cls.load_bp_asset(owner_qq)
+        else:
+            with ThreadPoolExecutor(max_workers=INPUT_POOL_SIZE) as executor:
+                running_job_future = executor.submit(cls.read, cls.load_running_job, owner_qq, target_container)
+                asset_future = executor.submit(cls.read, cls.load_asset, target_container)
+                bp_asset_future = executor.submit(cls.read, cls.load_bp_asset, owner_qq)
+                running_job, using_bp = running_job_future.result()
+                asset_dict = asset_future.result()
+                bp_asset_list, bp_container_structure = bp_asset_future.result()
+
+        logger.debug(f"industry input {owner_qq}: {len(running_job)} running job types, "
+                     f"{len(asset_dict)} asset types, {len(bp_asset_list)} blueprints.")
+        return IndustryInput(owner_qq, hide_container, version, target_container, running_job, using_bp,
+                             asset_dict, bp_asset_list, bp_container_structure)
+
+    @classmethod
+    def read(cls, func, *args):
+        """ 线程池内执行读取，peewee按线程建立连接，完成后关闭本线程的连接 """
+        try:
+            return func(*args)
+        finally:
+            for database in [db, sde_db]:
+                if not database.is_closed():
+                    database.close()
+
+    @classmethod
+    def load_running_job(cls, owner_qq: int, target_container: frozenset) -> tuple[dict, frozenset]:
+        user = UserManager.get_user(owner_qq)
+        user_character = [c.character_id for c in CharacterManager.get_user_all_characters(user.user_qq)]
+        alias_character = [cid for cid in user.user_data.alias.keys()]
+
+        running_job = dict()
+        for job in RunningJobOwner.get_job_with_starter(user_character + alias_character):
+            if job.output_location_id in target_container:
+                if job.product_type_id not in running_job:
+                    running_job[job.product_type_id] = 0
+                running_job[job.product_type_id] += job.runs
+        return running_job, RunningJobOwner.get_using_bp_set()
+
+    @classmethod
+    def load_asset(cls, target_container: frozenset) -> dict:
+        asset_dict = dict()
+        for asset in AssetManager.get_asset_in_container_list(list(target_container)):
+            if asset.type_id not in asset_dict:
+                asset_dict[asset.type_id] = 0
+            asset_dict[asset.type_id] += asset.quantity
+        return asset_dict
+
+    @classmethod
+    def load_bp_asset(cls, owner_qq: int) -> tuple[tuple, dict]:
+        # owner_qq可用的蓝图仓库，即container_tag为bp和manu的仓库
+        bp_container_list = (AssetContainer.get_location_id_by_qq_tag(owner_qq, "bp") +
+                             AssetContainer.get_location_id_by_qq_tag(owner_qq, "manu"))
+        if not bp_container_list:
+            return tuple(), dict()
+        bp_container_structure = {container: SdeUtils.get_structure_id_from_location_id(container)[0]
+                                  for container in bp_container_list}
+        bp_asset_list = tuple(BpAssetRow(*row) for row in BlueprintAssetCache.select()
+                              .where(BlueprintAssetCache.location_id << bp_container_list).tuples())
+        return bp_asset_list, bp_container_structure
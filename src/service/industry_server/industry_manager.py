@@ -4,6 +4,7 @@ from .running_job import RunningJobOwner
 from .system_cost import SystemCost
 from .market_price import MarketPrice
 from ..character_server.character_manager import CharacterManager
+from ..evesso_server.esi_etag import EsiEtagBatch
 from ..database_server.model import (SystemCost as M_SystemCost, SystemCostCache as M_SystemCostCache)
 from ..database_server.connect import db
 from ...utils import KahunaException
@@ -15,8 +16,8 @@ from ..log_server import logger
 
 class IndustryManager:
     @classmethod
-    def refresh_running_status(cls):
-        logger.info("refresh running status.")
+    def get_running_job_owner(cls) -> tuple[list, list]:
+        """ (需要刷新的角色列表, [(corp_id, 有总监权限的角色)]) """
         character_list = [character for character in CharacterManager.character_dict.values()]
 
         corp_list_id_list = []
@@ -25,40 +26,77 @@ class IndustryManager:
             if character.director and character.corp_id not in exist_corp_set:
                 corp_list_id_list.append((character.corp_id, character))
                 exist_corp_set.add(character.corp_id)
+        return character_list, corp_list_id_list
+
+    @classmethod
+    def refresh_running_status(cls):
+        logger.info("refresh running status.")
+        character_list, corp_list_id_list = cls.get_running_job_owner()
 
+        # 新ETag在copy_to_cache完成后才保存，复制失败时下次刷新重新请求并复制
+        etag_batch = EsiEtagBatch()
+        changed = False
         for character in character_list:
-            RunningJobOwner.refresh_character_running_job(character)
+            changed = RunningJobOwner.refresh_character_running_job(character, etag_batch) or changed
         for corp_id, character in corp_list_id_list:
-            RunningJobOwner.refresh_corp_running_job(corp_id, character)
+            changed = RunningJobOwner.refresh_corp_running_job(corp_id, character, etag_batch) or changed
+
+        # 所有工作都没有变化时，industry_jobs_cache和快照不需要重建
+        if changed:
+            RunningJobOwner.copy_to_cache()
+        etag_batch.commit()
+        logger.info("refresh running status complete.")
 
-        RunningJobOwner.copy_to_cache()
+    @classmethod
+    async def refresh_running_status_async(cls):
+        """
+        refresh_running_status的异步版本，所有角色和公司在事件循环上并发请求。
+        一个角色或公司出错时只记录日志，其他已经写入的工作照常复制到cache。
+        """
+        logger.info("refresh running status.")
+        character_list, corp_list_id_list = cls.get_running_job_owner()
+
+        etag_batch = EsiEtagBatch()
+        owner_list = ([f"character {character.character_id}" for character in character_list] +
+                      [f"corp {corp_id}" for corp_id, _ in corp_list_id_list])
+        changed_list = await asyncio.gather(
+            *[RunningJobOwner.refresh_character_running_job_async(character, etag_batch)
+              for character in character_list],
+            *[RunningJobOwner.refresh_corp_running_job_async(corp_id, character, etag_batch)
+              for corp_id, character in corp_list_id_list],
+            return_exceptions=True)
+        for owner, changed in zip(owner_list, changed_list):
+            if isinstance(changed, BaseException):
+                logger.error(f"refresh running job error: {owner} {changed!r}")
+        if any(changed is True for changed in changed_list):
+            await asyncio.to_thread(RunningJobOwner.copy_to_cache)
+        await asyncio.to_thread(etag_batch.commit)
         logger.info("refresh running status complete.")
 
     @classmethod
     def refresh_system_cost(cls):
         SystemCost.refresh_system_cost()
 
+    @classmethod
+    async def refresh_system_cost_async(cls):
+        await SystemCost.refresh_system_cost_async()
+
     @classmethod
     def refresh_market_price(cls):
         MarketPrice.refresh_market_price()
 
+    @classmethod
+    async def refresh_market_price_async(cls):
+        await MarketPrice.refresh_market_price_async()
+
     # 调起工业分析
     @classmethod
     def create_plan_analyser(cls, user, plan_name: str):
         if plan_name not in user.user_data.plan:
             raise KahunaException("plan not found.")
-        if plan_name in IndustryAnalyser.analyser_cache:
-            return IndustryAnalyser.analyser_cache[plan_name]
-        analyser = IndustryAnalyser(user.user_qq, "work")
-        # 配置匹配器
-        bp_matcher = IndustryConfigManager.get_matcher_of_user_by_name(user.user_data.plan[plan_name]["bp_matcher"], user.user_qq)
-        st_matcher = IndustryConfigManager.get_matcher_of_user_by_name(user.user_data.plan[plan_name]["st_matcher"], user.user_qq)
-        prod_block_matcher = IndustryConfigManager.get_matcher_of_user_by_name(user.user_data.plan[plan_name]["prod_block_matcher"], user.user_qq)
-        analyser.set_matchers(bp_matcher, st_matcher, prod_block_matcher)
-        # 导入计划表
-        plan = user.user_data.plan[plan_name]["plan"]
-        work_list = [[product, quantity] for product, quantity in plan.items()]
-        analyser.analyse_progress_work_type(work_list)
-
-        IndustryAnalyser.analyser_cache[plan_name] = analyser
+        # 按指纹复用分析器，指纹包含用户，不同用户的同名计划不会冲突
+        analyser = IndustryAnalyser.get_analyser_by_plan(user, plan_name)
+        with analyser.report_lock:
+            analyser.analyse_plan()
+        return analyser
 
@@ -0,0 +1,725 @@
+import os
+import json
+import random
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+from ..config_server.config import config
+from ...utils import chunks, KahunaException
+
+# kahuna logger
+from ..log_server import logger
+
+BENCH_SEED = 20240101
+BENCH_SIZE_LIST = [1, 50, 500]
+BENCH_OP_LIST = ['analyse_progress_work_type', 'get_work_tree_data',
+                 'get_cost_data_work', 'get_cost_data_cost',
+                 'get_cost_detail_work', 'get_cost_detail_cost']
+
+BENCH_USER_QQ = 10001
+BENCH_CHARACTER_ID = 2112000001
+BENCH_CORP_ID = 98000001
+BENCH_SOLAR_SYSTEM_ID = 30000001
+BENCH_SOTIYO_ID = 1035000000001
+BENCH_TATARA_ID = 1035000000002
+BENCH_MANU_CONTAINER = 1045000000001
+BENCH_REAC_CONTAINER = 1045000000002
+BENCH_BP_MANU_CONTAINER = 1045000000003
+BENCH_BP_REAC_CONTAINER = 1045000000004
+BENCH_BP_MATCHER = 'bench_bp'
+BENCH_ST_MATCHER = 'bench_st'
+BENCH_BLOCK_MATCHER = 'bench_block'
+STATION_CONTAINER_TYPE_ID = 17366
+JITA_LOCATION_ID = 60003760
+JITA_SYSTEM_ID = 30000142
+
+MANU_ACTION_ID = 1
+REAC_ACTION_ID = 11
+
+# ========== SDE fixture ==========
+CATEGORY_LIST = ['Material', 'Planetary Commodities', 'Commodity', 'Ship', 'Blueprint', 'Reaction', 'Structure']
+# {group: category}
+GROUP_CATEGORY = {
+    'Mineral': 'Material', 'Ice Product': 'Material', 'Moon Materials': 'Material',
+    'Intermediate Materials': 'Material', 'Composite': 'Material', 'Fuel Block': 'Material',
+    'Refined Commodities': 'Planetary Commodities',
+    'Construction Components': 'Commodity', 'Capital Construction Components': 'Commodity',
+    'Frigate': 'Ship', 'Cruiser': 'Ship', 'Assault Frigate': 'Ship', 'Interceptor': 'Ship',
+    'Heavy Assault Cruiser': 'Ship', 'Dreadnought': 'Ship', 'Carrier': 'Ship',
+    'Blueprint': 'Blueprint', 'Reaction Formula': 'Reaction',
+    'Engineering Complex': 'Structure', 'Refinery': 'Structure',
+}
+META_GROUP_LIST = ['Tech I', 'Tech II']
+# [(market_group, parent)]，父分类在前
+MARKET_GROUP_LIST = [
+    ('Materials', None), ('Raw Materials', 'Materials'), ('Minerals', 'Raw Materials'),
+    ('Ice Products', 'Raw Materials'), ('Reaction Materials', 'Materials'),
+    ('Raw Moon Materials', 'Reaction Materials'), ('Intermediate Materials', 'Reaction Materials'),
+    ('Composite', 'Reaction Materials'), ('Fuel Blocks', 'Materials'),
+    ('Planetary Materials', None), ('Refined Commodities', 'Planetary Materials'),
+    ('Manufacture & Research', None), ('Components', 'Manufacture & Research'),
+    ('Advanced Components', 'Components'), ('Capital Components', 'Components'),
+    ('Ships', None), ('Frigates', 'Ships'), ('Cruisers', 'Ships'),
+    ('Advanced Frigates', 'Ships'), ('Advanced Cruisers', 'Ships'),
+    ('Capital Ships', 'Ships'), ('Dreadnoughts', 'Capital Ships'), ('Carriers', 'Capital Ships'),
+    ('Structures', None),
+]
+
+MINERAL_LIST = ['Tritanium', 'Pyerite', 'Mexallon', 'Isogen', 'Nocxium', 'Zydrine', 'Megacyte', 'Morphite']
+ICE_PRODUCT_LIST = ['Heavy Water', 'Liquid Ozone', 'Strontium Clathrates', 'Helium Isotopes',
+                    'Hydrogen Isotopes', 'Nitrogen Isotopes', 'Oxygen Isotopes']
+PLANETARY_LIST = ['Coolant', 'Enriched Uranium', 'Mechanical Parts', 'Robotics', 'Oxygen']
+MOON_MATERIAL_LIST = ['Atmospheric Gases', 'Evaporite Deposits', 'Hydrocarbons', 'Silicates',
+                      'Cobalt', 'Scandium', 'Titanium', 'Tungsten', 'Cadmium', 'Caesium', 'Chromium',
+                      'Platinum', 'Technetium', 'Vanadium', 'Hafnium', 'Mercury',
+                      'Dysprosium', 'Neodymium', 'Promethium', 'Thulium']
+# {fuel_block: isotope}
+FUEL_BLOCK_DICT = {'Amarr Fuel Block': 'Helium Isotopes', 'Caldari Fuel Block': 'Nitrogen Isotopes',
+                   'Gallente Fuel Block': 'Oxygen Isotopes', 'Minmatar Fuel Block': 'Hydrogen Isotopes'}
+# {intermediate: [moon_material]}
+INTERMEDIATE_DICT = {
+    'Caesarium Cadmide': ['Caesium', 'Cadmium'], 'Carbon Polymers': ['Hydrocarbons', 'Silicates'],
+    'Ceramic Powder': ['Evaporite Deposits', 'Silicates'], 'Crystallite Alloy': ['Cobalt', 'Cadmium'],
+    'Dysporite': ['Mercury', 'Dysprosium'], 'Fernite Alloy': ['Scandium', 'Vanadium'],
+    'Ferrofluid': ['Hafnium', 'Dysprosium'], 'Fluxed Condensates': ['Neodymium', 'Thulium'],
+    'Hexite': ['Chromium', 'Platinum'], 'Hyperflurite': ['Vanadium', 'Promethium'],
+    'Neo Mercurite': ['Mercury', 'Neodymium'], 'Platinum Technite': ['Platinum', 'Technetium'],
+    'Rolled Tungsten Alloy': ['Tungsten', 'Platinum'], 'Silicon Diborite': ['Evaporite Deposits', 'Silicates'],
+    'Solerium': ['Chromium', 'Caesium'], 'Sulfuric Acid': ['Atmospheric Gases', 'Evaporite Deposits'],
+    'Titanium Chromide': ['Titanium', 'Chromium'], 'Vanadium Hafnite': ['Vanadium', 'Hafnium'],
+    'Prometium': ['Cadmium', 'Promethium'], 'Thulium Hafnite': ['Hafnium', 'Thulium'],
+}
+# {composite: ([intermediate], 产出数量)}
+COMPOSITE_DICT = {
+    'Crystalline Carbonide': (['Crystallite Alloy', 'Carbon Polymers'], 10000),
+    'Fermionic Condensates': (['Caesarium Cadmide', 'Dysporite', 'Fluxed Condensates', 'Prometium'], 200),
+    'Fullerides': (['Carbon Polymers', 'Platinum Technite'], 3000),
+    'Hypersynaptic Fibers': (['Vanadium Hafnite', 'Solerium', 'Dysporite'], 750),
+    'Nanotransistors': (['Sulfuric Acid', 'Platinum Technite', 'Neo Mercurite'], 1500),
+    'Phenolic Composites': (['Silicon Diborite', 'Caesarium Cadmide', 'Vanadium Hafnite'], 2200),
+    'Photonic Metamaterials': (['Crystallite Alloy', 'Thulium Hafnite'], 300),
+    'Sylramic Fibers': (['Ceramic Powder', 'Hexite'], 6000),
+    'Titanium Carbide': (['Titanium Chromide', 'Silicon Diborite'], 10000),
+    'Tungsten Carbide': (['Rolled Tungsten Alloy', 'Sulfuric Acid'], 10000),
+    'Fernite Carbide': (['Fernite Alloy', 'Ceramic Powder'], 10000),
+    'Ferrogel': (['Hexite', 'Hyperflurite', 'Ferrofluid', 'Prometium'], 400),
+}
+T2_COMPONENT_LIST = [
+    'Antimatter Reactor Unit', 'Crystalline Carbonide Armor Plate', 'Deflection Shield Emitter',
+    'Electrolytic Capacitor Unit', 'Fernite Carbide Composite Armor Plate', 'Fusion Reactor Unit',
+    'Fusion Thruster', 'Gravimetric Sensor Cluster', 'Graviton Pulse Generator', 'Graviton Reactor Unit',
+    'Ion Thruster', 'Ladar Sensor Cluster', 'Laser Focusing Crystals', 'Linear Shield Emitter',
+    'Magnetometric Sensor Cluster', 'Magpulse Thruster', 'Nanoelectrical Microprocessor',
+    'Nuclear Pulse Generator', 'Nuclear Reactor Unit', 'Oscillator Capacitor Unit',
+    'Particle Accelerator Unit', 'Photon Microprocessor', 'Plasma Pulse Generator', 'Plasma Thruster',
+    'Pulse Shield Emitter', 'Quantum Microprocessor', 'Radar Sensor Cluster', 'Scalar Capacitor Unit',
+    'Sustained Shield Emitter', 'Tesseract Capacitor Unit', 'Titanium Diborite Armor Plate',
+    'Tungsten Carbide Armor Plate',
+]
+# {t1_ship: group}
+T1_SHIP_DICT = {
+    'Rifter': 'Frigate', 'Slasher': 'Frigate', 'Merlin': 'Frigate', 'Kestrel': 'Frigate',
+    'Punisher': 'Frigate', 'Executioner': 'Frigate', 'Incursus': 'Frigate', 'Atron': 'Frigate',
+    'Rupture': 'Cruiser', 'Stabber': 'Cruiser', 'Caracal': 'Cruiser', 'Moa': 'Cruiser',
+    'Omen': 'Cruiser', 'Maller': 'Cruiser', 'Thorax': 'Cruiser', 'Vexor': 'Cruiser',
+}
+# {t2_ship: (t1_ship, group)}
+T2_SHIP_DICT = {
+    'Wolf': ('Rifter', 'Assault Frigate'), 'Jaguar': ('Rifter', 'Assault Frigate'),
+    'Claw': ('Slasher', 'Interceptor'), 'Stiletto': ('Slasher', 'Interceptor'),
+    'Hawk': ('Merlin', 'Assault Frigate'), 'Harpy': ('Merlin', 'Assault Frigate'),
+    'Raptor': ('Kestrel', 'Interceptor'), 'Crow': ('Kestrel', 'Interceptor'),
+    'Retribution': ('Punisher', 'Assault Frigate'), 'Vengeance': ('Punisher', 'Assault Frigate'),
+    'Crusader': ('Executioner', 'Interceptor'), 'Malediction': ('Executioner', 'Interceptor'),
+    'Enyo': ('Incursus', 'Assault Frigate'), 'Ishkur': ('Incursus', 'Assault Frigate'),
+    'Taranis': ('Atron', 'Interceptor'), 'Ares': ('Atron', 'Interceptor'),
+    'Muninn': ('Rupture', 'Heavy Assault Cruiser'), 'Vagabond': ('Stabber', 'Heavy Assault Cruiser'),
+    'Cerberus': ('Caracal', 'Heavy Assault Cruiser'), 'Eagle': ('Moa', 'Heavy Assault Cruiser'),
+    'Zealot': ('Omen', 'Heavy Assault Cruiser'), 'Sacrilege': ('Maller', 'Heavy Assault Cruiser'),
+    'Deimos': ('Thorax', 'Heavy Assault Cruiser'), 'Ishtar': ('Vexor', 'Heavy Assault Cruiser'),
+}
+CAPITAL_COMPONENT_LIST = [
+    'Capital Armor Plates', 'Capital Capacitor Battery', 'Capital Computer System',
+    'Capital Construction Parts', 'Capital Corporate Hangar Bay', 'Capital Drone Bay',
+    'Capital Jump Drive', 'Capital Power Generator', 'Capital Propulsion Engine',
+    'Capital Sensor Cluster', 'Capital Shield Emitter', 'Capital Ship Maintenance Bay',
+    'Capital Siege Array', 'Capital Turret Hardpoint',
+]
+# {capital: group}
+CAPITAL_SHIP_DICT = {
+    'Naglfar': 'Dreadnought', 'Moros': 'Dreadnought', 'Phoenix': 'Dreadnought', 'Revelation': 'Dreadnought',
+    'Archon': 'Carrier', 'Chimera': 'Carrier', 'Nidhoggur': 'Carrier', 'Thanatos': 'Carrier',
+}
+SHIP_MARKET_GROUP = {
+    'Frigate': 'Frigates', 'Cruiser': 'Cruisers', 'Assault Frigate': 'Advanced Frigates',
+    'Interceptor': 'Advanced Frigates', 'Heavy Assault Cruiser': 'Advanced Cruisers',
+    'Dreadnought': 'Dreadnoughts', 'Carrier': 'Carriers',
+}
+SHIP_VOLUME = {
+    'Frigate': 2500, 'Cruiser': 10000, 'Assault Frigate': 2500, 'Interceptor': 2500,
+    'Heavy Assault Cruiser': 10000, 'Dreadnought': 1300000, 'Carrier': 1300000,
+}
+
+
+class BenchmarkSde:
+    """
+    生成基准测试使用的SDE数据。
+    类型的结构与正式SDE一致：行星工业、冰矿产物和同位素制造燃料块，卫星矿反应为中间物和复合物，
+    复合物制造T2组件，T2组件和T1船体制造T2船，旗舰组件和T2组件制造旗舰。
+    数量和价格使用固定种子的随机数生成，同一种子的结果一致。
+    """
+    def __init__(self, seed: int = BENCH_SEED):
+        self.rng = random.Random(seed)
+        self.next_type_id = 100000
+        self.type_dict = dict()  # {name: type_id}
+        self.type_list = []  # [invTypes row]
+        self.category_dict = {category: index + 1 for index, category in enumerate(CATEGORY_LIST)}
+        self.group_dict = {group: index + 1 for index, group in enumerate(GROUP_CATEGORY)}
+        self.meta_dict = {meta: index + 1 for index, meta in enumerate(META_GROUP_LIST)}
+        self.market_group_dict = {market_group: index + 1 for index, (market_group, _) in enumerate(MARKET_GROUP_LIST)}
+        # {product_id: (bp_id, action_id, product_quantity, {material_id: quantity})}
+        self.bp_dict = dict()
+        self.activity_list = []
+        self.product_list = []
+        self.material_list = []
+        self.max_production_list = []
+        self.price_dict = dict()  # {type_id: price}
+        self.volume_dict = dict()  # {type_id: packagedVolume}
+
+    def add_type(self, name: str, group: str, market_group: str = None, meta: str = None,
+                 volume: float = 1.0, price: float = None) -> int:
+        type_id = self.next_type_id
+        self.next_type_id += 1
+        self.type_dict[name] = type_id
+        self.volume_dict[type_id] = volume
+        self.type_list.append({
+            'typeID': type_id,
+            'groupID': self.group_dict[group],
+            'typeName': name,
+            'volume': volume,
+            'packagedVolume': volume,
+            'portionSize': 1,
+            'published': 1,
+            'marketGroupID': self.market_group_dict[market_group] if market_group else None,
+            'metaGroupID': self.meta_dict[meta] if meta else None,
+        })
+        if price is not None:
+            self.price_dict[type_id] = price
+        return type_id
+
+    def add_blueprint(self, product: str, action_id: int, product_quantity: int, time: int,
+                      max_production: int, material_dict: dict):
+        """ material_dict: {material_name: quantity}，产品价格按材料价格加20%计算 """
+        product_id = self.type_dict[product]
+        if action_id == REAC_ACTION_ID:
+            bp_id = self.add_type(f"{product} Reaction Formula", 'Reaction Formula', volume=0.01)
+        else:
+            bp_id = self.add_type(f"{product} Blueprint", 'Blueprint', volume=0.01)
+        materials = {self.type_dict[name]: quantity for name, quantity in material_dict.items()}
+        self.bp_dict[product_id] = (bp_id, action_id, product_quantity, materials)
+
+        self.activity_list.append({'blueprintTypeID': bp_id, 'activityID': action_id, 'time': time})
+        self.product_list.append({'blueprintTypeID': bp_id, 'activityID': action_id, 'productTypeID': product_id,
+                                  'quantity': product_quantity, 'probability': 1.0})
+        self.material_list += [{'blueprintTypeID': bp_id, 'activityID': action_id,
+                                'materialTypeID': material_id, 'quantity': quantity}
+                               for material_id, quantity in materials.items()]
+        self.max_production_list.append({'blueprintTypeID': bp_id, 'maxProductionLimit': max_production})
+        self.price_dict[product_id] = round(sum(self.price_dict[material_id] * quantity
+                                                for material_id, quantity in materials.items())
+                                            / product_quantity * 1.2, 2)
+
+    def build(self):
+        rng = self.rng
+        for name in MINERAL_LIST:
+            self.add_type(name, 'Mineral', 'Minerals', volume=0.01, price=round(rng.uniform(3, 800), 2))
+        for name in ICE_PRODUCT_LIST:
+            self.add_type(name, 'Ice Product', 'Ice Products', volume=0.1, price=round(rng.uniform(100, 1500), 2))
+        for name in PLANETARY_LIST:
+            self.add_type(name, 'Refined Commodities', 'Refined Commodities', volume=1.5,
+                          price=round(rng.uniform(500, 20000), 2))
+        for name in MOON_MATERIAL_LIST:
+            self.add_type(name, 'Moon Materials', 'Raw Moon Materials', volume=0.05,
+                          price=round(rng.uniform(50, 3000), 2))
+
+        # 燃料块
+        for name, isotope in FUEL_BLOCK_DICT.items():
+            self.add_type(name, 'Fuel Block', 'Fuel Blocks', volume=5)
+            self.add_blueprint(name, MANU_ACTION_ID, 40, 900, 40, {
+                isotope: 450, 'Heavy Water': 170, 'Liquid Ozone': 350, 'Strontium Clathrates': 20,
+                'Coolant': 9, 'Enriched Uranium': 4, 'Mechanical Parts': 4, 'Robotics': 1, 'Oxygen': 22})
+
+        # 反应
+        fuel_block_list = list(FUEL_BLOCK_DICT)
+        for name, moon_material_list in INTERMEDIATE_DICT.items():
+            self.add_type(name, 'Intermediate Materials', 'Intermediate Materials', volume=0.1)
+            material_dict = {material: 100 for material in moon_material_list}
+            material_dict[rng.choice(fuel_block_list)] = 5
+            self.add_blueprint(name, REAC_ACTION_ID, 200, 10800, 1000, material_dict)
+        for name, (intermediate_list, product_quantity) in COMPOSITE_DICT.items():
+            self.add_type(name, 'Composite', 'Composite', volume=round(rng.uniform(0.01, 1), 2))
+            material_dict = {material: 100 for material in intermediate_list}
+            material_dict[rng.choice(fuel_block_list)] = 5
+            self.add_blueprint(name, REAC_ACTION_ID, product_quantity, 10800, 1000, material_dict)
+
+        # T2组件
+        composite_list = list(COMPOSITE_DICT)
+        for name in T2_COMPONENT_LIST:
+            self.add_type(name, 'Construction Components', 'Advanced Components', volume=1)
+            material_dict = {material: rng.randint(2, 30) for material in rng.sample(composite_list, rng.randint(2, 3))}
+            self.add_blueprint(name, MANU_ACTION_ID, 1, 1200, 1000, material_dict)
+
+        # T1船体和T2船
+        for name, group in T1_SHIP_DICT.items():
+            self.add_type(name, group, SHIP_MARKET_GROUP[group], meta='Tech I', volume=SHIP_VOLUME[group])
+            scale = 1 if group == 'Frigate' else 8
+            material_dict = {material: rng.randint(100, 30000) * scale for material in MINERAL_LIST[:6]}
+            self.add_blueprint(name, MANU_ACTION_ID, 1, 6000 * scale, 30, material_dict)
+        for name, (hull, group) in T2_SHIP_DICT.items():
+            self.add_type(name, group, SHIP_MARKET_GROUP[group], meta='Tech II', volume=SHIP_VOLUME[group])
+            scale = 1 if group != 'Heavy Assault Cruiser' else 6
+            material_dict = {material: rng.randint(20, 150) * scale for material in rng.sample(T2_COMPONENT_LIST, 5)}
+            material_dict[hull] = 1
+            material_dict['Morphite'] = rng.randint(10, 40) * scale
+            self.add_blueprint(name, MANU_ACTION_ID, 1, 30000 * scale, 10, material_dict)
+
+        # 旗舰，同时使用T2组件，使蓝图链从反应一直延伸到旗舰
+        for name in CAPITAL_COMPONENT_LIST:
+            self.add_type(name, 'Capital Construction Components', 'Capital Components', volume=10)
+            material_dict = {material: rng.randint(2000, 60000) for material in MINERAL_LIST[:7]}
+            self.add_blueprint(name, MANU_ACTION_ID, 1, 9000, 100, material_dict)
+        for name, group in CAPITAL_SHIP_DICT.items():
+            self.add_type(name, group, SHIP_MARKET_GROUP[group], meta='Tech I', volume=SHIP_VOLUME[group])
+            material_dict = {material: rng.randint(10, 60) for material in rng.sample(CAPITAL_COMPONENT_LIST, 8)}
+            material_dict.update({material: rng.randint(100, 500) for material in rng.sample(T2_COMPONENT_LIST, 2)})
+            material_dict['Morphite'] = rng.randint(200, 800)
+            self.add_blueprint(name, MANU_ACTION_ID, 1, 600000, 1, material_dict)
+
+        # 建筑
+        self.add_type('Sotiyo', 'Engineering Complex', 'Structures', volume=1)
+        self.add_type('Tatara', 'Refinery', 'Structures', volume=1)
+
+    def get_plan_product_list(self) -> list:
+        """ 计划可选的产品，按旗舰、T2船、组件、T1船、复合物的顺序 """
+        return (list(CAPITAL_SHIP_DICT) + list(T2_SHIP_DICT) + T2_COMPONENT_LIST +
+                CAPITAL_COMPONENT_LIST + list(T1_SHIP_DICT) + list(COMPOSITE_DICT))
+
+    def get_plan(self, size: int) -> list:
+        """ 1行计划为一艘旗舰，覆盖最深的蓝图链；更大的计划按固定种子抽取，允许同一产品出现多行 """
+        rng = random.Random(BENCH_SEED + size)
+        product_list = self.get_plan_product_list()
+        plan = [[product_list[0], 1]]
+        while len(plan) < size:
+            product = rng.choice(product_list)
+            if product in CAPITAL_SHIP_DICT:
+                quantity = rng.randint(1, 3)
+            elif product in COMPOSITE_DICT:
+                quantity = rng.randint(10000, 200000)
+            elif product in T2_COMPONENT_LIST or product in CAPITAL_COMPONENT_LIST:
+                quantity = rng.randint(10, 1000)
+            else:
+                quantity = rng.randint(1, 50)
+            plan.append([product, quantity])
+        return plan
+
+
+class BenchmarkFixture:
+    """ 在临时目录中建立sde、sde_cn和数据库，写入BenchmarkSde和合成的用户、建筑、资产等数据 """
+    def __init__(self, data_dir: str, size_list: list, seed: int = BENCH_SEED):
+        self.data_dir = data_dir
+        self.size_list = size_list
+        self.rng = random.Random(seed)
+        self.sde = BenchmarkSde(seed)
+        self.next_item_id = 1050000000001
+
+    def get_item_id(self) -> int:
+        item_id = self.next_item_id
+        self.next_item_id += 1
+        return item_id
+
+    def setup_config(self):
+        """ 数据库路径和市场角色始终指向临时数据，其余缺失的配置填入占位值 """
+        config.read_dict({
+            'APP': {'DBTYPE': 'sqlite'},
+            'SQLITEDB': {
+                'DATADB': os.path.join(self.data_dir, 'data.db'),
+                'SDEDB': os.path.join(self.data_dir, 'sde.db'),
+                'CN_SDEDB': os.path.join(self.data_dir, 'sde_cn.db'),
+            },
+            'EVE': {'MARKET_AC_CHARACTER_ID': str(BENCH_CHARACTER_ID)},
+        })
+        for section, option_dict in {
+            'EVE': {'CLIENT_ID': 'bench', 'SECRET_KEY': 'bench'},
+            'FEISHU': {'APP_ID': 'bench', 'SECRET_ID': 'bench', 'FOLDER_ROOT': 'bench'},
+        }.items():
+            if not config.has_section(section):
+                config.add_section(section)
+            for option, value in option_dict.items():
+                if not config.has_option(section, option):
+                    config.set(section, option, value)
+
+    @staticmethod
+    def setup_offline():
+        """
+        在config改写之后、业务模块导入之前调用。
+        ESI请求和飞书客户端直接报错，基准测试不访问网络，也不需要真实的账号。
+        """
+        from ..evesso_server.esi_session import EsiSession
+        from ..evesso_server.esi_async import AsyncEsiClient
+        from ..feishu_server.feishu_kahuna import FeiShuKahuna
+
+        def offline_get(cls, url, params=None, headers=None):
+            raise KahunaException(f"offline benchmark does not request esi: {url}")
+
+        async def offline_get_async(cls, url, params=None, headers=None):
+            offline_get(cls, url)
+
+        def offline_client(cls):
+            raise KahunaException("offline benchmark does not export to feishu.")
+
+        EsiSession.get = classmethod(offline_get)
+        AsyncEsiClient.get = classmethod(offline_get_async)
+        FeiShuKahuna.get_client = classmethod(offline_client)
+
+    @staticmethod
+    def insert_rows(model, row_list: list):
+        with model._meta.database.atomic():
+            for row_chunk in chunks(row_list, 100):
+                model.insert_many(row_chunk).execute()
+
+    def build_sde(self):
+        from ..sde_service import database as sde_database
+        from ..sde_service import database_cn as sde_database_cn
+
+        self.sde.build()
+        sde_model_list = [sde_database.InvTypes, sde_database.InvGroups, sde_database.InvCategories,
+                          sde_database.MetaGroups, sde_database.MarketGroups,
+                          sde_database.IndustryActivityMaterials, sde_database.IndustryActivityProducts,
+                          sde_database.IndustryActivities, sde_database.IndustryBlueprints]
+        sde_database.db.create_tables(sde_model_list)
+        sde_database_cn.db.create_tables([sde_database_cn.InvTypes])
+
+        self.insert_rows(sde_database.InvTypes, self.sde.type_list)
+        self.insert_rows(sde_database_cn.InvTypes, self.sde.type_list)
+        self.insert_rows(sde_database.InvCategories, [
+            {'categoryID': category_id, 'categoryName': category, 'published': 1}
+            for category, category_id in self.sde.category_dict.items()])
+        self.insert_rows(sde_database.InvGroups, [
+            {'groupID': group_id, 'categoryID': self.sde.category_dict[GROUP_CATEGORY[group]],
+             'groupName': group, 'published': 1}
+            for group, group_id in self.sde.group_dict.items()])
+        self.insert_rows(sde_database.MetaGroups, [
+            {'metaGroupID': meta_id, 'nameID': meta} for meta, meta_id in self.sde.meta_dict.items()])
+        self.insert_rows(sde_database.MarketGroups, [
+            {'marketGroupID': self.sde.market_group_dict[market_group], 'nameID': market_group, 'hasTypes': 1,
+             'parentGroupID': self.sde.market_group_dict[parent] if parent else 0}
+            for market_group, parent in MARKET_GROUP_LIST])
+        self.insert_rows(sde_database.IndustryActivities, self.sde.activity_list)
+        self.insert_rows(sde_database.IndustryActivityProducts, self.sde.product_list)
+        self.insert_rows(sde_database.IndustryActivityMaterials, self.sde.material_list)
+        self.insert_rows(sde_database.IndustryBlueprints, self.sde.max_production_list)
+
+    def get_user_data(self) -> dict:
+        plan_dict = dict()
+        for size in self.size_list:
+            plan_dict[f"bench_{size}"] = {
+                'bp_matcher': BENCH_BP_MATCHER,
+                'st_matcher': BENCH_ST_MATCHER,
+                'prod_block_matcher': BENCH_BLOCK_MATCHER,
+                'manucycletime': 24,
+                'reaccycletime': 24,
+                'container_block': [],
+                'plan': self.sde.get_plan(size),
+            }
+        return {'plan': plan_dict, 'alias': dict()}
+
+    def get_matcher_list(self) -> list:
+        empty_data = {matcher_key: dict() for matcher_key in ['bp', 'market_group', 'group', 'meta', 'category']}
+        st_data = json.loads(json.dumps(empty_data))
+        st_data['group'] = {'Intermediate Materials': BENCH_TATARA_ID, 'Composite': BENCH_TATARA_ID}
+        st_data['category'] = {category: BENCH_SOTIYO_ID for category in
+                               ['Material', 'Planetary Commodities', 'Commodity', 'Ship']}
+        return [
+            {'matcher_name': BENCH_BP_MATCHER, 'user_qq': BENCH_USER_QQ, 'matcher_type': 'bp',
+             'matcher_data': json.dumps(empty_data)},
+            {'matcher_name': BENCH_ST_MATCHER, 'user_qq': BENCH_USER_QQ, 'matcher_type': 'structure',
+             'matcher_data': json.dumps(st_data)},
+            {'matcher_name': BENCH_BLOCK_MATCHER, 'user_qq': BENCH_USER_QQ, 'matcher_type': 'prod_block',
+             'matcher_data': json.dumps(empty_data)},
+        ]
+
+    def get_asset_row(self, location_id: int, location_type: str, type_id: int, quantity: int,
+                      item_id: int = None) -> dict:
+        return {
+            'asset_type': 'corp', 'owner_id': BENCH_CORP_ID, 'is_blueprint_copy': False, 'is_singleton': False,
+            'item_id': item_id if item_id else self.get_item_id(), 'location_flag': 'CorpSAG1',
+            'location_id': location_id, 'location_type': location_type, 'quantity': quantity, 'type_id': type_id,
+        }
+
+    def build_data(self):
+        from ..database_server import model
+
+        now = datetime.now()
+        rng = self.rng
+        sde = self.sde
+        sotiyo_type_id = sde.type_dict['Sotiyo']
+        tatara_type_id = sde.type_dict['Tatara']
+
+        self.insert_rows(model.User, [{'user_qq': BENCH_USER_QQ, 'create_date': now,
+                                       'expire_date': now + timedelta(days=3650),
+                                       'main_character_id': BENCH_CHARACTER_ID}])
+        self.insert_rows(model.UserData, [{'user_qq': BENCH_USER_QQ,
+                                           'user_data': json.dumps(self.get_user_data(), indent=4)}])
+        self.insert_rows(model.Character, [{
+            'character_id': BENCH_CHARACTER_ID, 'character_name': 'Bench Pilot', 'QQ': BENCH_USER_QQ,
+            'create_date': now, 'token': 'bench', 'refresh_token': 'bench',
+            'expires_date': now + timedelta(days=3650), 'corp_id': BENCH_CORP_ID, 'director': True}])
+        self.insert_rows(model.Structure, [
+            {'structure_id': BENCH_SOTIYO_ID, 'name': 'Bench - Sotiyo', 'owner_id': BENCH_CORP_ID,
+             'solar_system_id': BENCH_SOLAR_SYSTEM_ID, 'type_id': sotiyo_type_id, 'system': BENCH_SOLAR_SYSTEM_ID,
+             'mater_rig_level': 2, 'time_rig_level': 2},
+            {'structure_id': BENCH_TATARA_ID, 'name': 'Bench - Tatara', 'owner_id': BENCH_CORP_ID,
+             'solar_system_id': BENCH_SOLAR_SYSTEM_ID, 'type_id': tatara_type_id, 'system': BENCH_SOLAR_SYSTEM_ID,
+             'mater_rig_level': 2, 'time_rig_level': 2},
+        ])
+        system_cost = [{'solar_system_id': BENCH_SOLAR_SYSTEM_ID, 'manufacturing': 0.05, 'reaction': 0.03,
+                        'researching_time_efficiency': 0.02, 'researching_material_efficiency': 0.02,
+                        'copying': 0.02, 'invention': 0.03}]
+        self.insert_rows(model.SystemCost, system_cost)
+        self.insert_rows(model.SystemCostCache, system_cost)
+        self.insert_rows(model.Matcher, self.get_matcher_list())
+
+        # 仓库: (location_id, structure_id, tag)
+        container_list = [
+            (BENCH_MANU_CONTAINER, BENCH_SOTIYO_ID, 'manu'),
+            (BENCH_REAC_CONTAINER, BENCH_TATARA_ID, 'reac'),
+            (BENCH_BP_MANU_CONTAINER, BENCH_SOTIYO_ID, 'bp'),
+            (BENCH_BP_REAC_CONTAINER, BENCH_TATARA_ID, 'bp'),
+        ]
+        self.insert_rows(model.AssetContainer, [
+            {'asset_location_id': location_id, 'asset_location_type': 'item', 'structure_id': structure_id,
+             'solar_system_id': BENCH_SOLAR_SYSTEM_ID, 'asset_name': f"bench {tag} {location_id}",
+             'asset_owner_id': BENCH_CORP_ID, 'asset_owner_type': 'corp', 'asset_owner_qq': BENCH_USER_QQ, 'tag': tag}
+            for location_id, structure_id, tag in container_list])
+
+        # 资产: 建筑 -> 仓库 -> 物品，使find_type_structure能找到仓库所在建筑
+        asset_list = [
+            self.get_asset_row(BENCH_SOLAR_SYSTEM_ID, 'solar_system', sotiyo_type_id, 1, BENCH_SOTIYO_ID),
+            self.get_asset_row(BENCH_SOLAR_SYSTEM_ID, 'solar_system', tatara_type_id, 1, BENCH_TATARA_ID),
+        ]
+        asset_list += [self.get_asset_row(structure_id, 'item', STATION_CONTAINER_TYPE_ID, 1, location_id)
+                       for location_id, structure_id, _ in container_list]
+        for type_id in sde.price_dict:
+            if rng.random() > 0.3:
+                continue
+            bp = sde.bp_dict.get(type_id)
+            location_id = BENCH_REAC_CONTAINER if bp and bp[1] == REAC_ACTION_ID else BENCH_MANU_CONTAINER
+            quantity = rng.randint(1, 5) if sde.volume_dict[type_id] > 1000 else rng.randint(100, 200000)
+            asset_list.append(self.get_asset_row(location_id, 'item', type_id, quantity))
+        self.insert_rows(model.Asset, asset_list)
+        self.insert_rows(model.AssetCache, asset_list)
+
+        # 蓝图资产，反应配方放在塔塔拉的蓝图仓库
+        bp_asset_list = []
+        for product_id, (bp_id, action_id, _, _) in sde.bp_dict.items():
+            location_id = BENCH_BP_REAC_CONTAINER if action_id == REAC_ACTION_ID else BENCH_BP_MANU_CONTAINER
+            if rng.random() < 0.6:
+                for _ in range(rng.randint(1, 4)):
+                    bp_asset_list.append({
+                        'item_id': self.get_item_id(), 'location_flag': 'CorpSAG1', 'location_id': location_id,
+                        'material_efficiency': rng.choice([0, 2, 4, 10]), 'quantity': -2,
+                        'runs': rng.randint(1, 50), 'time_efficiency': rng.choice([0, 4, 20]),
+                        'type_id': bp_id, 'owner_id': BENCH_CORP_ID, 'owner_type': 'corp'})
+            if rng.random() < 0.3:
+                bp_asset_list.append({
+                    'item_id': self.get_item_id(), 'location_flag': 'CorpSAG1', 'location_id': location_id,
+                    'material_efficiency': 10, 'quantity': -1, 'runs': -1, 'time_efficiency': 20,
+                    'type_id': bp_id, 'owner_id': BENCH_CORP_ID, 'owner_type': 'corp'})
+        self.insert_rows(model.BlueprintAsset, bp_asset_list)
+        self.insert_rows(model.BlueprintAssetCache, bp_asset_list)
+
+        # 运行中的工作，使用的蓝图从蓝图资产中选取
+        product_dict = {bp_id: product_id for product_id, (bp_id, _, _, _) in sde.bp_dict.items()}
+        job_list = []
+        for job_id, bp in enumerate(rng.sample(bp_asset_list, min(20, len(bp_asset_list)))):
+            product_id = product_dict[bp['type_id']]
+            action_id = sde.bp_dict[product_id][1]
+            runs = rng.randint(1, 20)
+            job_list.append({
+                'activity_id': action_id, 'blueprint_id': bp['item_id'], 'blueprint_location_id': bp['location_id'],
+                'blueprint_type_id': bp['type_id'], 'cost': 0.0, 'duration': 86400,
+                'start_date': now - timedelta(hours=1), 'end_date': now + timedelta(days=1),
+                'facility_id': BENCH_TATARA_ID if action_id == REAC_ACTION_ID else BENCH_SOTIYO_ID,
+                'installer_id': BENCH_CHARACTER_ID, 'job_id': job_id + 1, 'licensed_runs': runs,
+                'location_id': BENCH_TATARA_ID if action_id == REAC_ACTION_ID else BENCH_SOTIYO_ID,
+                'output_location_id': BENCH_REAC_CONTAINER if action_id == REAC_ACTION_ID else BENCH_MANU_CONTAINER,
+                'probability': 1.0, 'product_type_id': product_id, 'runs': runs, 'status': 'active',
+                'owner_id': BENCH_CORP_ID})
+        self.insert_rows(model.IndustryJobs, job_list)
+        self.insert_rows(model.IndustryJobsCache, job_list)
+
+        # 吉他订单和全服价格
+        order_list = []
+        for type_id, price in sde.price_dict.items():
+            for is_buy_order, price_rate in [(True, 0.95), (True, 0.9), (False, 1.05), (False, 1.1)]:
+                order_list.append({
+                    'duration': 90, 'is_buy_order': is_buy_order, 'issued': now, 'location_id': JITA_LOCATION_ID,
+                    'min_volume': 1, 'order_id': len(order_list) + 1, 'price': round(price * price_rate, 2),
+                    'range': 'region', 'system_id': JITA_SYSTEM_ID, 'type_id': type_id,
+                    'volume_remain': 100000, 'volume_total': 100000})
+        self.insert_rows(model.MarketOrder, order_list)
+        self.insert_rows(model.MarketOrderCache, order_list)
+        market_price = [{'type_id': type_id, 'adjusted_price': int(price * 0.9), 'average_price': int(price)}
+                        for type_id, price in sde.price_dict.items()]
+        self.insert_rows(model.MarketPrice, market_price)
+        self.insert_rows(model.MarketPriceCache, market_price)
+
+    def build(self):
+        self.setup_config()
+        self.setup_offline()
+        self.build_sde()
+        self.build_data()
+
+
+class IndustryOfflineBenchmark:
+    """
+    离线基准测试，不依赖正式SDE、ESI token和飞书账号。
+    在临时目录中生成BenchmarkFixture，对1/50/500行的计划分别执行analyse_progress_work_type、get_work_tree_data、
+    get_cost_data和get_cost_detail，记录耗时、sql数量和内存峰值，作为后续优化的对比基线。
+    每个操作开始前清理查询缓存，结果为冷缓存下的数据。
+    "work"模式的get_cost_data在进程池中计算，sql数量和内存峰值只包含主进程。
+
+    数据库连接和各个Manager在模块导入时就会按config打开数据库并加载数据，
+    所以必须在独立进程中运行，先改写config、建好临时数据库再导入业务模块：
+        python -m <插件目录>.src.service.industry_server.industry_offline_benchmark --size 1 50 500 --json bench.json
+    """
+    @classmethod
+    def clear_cache(cls):
+        """ 清理各工具类上的lru_cache和TTLCache，以及匹配器决策表和分析结果缓存 """
+        from cachetools import Cache
+        from .blueprint import BPSdeQuery, BPManager
+        from .industry_config import IndustryConfigManager
+        from .industry_utils import IdsUtils
+        from .industry_analyse_cache import IndustryAnalyseCache
+        from ..asset_server.asset_container import AssetContainer
+        from ..market_server.marker import Market
+        from ..sde_service.utils import SdeUtils
+        from ..database_server.TTL_cache import ROUGE_PRICE_CACHE
+
+        for owner in [SdeUtils, BPSdeQuery, BPManager, IdsUtils, AssetContainer, Market]:
+            for attr in vars(owner).values():
+                func = getattr(attr, '__func__', attr)
+                if hasattr(func, 'cache_clear'):
+                    func.cache_clear()
+                elif isinstance(attr, Cache):
+                    attr.clear()
+        ROUGE_PRICE_CACHE.clear()
+        for matcher in IndustryConfigManager.matcher_dict.values():
+            matcher.recompile()
+        IndustryAnalyseCache.clear()
+
+    @classmethod
+    def measure(cls, op: str, func) -> dict:
+        """ func(profiler)，返回{time, sql, peak, phase}，phase为分析器记录的各阶段数据 """
+        from .industry_profiler import IndustryProfiler
+
+        cls.clear_cache()
+        profiler = IndustryProfiler()
+        profiler.start()
+        try:
+            with profiler.phase(op):
+                func(profiler)
+        finally:
+            profiler.stop()
+        record = profiler.phase_dict.pop(op)
+        return {'time': record['time'], 'sql': record['sql'], 'peak': record['peak'], 'phase': profiler.phase_dict}
+
+    @classmethod
+    def run_plan(cls, user, plan_name: str, op_list: list) -> dict:
+        from .industry_analyse import IndustryAnalyser
+
+        plan_list = user.user_data.plan[plan_name]['plan']
+        product = plan_list[0][0]
+
+        def analyse(profiler):
+            analyser = IndustryAnalyser.create_analyser_by_plan(user, plan_name)
+            analyser.profiler = profiler
+            analyser.analyse_progress_work_type(analyser.plan_list)
+
+        def work_tree_data(profiler):
+            analyser = IndustryAnalyser.create_analyser_by_plan(user, plan_name)
+            analyser.profiler = profiler
+            analyser.get_work_tree_data()
+
+        op_func_dict = {
+            'analyse_progress_work_type': analyse,
+            'get_work_tree_data': work_tree_data,
+            'get_cost_data_work': lambda _: IndustryAnalyser.get_cost_data(user, plan_name, plan_list, 'work'),
+            'get_cost_data_cost': lambda _: IndustryAnalyser.get_cost_data(user, plan_name, plan_list, 'cost'),
+            'get_cost_detail_work': lambda _: IndustryAnalyser.get_cost_detail(user, plan_name, product, 'work'),
+            'get_cost_detail_cost': lambda _: IndustryAnalyser.get_cost_detail(user, plan_name, product, 'cost'),
+        }
+        res = dict()
+        for op in op_list:
+            res[op] = cls.measure(op, op_func_dict[op])
+            logger.info(f"offline benchmark {plan_name} {op}: {res[op]['time']:.3f}s, sql {res[op]['sql']}")
+        return res
+
+    @classmethod
+    def run(cls, size_list: list = None, op_list: list = None, seed: int = BENCH_SEED) -> dict:
+        size_list = size_list if size_list else BENCH_SIZE_LIST
+        op_list = op_list if op_list else BENCH_OP_LIST
+        with tempfile.TemporaryDirectory(prefix='kahuna_bench_') as data_dir:
+            fixture = BenchmarkFixture(data_dir, size_list, seed)
+            fixture.build()
+
+            from ..user_server.user_manager import UserManager
+            user = UserManager.get_user(BENCH_USER_QQ)
+            res = {
+                'date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'seed': seed,
+                'types': len(fixture.sde.type_list),
+                'blueprints': len(fixture.sde.bp_dict),
+                'plan': dict(),
+            }
+            for size in size_list:
+                plan_name = f"bench_{size}"
+                res['plan'][plan_name] = {'lines': size, 'op': cls.run_plan(user, plan_name, op_list)}
+
+            # 关闭连接后再删除临时目录
+            from ..database_server.connect import db
+            from ..sde_service.database import db as sde_db
+            from ..sde_service.database_cn import db as sde_cn_db
+            for database in [db, sde_db, sde_cn_db]:
+                database.close()
+        return res
+
+    @classmethod
+    def format_result(cls, res: dict) -> str:
+        res_str = f"SDE: {res['types']}类型, {res['blueprints']}蓝图, seed {res['seed']}\n"
+        for plan_name, plan_data in res['plan'].items():
+            res_str += f"\n{plan_name}({plan_data['lines']}行):\n"
+            for op, record in plan_data['op'].items():
+                res_str += (f"  {op}: {record['time']:.3f}s, sql {record['sql']}, "
+                            f"峰值 {record['peak'] / 1024 / 1024:.2f}MB\n")
+        return res_str
+
+
+def main():
+    parser = argparse.ArgumentParser(description='industry analyser offline benchmark')
+    parser.add_argument('--size', type=int, nargs='+', default=BENCH_SIZE_LIST, help='计划行数')
+    parser.add_argument('--op', nargs='+', default=BENCH_OP_LIST, choices=BENCH_OP_LIST, help='测试的操作')
+    parser.add_argument('--seed', type=int, default=BENCH_SEED)
+    parser.add_argument('--json', default='', help='结果json输出路径')
+    args = parser.parse_args()
+
+    res = IndustryOfflineBenchmark.run(args.size, args.op, args.seed)
+    print(IndustryOfflineBenchmark.format_result(res))
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(res, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()
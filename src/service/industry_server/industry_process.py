@@ -0,0 +1,79 @@
+import uuid
+import pickle
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+from ..config_server.config import config
+
+# 只依赖config，worker进程导入本模块时还不会打开数据库或加载业务数据
+
+# worker进程内的状态，由init_process_worker和run_process_task设置
+worker_state = dict()
+
+
+def get_process_context():
+    """
+    机器人进程中有多个线程，fork出的子进程可能复制其他线程正持有的logging、tqdm、peewee、sqlite锁而死锁。
+    worker使用forkserver(不支持时spawn)启动，从干净的进程开始导入模块。
+    """
+    if 'forkserver' in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context('forkserver')
+    return multiprocessing.get_context('spawn')
+
+
+def init_process_worker(config_dict: dict):
+    """
+    进程池worker的initializer，在读取任何任务之前执行。
+    先应用父进程的config，之后读取任务时导入的业务模块按父进程的配置打开数据库、加载SDE和蓝图数据。
+    """
+    config.read_dict(config_dict)
+    worker_state['is_worker'] = True
+
+
+def is_worker_process() -> bool:
+    return worker_state.get('is_worker', False)
+
+
+def get_process_state(init_func, *args) -> tuple:
+    """
+    返回(state_key, state_data)，随同一次计算的每个任务传给worker。
+    init_func和args只在父进程pickle一次，worker遇到新的state_key时才读取并执行init_func(*args)。
+    """
+    return uuid.uuid4().hex, pickle.dumps((init_func, args))
+
+
+def run_process_task(state: tuple, task_func, *args):
+    state_key, state_data = state
+    if worker_state.get('state_key') != state_key:
+        init_func, init_args = pickle.loads(state_data)
+        init_func(*init_args)
+        worker_state['state_key'] = state_key
+    return task_func(*args)
+
+
+class IndustryProcessPool:
+    """
+    常驻的进程池，按名称在第一次使用时创建，之后的计算复用已经启动并加载好数据的worker。
+    worker只保留最近一次计算的状态，不同计算交替提交任务时由run_process_task重新初始化。
+    """
+    executor_dict = dict()  # {name: ProcessPoolExecutor}
+    lock = threading.Lock()
+
+    @classmethod
+    def get_executor(cls, name: str, max_workers: int) -> ProcessPoolExecutor:
+        with cls.lock:
+            if (executor := cls.executor_dict.get(name)) is None:
+                config_dict = {section: dict(config.items(section, raw=True)) for section in config.sections()}
+                executor = ProcessPoolExecutor(max_workers=max_workers, mp_context=get_process_context(),
+                                               initializer=init_process_worker, initargs=(config_dict,))
+                cls.executor_dict[name] = executor
+            return executor
+
+    @classmethod
+    def discard_executor(cls, name: str):
+        """ 进程池损坏后丢弃，下次使用时重新创建 """
+        with cls.lock:
+            executor = cls.executor_dict.pop(name, None)
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
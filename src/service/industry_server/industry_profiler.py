@@ -0,0 +1,201 @@
+import os
+import json
+import time
+import logging
+import threading
+import tracemalloc
+from datetime import datetime
+
+from .industry_analyse import IndustryAnalyser
+from .blueprint import BPManager
+from ..config_server.config import config
+
+# kahuna logger
+from ..log_server import logger
+
+# json结果输出目录
+PROFILE_DIR = config.get('INDUSTRY', 'PROFILE_DIR', fallback='profile')
+
+REAC_ACTION_ID = 11
+
+
+class SqlCounter(logging.Filter):
+    """
+    peewee在执行每条sql时输出一条DEBUG日志，统计指定线程的日志条数作为sql数量。
+    计数期间的DEBUG日志不再继续输出。
+    """
+    def __init__(self, thread_id: int):
+        super().__init__()
+        self.thread_id = thread_id
+        self.count = 0
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno != logging.DEBUG:
+            return True
+        if record.thread == self.thread_id:
+            self.count += 1
+        return False
+
+
+class ProfileFrame:
+    __slots__ = ('start_time', 'start_sql', 'start_memory', 'peak')
+
+    def __init__(self, start_time: float, start_sql: int, start_memory: int):
+        self.start_time = start_time
+        self.start_sql = start_sql
+        self.start_memory = start_memory
+        self.peak = start_memory
+
+
+class ProfileScope:
+    """ IndustryProfiler.phase/node返回的上下文，退出时把耗时、sql数、内存峰值累加到record """
+    __slots__ = ('profiler', 'record')
+
+    def __init__(self, profiler, record: dict):
+        self.profiler = profiler
+        self.record = record
+
+    def __enter__(self):
+        self.profiler.enter()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        use_time, sql_count, peak = self.profiler.exit()
+        self.record['count'] += 1
+        self.record['time'] += use_time
+        self.record['sql'] += sql_count
+        self.record['peak'] = max(self.record['peak'], peak)
+        return False
+
+
+class IndustryProfiler:
+    """
+    分析器的分阶段性能记录。
+    对每个阶段和每类蓝图节点记录耗时、sql数量和内存峰值（相对进入时已占用的内存）。
+    内存使用tracemalloc统计，记录期间整体耗时会变长，同一方法下的结果之间可以对比。
+    """
+    def __init__(self):
+        self.phase_dict = dict()  # {phase: record}，按第一次进入的顺序
+        self.node_class_dict = dict()  # {node_class: record}
+        self.frame_stack = []
+        self.sql_counter = None
+        self.peewee_level = logging.NOTSET
+        self.start_time = 0
+        self.total_time = 0
+        self.tracemalloc_started = False
+
+    @staticmethod
+    def new_record() -> dict:
+        return {'count': 0, 'time': 0.0, 'sql': 0, 'peak': 0}
+
+    def start(self):
+        self.sql_counter = SqlCounter(threading.get_ident())
+        peewee_logger = logging.getLogger('peewee')
+        self.peewee_level = peewee_logger.level
+        peewee_logger.addFilter(self.sql_counter)
+        peewee_logger.setLevel(logging.DEBUG)
+
+        self.tracemalloc_started = not tracemalloc.is_tracing()
+        if self.tracemalloc_started:
+            tracemalloc.start()
+        self.start_time = time.perf_counter()
+
+    def stop(self):
+        self.total_time = time.perf_counter() - self.start_time
+        peewee_logger = logging.getLogger('peewee')
+        peewee_logger.removeFilter(self.sql_counter)
+        peewee_logger.setLevel(self.peewee_level)
+        if self.tracemalloc_started:
+            tracemalloc.stop()
+
+    def fold_peak(self):
+        """ 重置峰值前把当前峰值计入所有未结束的外层记录 """
+        _, peak = tracemalloc.get_traced_memory()
+        for frame in self.frame_stack:
+            frame.peak = max(frame.peak, peak)
+
+    def enter(self):
+        self.fold_peak()
+        tracemalloc.reset_peak()
+        current, _ = tracemalloc.get_traced_memory()
+        self.frame_stack.append(ProfileFrame(time.perf_counter(), self.sql_counter.count, current))
+
+    def exit(self) -> tuple[float, int, int]:
+        self.fold_peak()
+        frame = self.frame_stack.pop()
+        return (time.perf_counter() - frame.start_time,
+                self.sql_counter.count - frame.start_sql,
+                frame.peak - frame.start_memory)
+
+    def phase(self, phase: str) -> ProfileScope:
+        return ProfileScope(self, self.phase_dict.setdefault(phase, self.new_record()))
+
+    def node(self, node_class: str) -> ProfileScope:
+        return ProfileScope(self, self.node_class_dict.setdefault(node_class, self.new_record()))
+
+    @classmethod
+    def get_node_class(cls, analyser: IndustryAnalyser, node) -> str:
+        if node == 'root':
+            return 'root'
+        if analyser.bp_graph.out_degree(node) == 0:
+            return 'material'
+        if BPManager.get_action_id(node) == REAC_ACTION_ID:
+            return 'reaction'
+        return 'manufacturing'
+
+    def get_result(self) -> dict:
+        return {
+            'time': self.total_time,
+            'sql': self.sql_counter.count,
+            'phase': self.phase_dict,
+            'node_class': self.node_class_dict,
+        }
+
+    @classmethod
+    def profile_plan(cls, user, plan_name: str) -> dict:
+        """ 使用新的分析器完整生成一次计划报表，不读写分析结果缓存 """
+        analyser = IndustryAnalyser.create_analyser_by_plan(user, plan_name)
+        profiler = IndustryProfiler()
+        analyser.profiler = profiler
+        profiler.start()
+        try:
+            analyser.create_work_tree_data()
+        finally:
+            profiler.stop()
+            analyser.profiler = None
+
+        res = {
+            'user': user.user_qq,
+            'plan': plan_name,
+            'date': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'lines': len(analyser.plan_list),
+            'nodes': analyser.bp_graph.number_of_nodes(),
+            'edges': analyser.bp_graph.number_of_edges(),
+        }
+        res.update(profiler.get_result())
+        logger.info(f"analyse profile {plan_name}: {res}")
+        return res
+
+    @classmethod
+    def dump_json(cls, profile_data: dict) -> str:
+        if not os.path.exists(PROFILE_DIR):
+            os.makedirs(PROFILE_DIR)
+        file_name = f"{profile_data['user']}_{profile_data['plan']}_{datetime.now().strftime('%Y%m%d%H%M%S')}.json"
+        file_path = os.path.abspath(os.path.join(PROFILE_DIR, file_name))
+        with open(file_path, 'w', encoding='utf-8') as f:
+            json.dump(profile_data, f, ensure_ascii=False, indent=2)
+        return file_path
+
+    @classmethod
+    def format_profile(cls, profile_data: dict) -> str:
+        res_str = (f"计划 {profile_data['plan']}: {profile_data['lines']}行, "
+                   f"{profile_data['nodes']}节点, {profile_data['edges']}边\n"
+                   f"总计: {profile_data['time']:.3f}s, sql {profile_data['sql']}\n\n"
+                   f"阶段:\n")
+        for phase, record in profile_data['phase'].items():
+            res_str += f"  {phase}: {record['time']:.3f}s, sql {record['sql']}, 峰值 {record['peak'] / 1024 / 1024:.2f}MB\n"
+        res_str += "\n节点类型:\n"
+        for node_class, record in profile_data['node_class'].items():
+            res_str += (f"  {node_class}({record['count']}): {record['time']:.3f}s, sql {record['sql']}, "
+                        f"峰值 {record['peak'] / 1024 / 1024:.2f}MB\n")
+        return res_str
@@ -0,0 +1,131 @@
+import numpy as np
+
+from .blueprint import BPManager
+from .structure import StructureManager
+from ..sde_service.utils import SdeUtils
+from ..config_server.config import config
+
+# 单趟运输的货柜船容量，单位m3，默认为跳货
+FREIGHTER_CAPACITY = config.getfloat('INDUSTRY', 'FREIGHTER_CAPACITY', fallback=360000)
+
+
+class IndustryTransportPlanner:
+    """
+    物流规划。
+    需求: 所有可用工作的材料需求一次向量化计算，按(建筑, 类型)汇总，取整方式与Work.get_material_need一致。
+    供给: 目标仓库中的资产按类型索引到所在建筑。
+    先用本建筑的库存满足需求，剩余需求只在该类型的供给建筑中查找，
+    再把运输清单按路线装入容量为capacity的货柜船，体积使用packagedVolume。
+    """
+    def __init__(self, ac_token: str = None, capacity: float = FREIGHTER_CAPACITY):
+        self.ac_token = ac_token
+        self.capacity = capacity
+        self.structure_dict = dict()  # {structure_id: Structure}
+        self.material_dict = dict()  # {type_id: (material_id数组, 数量数组)}
+        self.need_dict = dict()  # {structure: {type_id: quantity}}
+        self.provide_dict = dict()  # {type_id: {structure: quantity}}
+
+    def get_structure(self, structure_id: int):
+        if structure_id not in self.structure_dict:
+            self.structure_dict[structure_id] = StructureManager.get_structure(structure_id, self.ac_token)
+        return self.structure_dict[structure_id]
+
+    def get_material_array(self, type_id: int) -> tuple[np.ndarray, np.ndarray]:
+        if type_id not in self.material_dict:
+            bp_materials = BPManager.get_bp_materials(type_id)
+            self.material_dict[type_id] = (np.array(list(bp_materials.keys()), dtype=np.int64),
+                                           np.array(list(bp_materials.values()), dtype=float))
+        return self.material_dict[type_id]
+
+    def add_work_need(self, work_list: list):
+        """ 每个工作组展开为(工作组, 材料)对，单个工作的需求乘以组内数量后按(建筑, 材料)分组求和 """
+        work_list = [work for work in work_list if work.avaliable]
+        material_list = [self.get_material_array(work.type_id) for work in work_list]
+        count = np.array([len(material_id) for material_id, _ in material_list], dtype=np.int64)
+        if count.sum() == 0:
+            return
+
+        material_id = np.concatenate([material_id for material_id, _ in material_list])
+        material_quantity = np.concatenate([quantity for _, quantity in material_list])
+        mater_eff = np.repeat(np.array([work.mater_eff for work in work_list], dtype=float), count)
+        runs = np.repeat(np.array([work.runs for work in work_list], dtype=float), count)
+        work_count = np.repeat(np.array([work.count for work in work_list], dtype=float), count)
+        structure_id = np.repeat(np.array([work.structure_id for work in work_list], dtype=np.int64), count)
+
+        # 如果需求为1，不吃材料加成
+        need = np.ceil(material_quantity * np.where(material_quantity == 1, 1, mater_eff) * runs) * work_count
+        key, inverse = np.unique(np.stack([structure_id, material_id], axis=1), axis=0, return_inverse=True)
+        total_need = np.bincount(inverse.reshape(-1), weights=need, minlength=len(key))
+
+        for (structure_id, type_id), quantity in zip(key.tolist(), total_need.tolist()):
+            struct_need = self.need_dict.setdefault(self.get_structure(structure_id), dict())
+            struct_need[type_id] = struct_need.get(type_id, 0) + int(quantity)
+
+    def add_asset_provide(self, asset_list, type_set: set, location_set: set):
+        location_structure = dict()
+        for asset in asset_list:
+            if asset.type_id not in type_set or asset.location_id not in location_set:
+                continue
+            if asset.location_id not in location_structure:
+                structure_id = SdeUtils.get_structure_id_from_location_id(asset.location_id)[0]
+                location_structure[asset.location_id] = self.get_structure(structure_id)
+            provide = self.provide_dict.setdefault(asset.type_id, dict())
+            structure = location_structure[asset.location_id]
+            provide[structure] = provide.get(structure, 0) + asset.quantity
+
+    def get_transport(self) -> dict:
+        """ 返回{(提供建筑名, 需求建筑名, type_id): 数量} """
+        # 处理自供给
+        for structure, struct_need in self.need_dict.items():
+            for type_id, quantity in struct_need.items():
+                provide = self.provide_dict.get(type_id, None)
+                if not provide or not provide.get(structure, 0):
+                    continue
+                supply = min(provide[structure], quantity)
+                provide[structure] -= supply
+                struct_need[type_id] -= supply
+
+        transport_dict = dict()
+        # 处理异地供给
+        for need_structure, struct_need in self.need_dict.items():
+            for type_id in struct_need:
+                for prov_structure, prov_quantity in self.provide_dict.get(type_id, dict()).items():
+                    if struct_need[type_id] <= 0:
+                        break
+                    if prov_quantity <= 0 or prov_structure == need_structure:
+                        continue
+                    supply = min(prov_quantity, struct_need[type_id])
+                    key = (prov_structure.name, need_structure.name, type_id)
+                    transport_dict[key] = transport_dict.get(key, 0) + supply
+                    self.provide_dict[type_id][prov_structure] -= supply
+                    struct_need[type_id] -= supply
+        return transport_dict
+
+    def get_haul_list(self, transport_dict: dict) -> list:
+        """
+        按路线依次装船，装不下的部分拆到下一趟，单个体积超过容量的物品单独一趟。
+        返回[[趟次, 提供建筑名, 需求建筑名, type_id, 数量, 体积]]
+        """
+        route_dict = dict()
+        for (prov_name, need_name, type_id), quantity in transport_dict.items():
+            route_dict.setdefault((prov_name, need_name), []).append((type_id, quantity))
+
+        haul_list = []
+        haul_index = 0
+        for (prov_name, need_name), line_list in route_dict.items():
+            haul_index += 1
+            free_volume = self.capacity
+            for type_id, quantity in line_list:
+                unit_volume = SdeUtils.get_invtype_packagedvolume_by_id(type_id) or 0
+                while quantity > 0:
+                    load = quantity if unit_volume == 0 else min(quantity, int(free_volume // unit_volume))
+                    if load <= 0:
+                        if free_volume < self.capacity:
+                            haul_index += 1
+                            free_volume = self.capacity
+                            continue
+                        load = 1
+                    haul_list.append([haul_index, prov_name, need_name, type_id, load, load * unit_volume])
+                    free_volume -= load * unit_volume
+                    quantity -= load
+        return haul_list
@@ -45,7 +45,7 @@ class IdsUtils:
             if child_id not in work_check_dict:
                 work_check_dict[child_id] = []
             work_check_dict[child_id].append({
-                'min_index': min(work.support_index), 'quantity': child_need, 'work': work
+                'min_index': min(work.get_support_index()), 'quantity': child_need, 'work': work
             })
 
     @classmethod
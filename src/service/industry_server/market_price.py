@@ -1,7 +1,13 @@
 
+import asyncio
+
 from ..database_server.model import MarketPrice as M_MarketPrice, MarketPriceCache as M_MarketPriceCache
 from ..evesso_server.eveesi import markets_prices
+from ..evesso_server import eveesi_async
+from ..evesso_server.eveutils import get_conditional_result, get_conditional_result_async
+from ..evesso_server.esi_etag import NotModified, EsiEtagBatch
 from ..database_server.connect import db
+from ..database_server.snapshot_version import SnapshotVersion, MARKET_PRICE_SNAPSHOT
 from ...utils import chunks
 
 # kahuna logger
@@ -10,7 +16,26 @@ from ..log_server import logger
 class MarketPrice:
     @classmethod
     def refresh_market_price(cls):
-        results = markets_prices()
+        etag_batch = EsiEtagBatch()
+        results = get_conditional_result(markets_prices, etag_batch)
+        cls.write_market_price(results)
+        etag_batch.commit()
+
+    @classmethod
+    async def refresh_market_price_async(cls):
+        etag_batch = EsiEtagBatch()
+        results = await get_conditional_result_async(eveesi_async.markets_prices, etag_batch)
+        await asyncio.to_thread(cls.write_market_price, results)
+        await asyncio.to_thread(etag_batch.commit)
+
+    @classmethod
+    def write_market_price(cls, results):
+        if results is None:
+            logger.warning("market_price 请求失败，保留现有数据。")
+            return
+        if isinstance(results, NotModified):
+            logger.info("market_price 未变化。")
+            return
 
         with db.atomic():
             M_MarketPrice.delete().execute()
@@ -25,4 +50,5 @@ class MarketPrice:
             M_MarketPriceCache.delete().execute()
             db.execute_sql("INSERT INTO market_price_cache SELECT * FROM market_price")
             logger.info("market_price copy data to cache complete")
+        SnapshotVersion.bump(MARKET_PRICE_SNAPSHOT)
 
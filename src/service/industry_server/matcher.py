@@ -15,6 +15,8 @@ class Matcher:
         self.user_qq = user_qq
         self.matcher_type = matcher_type
         self.matcher_data = {matcher_k: dict() for matcher_k in MATCHER_KEY}
+        # 决策表 {type_id: 匹配结果}，第一次匹配时写入，匹配器内容变化后清空
+        self.decision_dict = dict()
 
     @classmethod
     def init_from_db_data(cls, data: M_Matcher):
@@ -37,6 +39,19 @@ class Matcher:
         obj.matcher_data = json.dumps(self.matcher_data)
 
         obj.save()
+        # matcher set/unset修改matcher_data后都会写库
+        self.recompile()
+
+    def recompile(self):
+        self.decision_dict = dict()
+
+    def match(self, type_id: int, match_func):
+        """ 查询决策表，未命中时由match_func(type_id, matcher)计算并写入 """
+        res = self.decision_dict.get(type_id, None)
+        if res is None:
+            res = match_func(type_id, self)
+            self.decision_dict[type_id] = res
+        return res
 
     def delete_from_db(self):
         M_Matcher.delete().where(M_Matcher.matcher_name == self.matcher_name).execute()
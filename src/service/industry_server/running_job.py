@@ -1,20 +1,73 @@
+import asyncio
+import threading
 from tqdm import tqdm
 
 from ..database_server.model import IndustryJobs as M_IndustryJobs, IndustryJobsCache as M_IndustryJobsCache
 from ..character_server.character import Character
 from ..evesso_server.eveesi import characters_character_id_industry_jobs, corporations_corporation_id_industry_jobs
-from ..evesso_server.eveutils import find_max_page, get_multipages_result
+from ..evesso_server import eveesi_async
+from ..evesso_server.eveutils import (get_all_pages_result, get_conditional_result,
+                                       get_all_pages_result_async, get_conditional_result_async)
+from ..evesso_server.esi_etag import NotModified, EsiEtagBatch
 from ..database_server.connect import db
+from ..database_server.snapshot_version import SnapshotVersion, JOB_SNAPSHOT
 
 # kahuna logger
 from ..log_server import logger
 
+class RunningJobSnapshot:
+    """
+    industry_jobs_cache的内存快照，copy_to_cache完成后整体重建并替换，建立后不再修改。
+    工作记录为peewee namedtuple，字段与IndustryJobsCache相同。
+    """
+    def __init__(self, job_list: list):
+        self.job_list = job_list
+        self.installer_dict = dict()  # {installer_id: [job]}
+        self.output_location_dict = dict()  # {output_location_id: [job]}
+        self.product_dict = dict()  # {product_type_id: [job]}
+        for job in job_list:
+            self.installer_dict.setdefault(job.installer_id, []).append(job)
+            self.output_location_dict.setdefault(job.output_location_id, []).append(job)
+            self.product_dict.setdefault(job.product_type_id, []).append(job)
+        self.using_bp_set = frozenset(job.blueprint_id for job in job_list)
+
+    @classmethod
+    def load(cls):
+        return cls(list(M_IndustryJobsCache.select().namedtuples()))
+
+
 class RunningJobOwner:
+    snapshot: RunningJobSnapshot = None
+    snapshot_lock = threading.Lock()
+
     @classmethod
-    def refresh_character_running_job(cls, character: Character):
-        character_running_job = characters_character_id_industry_jobs(character.ac_token, character.character_id)
-        if not character_running_job:
-            return
+    def refresh_character_running_job(cls, character: Character, etag_batch: EsiEtagBatch) -> bool:
+        """
+        返回工作是否有变化。
+        写入成功后新ETag merge到etag_batch，由调用方在copy_to_cache完成后commit。
+        """
+        owner_batch = EsiEtagBatch()
+        character_running_job = get_conditional_result(characters_character_id_industry_jobs, owner_batch,
+                                                       character.ac_token, character.character_id)
+        changed = cls.write_character_running_job(character, character_running_job)
+        etag_batch.merge(owner_batch)
+        return changed
+
+    @classmethod
+    async def refresh_character_running_job_async(cls, character: Character, etag_batch: EsiEtagBatch) -> bool:
+        # token过期时ac_token会同步请求刷新token并写入数据库
+        ac_token = await asyncio.to_thread(lambda: character.ac_token)
+        owner_batch = EsiEtagBatch()
+        character_running_job = await get_conditional_result_async(eveesi_async.characters_character_id_industry_jobs,
+                                                                    owner_batch, ac_token, character.character_id)
+        changed = await asyncio.to_thread(cls.write_character_running_job, character, character_running_job)
+        etag_batch.merge(owner_batch)
+        return changed
+
+    @classmethod
+    def write_character_running_job(cls, character: Character, character_running_job) -> bool:
+        if not character_running_job or isinstance(character_running_job, NotModified):
+            return False
 
         for data in character_running_job:
             data['location_id'] = data['station_id']
@@ -23,13 +76,39 @@ class RunningJobOwner:
         with db.atomic():
             M_IndustryJobs.delete().where(M_IndustryJobs.owner_id == character.character_id).execute()
             M_IndustryJobs.insert_many(character_running_job).execute()
+        return True
+
+    @classmethod
+    def refresh_corp_running_job(cls, corp_id, character: Character, etag_batch: EsiEtagBatch) -> bool:
+        logger.info("请求刷新进行中job。")
+        owner_batch = EsiEtagBatch()
+        results = get_all_pages_result(corporations_corporation_id_industry_jobs, character.ac_token, corp_id,
+                                       conditional=owner_batch)
+        if results is None:
+            logger.warning(f"corp {corp_id} 进行中job请求失败，保留现有数据。")
+            return False
+        changed = cls.write_corp_running_job(corp_id, results)
+        etag_batch.merge(owner_batch)
+        return changed
 
     @classmethod
-    def refresh_corp_running_job(cls, corp_id, character: Character):
-        max_page = find_max_page(corporations_corporation_id_industry_jobs, character.ac_token, corp_id,
-                                 begin_page=0, interval=2)
+    async def refresh_corp_running_job_async(cls, corp_id, character: Character, etag_batch: EsiEtagBatch) -> bool:
         logger.info("请求刷新进行中job。")
-        results = get_multipages_result(corporations_corporation_id_industry_jobs, max_page, character.ac_token, corp_id)
+        ac_token = await asyncio.to_thread(lambda: character.ac_token)
+        owner_batch = EsiEtagBatch()
+        results = await get_all_pages_result_async(eveesi_async.corporations_corporation_id_industry_jobs,
+                                                   ac_token, corp_id, conditional=owner_batch)
+        if results is None:
+            logger.warning(f"corp {corp_id} 进行中job请求失败，保留现有数据。")
+            return False
+        changed = await asyncio.to_thread(cls.write_corp_running_job, corp_id, results)
+        etag_batch.merge(owner_batch)
+        return changed
+
+    @classmethod
+    def write_corp_running_job(cls, corp_id, results) -> bool:
+        if isinstance(results, NotModified):
+            return False
 
         with db.atomic():
             M_IndustryJobs.delete().where(M_IndustryJobs.owner_id == corp_id).execute()
@@ -38,6 +117,7 @@ class RunningJobOwner:
                     for jobs in result:
                         jobs.update({'owner_id': corp_id})
                     M_IndustryJobs.insert_many(result).execute()
+        return True
 
     @classmethod
     def copy_to_cache(cls):
@@ -45,18 +125,41 @@ class RunningJobOwner:
         db.execute_sql(
             f"INSERT INTO {M_IndustryJobsCache._meta.table_name} SELECT * FROM {M_IndustryJobs._meta.table_name}")
         logger.info("copy data to cache complete")
+        cls.refresh_snapshot()
+        SnapshotVersion.bump(JOB_SNAPSHOT)
+
+    @classmethod
+    def refresh_snapshot(cls):
+        snapshot = RunningJobSnapshot.load()
+        with cls.snapshot_lock:
+            cls.snapshot = snapshot
+        logger.info(f"running job snapshot rebuilt. {len(snapshot.job_list)} jobs.")
 
     @classmethod
-    def get_job_with_starter(cls, character_id_list: list):
-        res = M_IndustryJobsCache.select().where(M_IndustryJobsCache.installer_id.in_(character_id_list))
+    def get_snapshot(cls) -> RunningJobSnapshot:
+        """ 启动后还没有执行过copy_to_cache时，从现有的industry_jobs_cache建立快照 """
+        if cls.snapshot is None:
+            with cls.snapshot_lock:
+                if cls.snapshot is None:
+                    cls.snapshot = RunningJobSnapshot.load()
+        return cls.snapshot
 
-        return res
+    @classmethod
+    def get_job_with_starter(cls, character_id_list: list) -> list:
+        # 别名角色来自json的key，是字符串
+        installer_dict = cls.get_snapshot().installer_dict
+        return [job for character_id in set(int(character_id) for character_id in character_id_list)
+                for job in installer_dict.get(character_id, [])]
 
     @classmethod
-    def get_using_bp_set(cls):
-        res = M_IndustryJobsCache.select(M_IndustryJobsCache.blueprint_id)
-        bp_set = set()
-        for job in res:
-            bp_set.add(job.blueprint_id)
+    def get_job_with_output_location(cls, location_id_list: list) -> list:
+        output_location_dict = cls.get_snapshot().output_location_dict
+        return [job for location_id in set(location_id_list) for job in output_location_dict.get(location_id, [])]
 
-        return bp_set
\ No newline at end of file
+    @classmethod
+    def get_job_with_product(cls, type_id: int) -> list:
+        return cls.get_snapshot().product_dict.get(type_id, [])
+
+    @classmethod
+    def get_using_bp_set(cls) -> frozenset:
+        return cls.get_snapshot().using_bp_set
\ No newline at end of file
@@ -1,7 +1,13 @@
 
+import asyncio
+
 from ..database_server.model import SystemCost as M_SystemCost, SystemCostCache as M_SystemCostCache
 from ..evesso_server.eveesi import industry_systems
+from ..evesso_server import eveesi_async
+from ..evesso_server.eveutils import get_conditional_result, get_conditional_result_async
+from ..evesso_server.esi_etag import NotModified, EsiEtagBatch
 from ..database_server.connect import db
+from ..database_server.snapshot_version import SnapshotVersion, SYSTEM_COST_SNAPSHOT
 from ...utils import chunks
 
 # kahuna logger
@@ -11,7 +17,26 @@ from ..log_server import logger
 class SystemCost:
     @classmethod
     def refresh_system_cost(cls):
-        result = industry_systems()
+        etag_batch = EsiEtagBatch()
+        result = get_conditional_result(industry_systems, etag_batch)
+        cls.write_system_cost(result)
+        etag_batch.commit()
+
+    @classmethod
+    async def refresh_system_cost_async(cls):
+        etag_batch = EsiEtagBatch()
+        result = await get_conditional_result_async(eveesi_async.industry_systems, etag_batch)
+        await asyncio.to_thread(cls.write_system_cost, result)
+        await asyncio.to_thread(etag_batch.commit)
+
+    @classmethod
+    def write_system_cost(cls, result):
+        if result is None:
+            logger.warning("system_cost 请求失败，保留现有数据。")
+            return
+        if isinstance(result, NotModified):
+            logger.info("system_cost 未变化。")
+            return
 
         insert_data = []
         for item in result:
@@ -33,3 +58,4 @@ class SystemCost:
             M_SystemCostCache.delete().execute()
             db.execute_sql("INSERT INTO system_cost_cache SELECT * FROM system_cost")
             logger.info("system_cost copy data to cache complete")
+        SnapshotVersion.bump(SYSTEM_COST_SNAPSHOT)
@@ -6,13 +6,16 @@ from cachetools import TTLCache, cached
 from datetime import datetime, timedelta
 
 
-from ..database_server.model import MarketOrder as M_MarketOrder, MarketOrderCache as M_MarketOrderCache
+from ..database_server.model import (MarketOrder as M_MarketOrder, MarketOrderCache as M_MarketOrderCache,
+                                     MarketOrderStaging as M_MarketOrderStaging)
 from ..database_server import model
-from ..database_server.connect import db
+from ..database_server.page_writer import PageWriter
 from ..evesso_server.eveesi import markets_region_orders
 from ..evesso_server.eveesi import markets_structures
 from ..evesso_server import eveesi
-from ..evesso_server.eveutils import find_max_page, get_multipages_result
+from ..evesso_server import eveesi_async
+from ..evesso_server.eveutils import stream_all_pages, stream_all_pages_async
+from ..evesso_server.esi_etag import EsiEtagBatch
 from ..sde_service import SdeUtils
 
 from ...utils import KahunaException
@@ -42,50 +45,71 @@ class Market:
     def set_access_character(self, access_character):
         self.access_character = access_character
 
-    def get_market_order(self):
+    def get_market_order(self, etag_batch: EsiEtagBatch = None) -> bool:
+        """
+        返回订单是否有变化，没有变化时不重写market_order。
+        etag_batch不为None时发送条件请求，写入成功后新ETag merge到etag_batch，由调用方在copy_to_cache后commit。
+        """
         if self.market_type == "jita":
-            self.get_jita_order()
+            return self.get_jita_order(etag_batch)
         if self.market_type == "frt":
-            self.get_frt_order()
+            return self.get_frt_order(etag_batch)
+        return False
 
-    def get_frt_order(self):
+    async def get_market_order_async(self, etag_batch: EsiEtagBatch = None) -> bool:
+        """ get_market_order的异步版本，在事件循环上请求，写入数据库在线程中执行 """
+        if self.market_type == "jita":
+            return await self.get_jita_order_async(etag_batch)
+        if self.market_type == "frt":
+            return await self.get_frt_order_async(etag_batch)
+        return False
+
+    def get_frt_order(self, etag_batch: EsiEtagBatch = None) -> bool:
         if not self.access_character:
-            return
+            return False
         ac_token = self.access_character.ac_token
-        max_page = find_max_page(markets_structures, ac_token, FRT_4H_STRUCTURE_ID, begin_page=20, interval=10)
-        # with db.atomic() as txn:
-        results = get_multipages_result(markets_structures, max_page, self.access_character.ac_token, FRT_4H_STRUCTURE_ID)
-
-        with db.atomic():
-            M_MarketOrder.delete().where(M_MarketOrder.location_id == FRT_4H_STRUCTURE_ID).execute()
-            with tqdm(total=len(results), desc="写入数据库", unit="page") as pbar:
-                for i, result in enumerate(results):
-                    # result = [order for order in result if order["location_id"] == JITA_TRADE_HUB_STRUCTURE_ID]
-                    M_MarketOrder.insert_many(result).execute()
-                    pbar.update()
+        changed = stream_all_pages(markets_structures, self.get_order_writer(FRT_4H_STRUCTURE_ID),
+                                   ac_token, FRT_4H_STRUCTURE_ID, conditional=etag_batch)
+        if not changed:
+            logger.info("frt 市场订单未变化。")
+        return changed
 
-    def get_jita_order(self):
-        max_page = find_max_page(markets_region_orders, REGION_FORGE_ID, begin_page=350, interval=50)
-        # with db.atomic() as txn:
+    async def get_frt_order_async(self, etag_batch: EsiEtagBatch = None) -> bool:
+        if not self.access_character:
+            return False
+        # token过期时ac_token会同步请求刷新token并写入数据库
+        ac_token = await asyncio.to_thread(lambda: self.access_character.ac_token)
+        changed = await stream_all_pages_async(eveesi_async.markets_structures, self.get_order_writer(FRT_4H_STRUCTURE_ID),
+                                               ac_token, FRT_4H_STRUCTURE_ID, conditional=etag_batch)
+        if not changed:
+            logger.info("frt 市场订单未变化。")
+        return changed
+
+    def get_jita_order(self, etag_batch: EsiEtagBatch = None) -> bool:
+        logger.info("请求市场。")
+        changed = stream_all_pages(markets_region_orders, self.get_order_writer(JITA_TRADE_HUB_STRUCTURE_ID, True),
+                                   REGION_FORGE_ID, conditional=etag_batch)
+        if not changed:
+            logger.info("jita 市场订单未变化。")
+        return changed
 
+    async def get_jita_order_async(self, etag_batch: EsiEtagBatch = None) -> bool:
         logger.info("请求市场。")
-        results = get_multipages_result(markets_region_orders, max_page, REGION_FORGE_ID)
-        # with ThreadPoolExecutor(max_workers=100) as executor:
-        #     futures = [executor.submit(markets_region_orders, page, REGION_FORGE_ID) for page in range(1, max_page+1)]
-        #     results = []
-        #     count = 1
-        #     for future in tqdm(futures, desc="请求市场数据", unit="page"):
-        #         result = future.result()
-        #         results.append(result)
-        #         count += 1
-
-        with db.atomic():
-            M_MarketOrder.delete().where(M_MarketOrder.location_id == JITA_TRADE_HUB_STRUCTURE_ID).execute()
-            with tqdm(total=len(results), desc="写入数据库", unit="page") as pbar:
-                for i, result in enumerate(results):
-                    result = [order for order in result if order["location_id"] == JITA_TRADE_HUB_STRUCTURE_ID]
-                    M_MarketOrder.insert_many(result).execute()
-                    pbar.update()
+        changed = await stream_all_pages_async(eveesi_async.markets_region_orders,
+                                               self.get_order_writer(JITA_TRADE_HUB_STRUCTURE_ID, True),
+                                               REGION_FORGE_ID, conditional=etag_batch)
+        if not changed:
+            logger.info("jita 市场订单未变化。")
+        return changed
+
+    @staticmethod
+    def get_order_writer(location_id: int, filter_location: bool = False) -> PageWriter:
+        """ 替换market_order中location_id的订单，filter_location为True时只写入该建筑内的订单(星域订单接口) """
+        row_func = None
+        if filter_location:
+            row_func = lambda result: [order for order in result if order["location_id"] == location_id]
+        return PageWriter(M_MarketOrder, M_MarketOrderStaging, M_MarketOrder.location_id == location_id,
+                          row_func=row_func, name=f"market_order {location_id}")
 
     def get_market_detail(self) -> tuple[int, int, int, int]:
         if self.market_type == "jita":
@@ -6,8 +6,11 @@ from datetime import datetime
 
 from ..database_server.model import MarketOrderCache
 from ..database_server.connect import db
+from ..database_server.snapshot_version import SnapshotVersion, ORDER_SNAPSHOT
 from .marker import Market
 from ..character_server.character_manager import CharacterManager
+from ..evesso_server.esi_etag import EsiEtagCache, EsiEtagBatch
+from ..evesso_server.esi_session import EsiSession
 from ..config_server.config import config
 
 # kahuna logger
@@ -47,15 +50,45 @@ class MarketManager(metaclass=PluginMeta):
             MarketOrderCache.delete().execute()
             db.execute_sql("INSERT INTO market_order_cache SELECT * FROM market_order")
             logger.info("copy data to cache complete")
+        SnapshotVersion.bump(ORDER_SNAPSHOT)
 
     # 监视器，定时刷新
     @classmethod
     def refresh_market(cls):
+        # 新ETag在copy_to_cache完成后才保存，复制失败时下次刷新重新请求并复制
+        etag_batch = EsiEtagBatch()
+        changed = False
         for market in cls.market_dict.values():
-            market.get_market_order()
-        cls.copy_to_cache()
+            changed = market.get_market_order(etag_batch) or changed
+        # 所有市场的订单都没有变化时，market_order_cache不需要重建
+        if changed:
+            cls.copy_to_cache()
+        etag_batch.commit()
 
         log = cls.get_markets_detal()
+        log += f"ESI条件请求:\n{EsiEtagCache.get_stats_log()}\nESI连接: {EsiSession.get_stats_log()}"
+        logger.info(log)
+        return log
+
+    @classmethod
+    async def refresh_market_async(cls):
+        """
+        refresh_market的异步版本，各市场在事件循环上并发请求。
+        一个市场出错时只记录日志，其他市场已经写入的订单照常复制到cache。
+        """
+        etag_batch = EsiEtagBatch()
+        market_list = list(cls.market_dict.values())
+        changed_list = await asyncio.gather(*[market.get_market_order_async(etag_batch) for market in market_list],
+                                            return_exceptions=True)
+        for market, changed in zip(market_list, changed_list):
+            if isinstance(changed, BaseException):
+                logger.error(f"refresh market error: {market.market_type} {changed!r}")
+        if any(changed is True for changed in changed_list):
+            await asyncio.to_thread(cls.copy_to_cache)
+        await asyncio.to_thread(etag_batch.commit)
+
+        log = await asyncio.to_thread(cls.get_markets_detal)
+        log += f"ESI条件请求:\n{EsiEtagCache.get_stats_log()}"
         logger.info(log)
         return log
 
@@ -11,8 +11,6 @@ from ..database_server.model import MarketPriceCache, SystemCostCache
 
 from .database_cn import InvTypes as InvTypes_zh
 
-en_invtype_name_list = [res.typeName for res in InvTypes.select(InvTypes.typeName).where(InvTypes.marketGroupID != 0)]
-zh_invtype_name_list = [res.typeName for res in InvTypes_zh.select(InvTypes_zh.typeName).where(InvTypes_zh.marketGroupID != 0)]
 
 
 
@@ -271,17 +269,28 @@ class SdeUtils:
                 en_count += 1
         return cn_count > en_count
 
+    # 模糊搜索的名称列表在第一次搜索时读取，导入模块时不查询sde
+    @staticmethod
+    @lru_cache(maxsize=1)
+    def get_en_invtype_name_list() -> list[str]:
+        return [res.typeName for res in InvTypes.select(InvTypes.typeName).where(InvTypes.marketGroupID != 0)]
+
+    @staticmethod
+    @lru_cache(maxsize=1)
+    def get_zh_invtype_name_list() -> list[str]:
+        return [res.typeName for res in InvTypes_zh.select(InvTypes_zh.typeName).where(InvTypes_zh.marketGroupID != 0)]
+
     @lru_cache(maxsize=200)
     @staticmethod
     def fuzz_en_type(item_name, list_len) -> list[str]:
-        choice = en_invtype_name_list
+        choice = SdeUtils.get_en_invtype_name_list()
         result = process.extract(item_name, choice, scorer=fuzz.token_sort_ratio, limit=list_len)
         return [res[0] for res in result]
 
     @lru_cache(maxsize=200)
     @staticmethod
     def fuzz_zh_type(item_name, list_len) -> list[str]:
-        choice = zh_invtype_name_list
+        choice = SdeUtils.get_zh_invtype_name_list()
         result = process.extract(item_name, choice, scorer=fuzz.token_sort_ratio, limit=list_len)
         return [res[0] for res in result]
 
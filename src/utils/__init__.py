@@ -2,6 +2,9 @@ import math
 import asyncio
 from concurrent.futures import ThreadPoolExecutor
 
+# kahuna logger
+from ..service.log_server import logger
+
 class KahunaException(Exception):
     def __init__(self, message):
         super(KahunaException, self).__init__(message)
@@ -30,6 +33,14 @@ async def run_func_delay_min(start_delay, func, *args, **kwargs):
 
 async def refresh_per_min(start_delay, interval, func):
     await asyncio.sleep(start_delay * 60)
+    if asyncio.iscoroutinefunction(func):
+        # 异步刷新直接运行在事件循环上，不占用线程
+        while True:
+            try:
+                await func()
+            except Exception as e:
+                logger.error(f"{func.__qualname__} refresh failed. {e!r}")
+            await asyncio.sleep(interval * 60)
     with ThreadPoolExecutor(max_workers=1) as executor:
         while True:
             future = executor.submit(func)